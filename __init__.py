@@ -1,7 +1,12 @@
+import asyncio
+from typing import List
+
 from fastapi import APIRouter
 from loguru import logger
 
 from .crud import db
+from .replica import read_target
+from .tasks import dashboard_events, reconciliation_worker, statement_worker
 from .views import satmachineclient_generic_router
 from .views_api import satmachineclient_api_router
 
@@ -24,14 +29,39 @@ satmachineclient_static_files = [
     }
 ]
 
+scheduled_tasks: List[asyncio.Task] = []
+
+
 def satmachineclient_stop():
-    # No background tasks to stop
-    pass
+    dashboard_events.stop()
+    for task in scheduled_tasks:
+        try:
+            task.cancel()
+        except Exception as ex:
+            logger.warning(ex)
+    scheduled_tasks.clear()
 
 
 def satmachineclient_start():
-    # No background tasks to start - client extension is read-only
-    pass
+    # Pre-builds monthly statements; the admin extension's tables stay read-only
+    from lnbits.tasks import create_permanent_unique_task
+
+    task = create_permanent_unique_task(
+        "ext_satmachineclient_statements", statement_worker.run
+    )
+    scheduled_tasks.append(task)
+
+    # Daily check that every confirmed payment reached the client's wallet
+    task = create_permanent_unique_task(
+        "ext_satmachineclient_reconciliation", reconciliation_worker.run
+    )
+    scheduled_tasks.append(task)
+
+    if read_target.configured:
+        task = create_permanent_unique_task(
+            "ext_satmachineclient_read_target", lambda: read_target.run(db)
+        )
+        scheduled_tasks.append(task)
 
 
 __all__ = [
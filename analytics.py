@@ -0,0 +1,383 @@
+# Description: Pure analytics computations over a client's confirmed DCA payments
+
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime, timedelta
+from operator import mul
+from typing import Any, Iterable, List, Optional, Sequence, Tuple
+
+# Numeric dates above this are millisecond timestamps
+_MILLISECOND_THRESHOLD = 1_000_000_000_000
+
+SATS_PER_BTC = 100_000_000
+
+
+def to_datetime(value: Any) -> Optional[datetime]:
+    """Normalize a date value as returned by SQLite or PostgreSQL
+
+    Accepts datetimes, dates, unix timestamps in seconds or milliseconds (as
+    numbers or numeric strings) and ISO strings. Returns a naive local datetime,
+    or None if the value can't be interpreted.
+    """
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            return value.astimezone().replace(tzinfo=None)
+        return value
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day)
+    if isinstance(value, str) and not value.isdigit():
+        try:
+            return to_datetime(datetime.fromisoformat(value))
+        except ValueError:
+            return None
+    try:
+        timestamp = float(value)
+    except (TypeError, ValueError):
+        return None
+    if timestamp > _MILLISECOND_THRESHOLD:
+        timestamp /= 1000
+    return datetime.fromtimestamp(timestamp)
+
+
+def payment_rate(row: Any) -> float:
+    """Sats per fiat unit a payment got
+
+    That is `amount_sats / amount_fiat`, commission included, so it compares
+    with the DCA cost basis. Payments without a fiat amount fall back to the
+    stored `exchange_rate`, which is fiat per BTC as Lamassu reports it.
+    """
+    sats = int(row["amount_sats"] or 0)
+    fiat = float(row["amount_fiat"] or 0)
+    if fiat > 0:
+        return sats / fiat
+    exchange_rate = float(row["exchange_rate"] or 0)
+    return SATS_PER_BTC / exchange_rate if exchange_rate > 0 else 0.0
+
+
+def bucket_start(moment: datetime, granularity: str) -> date:
+    """First day of the day/week/month bucket containing `moment`"""
+    day = moment.date()
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    return day
+
+
+class PaymentIndex:
+    """Prefix sums over a client's confirmed payments, ordered by transaction time
+
+    Columns are kept in compact arrays (`rates` is the price the payment got,
+    in sats per fiat unit, see `payment_rate`) and `cum_sats[i]`/`cum_fiat[i]`
+    hold the totals of the first `i` payments, so any time range is found by
+    bisecting its endpoints and its totals are a subtraction away. The index
+    is extended in place as new payments arrive; `watermark` records the
+    database state it was built from.
+    """
+
+    def __init__(self) -> None:
+        self.times = array("d")  # epoch seconds
+        self.sats = array("q")
+        self.fiat = array("d")
+        self.rates = array("d")
+        self.cum_sats = array("q", [0])
+        self.cum_fiat = array("d", [0.0])
+        self.watermark: Optional[Tuple[Any, ...]] = None
+
+    @classmethod
+    def from_rows(
+        cls, rows: Iterable[Any], watermark: Optional[Tuple[Any, ...]] = None
+    ) -> "PaymentIndex":
+        index = cls()
+        index.extend(rows)
+        index.watermark = watermark
+        return index
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    def snapshot(self) -> "PaymentIndex":
+        """A copy that later `extend` calls don't touch, for use off the
+        event loop"""
+        copy = PaymentIndex()
+        copy.times = array("d", self.times)
+        copy.sats = array("q", self.sats)
+        copy.fiat = array("d", self.fiat)
+        copy.rates = array("d", self.rates)
+        copy.cum_sats = array("q", self.cum_sats)
+        copy.cum_fiat = array("d", self.cum_fiat)
+        copy.watermark = self.watermark
+        return copy
+
+    def extend(self, rows: Iterable[Any]) -> bool:
+        """Append payments ordered by transaction date
+
+        Returns False, leaving the index untouched, if a payment would land
+        before the current last one; the caller should rebuild instead.
+        """
+        parsed = []
+        for row in rows:
+            moment = to_datetime(row["transaction_date"])
+            if moment is not None:
+                parsed.append(
+                    (
+                        moment.timestamp(),
+                        int(row["amount_sats"] or 0),
+                        # PostgreSQL returns NUMERIC columns as Decimal
+                        float(row["amount_fiat"] or 0),
+                        payment_rate(row),
+                    )
+                )
+        if parsed and self.times and parsed[0][0] < self.times[-1]:
+            return False
+
+        for timestamp, sats, fiat, rate in parsed:
+            self.times.append(timestamp)
+            self.sats.append(sats)
+            self.fiat.append(fiat)
+            self.rates.append(rate)
+            self.cum_sats.append(self.cum_sats[-1] + sats)
+            self.cum_fiat.append(self.cum_fiat[-1] + fiat)
+        return True
+
+    def bounds(
+        self, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None
+    ) -> Tuple[int, int]:
+        """Half-open index range of the payments within [start_date, end_date]"""
+        lo = bisect_left(self.times, start_date.timestamp()) if start_date else 0
+        hi = bisect_right(self.times, end_date.timestamp()) if end_date else len(self)
+        return lo, max(lo, hi)
+
+    def range_totals(
+        self, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None
+    ) -> Tuple[int, float, int]:
+        """Sats, fiat and payment count within a time range in O(log n)"""
+        lo, hi = self.bounds(start_date, end_date)
+        return (
+            self.cum_sats[hi] - self.cum_sats[lo],
+            self.cum_fiat[hi] - self.cum_fiat[lo],
+            hi - lo,
+        )
+
+    def analytics(
+        self,
+        start_date: Optional[datetime] = None,
+        granularity: str = "day",
+        end_date: Optional[datetime] = None,
+    ) -> Tuple[List[dict], List[dict], dict]:
+        """Cost basis curve, accumulation timeline and frequency metrics
+
+        The frequency metrics cover the whole history; the cost basis curve and
+        the timeline only cover the requested range, with running totals
+        starting at its first payment. Only payments inside the range are
+        visited.
+        """
+        lo, hi = self.bounds(start_date, end_date)
+        base_sats = self.cum_sats[lo]
+        base_fiat = self.cum_fiat[lo]
+
+        cost_basis_history: List[dict] = []
+        accumulation_timeline: List[dict] = []
+        bucket: Optional[dict] = None
+        bucket_day: Optional[date] = None
+
+        for i in range(lo, hi):
+            moment = datetime.fromtimestamp(self.times[i])
+            cumulative_sats = self.cum_sats[i + 1] - base_sats
+            cumulative_fiat = self.cum_fiat[i + 1] - base_fiat
+            cost_basis_history.append(
+                {
+                    "date": moment.isoformat(),
+                    # Cost basis = sats / GTQ
+                    "average_cost_basis": (
+                        cumulative_sats / cumulative_fiat if cumulative_fiat > 0 else 0
+                    ),
+                    "cumulative_sats": cumulative_sats,
+                    "cumulative_fiat": cumulative_fiat,
+                }
+            )
+
+            day = bucket_start(moment, granularity)
+            if bucket is None or day != bucket_day:
+                bucket_day = day
+                bucket = {
+                    "date": day.isoformat(),
+                    "sats": 0,
+                    "fiat": 0.0,
+                    "transactions": 0,
+                }
+                accumulation_timeline.append(bucket)
+            bucket["sats"] += self.sats[i]
+            bucket["fiat"] += self.fiat[i]
+            bucket["transactions"] += 1
+
+        total_transactions = len(self)
+        transaction_frequency = {
+            "total_transactions": total_transactions,
+            "avg_sats_per_transaction": (
+                self.cum_sats[-1] / total_transactions if total_transactions else 0
+            ),
+            "avg_fiat_per_transaction": (
+                self.cum_fiat[-1] / total_transactions if total_transactions else 0
+            ),
+            "first_transaction": (
+                datetime.fromtimestamp(self.times[0]).isoformat()
+                if total_transactions
+                else None
+            ),
+            "last_transaction": (
+                datetime.fromtimestamp(self.times[-1]).isoformat()
+                if total_transactions
+                else None
+            ),
+        }
+
+        return cost_basis_history, accumulation_timeline, transaction_frequency
+
+    def rate_at(self, moment: datetime) -> float:
+        """Exchange rate of the first payment at or after `moment`
+
+        Falls back to the last payment's rate for moments after the history.
+        """
+        i = bisect_left(self.times, moment.timestamp())
+        return self.rates[min(i, len(self) - 1)]
+
+    def performance_vs_market(
+        self, deposits: Sequence[Tuple[datetime, float]]
+    ) -> Optional[dict]:
+        """Compare DCA with lump-sum strategies on the stored price history
+
+        `deposits` are the client's confirmed (date, fiat amount), oldest
+        first. The prices the payments got (`rates`) serve as the price history:
+
+        - lump sum: everything DCA spent, bought at the first deposit's date
+        - buy at deposits: each deposit bought in full on its own date
+
+        Cost bases are in sats per fiat unit, so higher is better; each
+        strategy's sats are for the fiat DCA actually spent, and the advantage
+        is how many more sats DCA got, in percent.
+        """
+        if not len(self) or not deposits:
+            return None
+        dca_sats = self.cum_sats[-1]
+        dca_fiat = self.cum_fiat[-1]
+        if dca_fiat <= 0:
+            return None
+        dca_cost_basis = dca_sats / dca_fiat
+
+        deposit_amounts = array("d", (amount for _, amount in deposits))
+        deposit_rates = array("d", (self.rate_at(moment) for moment, _ in deposits))
+        deposited = sum(deposit_amounts)
+
+        def strategy(cost_basis: float) -> dict:
+            sats = dca_fiat * cost_basis
+            return {
+                "cost_basis": cost_basis,
+                "sats": sats,
+                "dca_advantage_pct": (dca_sats / sats - 1) * 100 if sats else None,
+            }
+
+        lump_sum = strategy(deposit_rates[0])
+        lump_sum["date"] = deposits[0][0].isoformat()
+        buy_at_deposits = strategy(
+            sum(map(mul, deposit_amounts, deposit_rates)) / deposited
+            if deposited > 0
+            else 0
+        )
+        buy_at_deposits["deposits"] = len(deposit_amounts)
+
+        return {
+            "fiat_spent": dca_fiat,
+            "dca": {"cost_basis": dca_cost_basis, "sats": dca_sats},
+            "lump_sum": lump_sum,
+            "buy_at_deposits": buy_at_deposits,
+            "latest_rate": self.rates[-1],
+        }
+
+
+def lttb(xs: Sequence[float], ys: Sequence[float], threshold: int) -> List[int]:
+    """Largest-Triangle-Three-Buckets downsampling
+
+    Returns the indices of the points to keep: always the first and last one
+    and, for every bucket in between, the point forming the largest triangle
+    with its neighbours, which preserves the visual shape of the series.
+    """
+    if threshold >= len(xs) or threshold < 3:
+        return list(range(len(xs)))
+
+    sampled = [0]
+    bucket_size = (len(xs) - 2) / (threshold - 2)
+    selected = 0
+
+    for bucket in range(threshold - 2):
+        # Average of the next bucket is the third triangle vertex
+        next_start = int((bucket + 1) * bucket_size) + 1
+        next_end = min(int((bucket + 2) * bucket_size) + 1, len(xs))
+        span = next_end - next_start
+        avg_x = sum(xs[next_start:next_end]) / span
+        avg_y = sum(ys[next_start:next_end]) / span
+
+        start = int(bucket * bucket_size) + 1
+        end = int((bucket + 1) * bucket_size) + 1
+        sel_x, sel_y = xs[selected], ys[selected]
+        best_area = -1.0
+        best = start
+        for index in range(start, end):
+            area = abs(
+                (sel_x - avg_x) * (ys[index] - sel_y)
+                - (sel_x - xs[index]) * (avg_y - sel_y)
+            )
+            if area > best_area:
+                best_area = area
+                best = index
+        sampled.append(best)
+        selected = best
+
+    sampled.append(len(xs) - 1)
+    return sampled
+
+
+def merge_buckets(timeline: List[dict], max_points: int) -> List[dict]:
+    """Merge adjacent accumulation buckets down to at most `max_points`
+
+    Sats, fiat and transaction counts are summed, so running totals over the
+    merged timeline are identical to the original ones.
+    """
+    if max_points >= len(timeline) or max_points < 1:
+        return timeline
+
+    group_size = -(-len(timeline) // max_points)
+    merged = []
+    for start in range(0, len(timeline), group_size):
+        group = timeline[start : start + group_size]
+        merged.append(
+            {
+                "date": group[0]["date"],
+                "sats": sum(bucket["sats"] for bucket in group),
+                "fiat": sum(bucket["fiat"] for bucket in group),
+                "transactions": sum(bucket["transactions"] for bucket in group),
+            }
+        )
+    return merged
+
+
+def downsample_analytics(
+    cost_basis_history: List[dict], accumulation_timeline: List[dict], max_points: int
+) -> Tuple[List[dict], List[dict]]:
+    """Fit both analytics series into a `max_points` budget
+
+    The cost basis curve is thinned with LTTB on cumulative sats; kept points
+    are untouched, so their running totals stay exact.
+    """
+    if len(cost_basis_history) > max_points:
+        xs = [
+            datetime.fromisoformat(point["date"]).timestamp()
+            for point in cost_basis_history
+        ]
+        ys = [point["cumulative_sats"] for point in cost_basis_history]
+        cost_basis_history = [
+            cost_basis_history[index] for index in lttb(xs, ys, max_points)
+        ]
+    return cost_basis_history, merge_buckets(accumulation_timeline, max_points)
@@ -0,0 +1,47 @@
+# Description: A bare FastAPI app serving the extension for benchmarks
+#
+# Admin key checks are replaced by a stub that trusts the X-Bench-User header,
+# so seeded users can be driven without creating LNbits wallets.
+
+from types import SimpleNamespace
+
+from fastapi import FastAPI, Request
+from lnbits.decorators import require_admin_key
+
+from .. import crud, satmachineclient_ext
+
+BENCH_USER_HEADER = "X-Bench-User"
+BENCH_BTC_PRICE = 800_000.0  # GTQ per BTC
+
+
+def create_bench_app() -> FastAPI:
+    async def bench_admin_key(request: Request) -> SimpleNamespace:
+        user_id = request.headers.get(BENCH_USER_HEADER, "")
+        return SimpleNamespace(
+            wallet=SimpleNamespace(id=f"{user_id}-wallet", user=user_id)
+        )
+
+    app = FastAPI()
+    app.include_router(satmachineclient_ext)
+    app.dependency_overrides[require_admin_key] = bench_admin_key
+    return app
+
+
+def use_fixed_exchange_rate(price: float = BENCH_BTC_PRICE) -> None:
+    """Keep the rate provider's network latency out of the measurements"""
+
+    async def fixed_price(currency: str) -> float:
+        return price
+
+    crud.rate_cache.fetcher = fixed_price
+    crud.rate_cache.invalidate()
+
+
+def reset_caches() -> None:
+    """Drop every in-process cache so the next call runs cold"""
+    crud.client_cache.clear()
+    crud.rate_cache.invalidate()
+    crud._payment_indexes.clear()
+    crud.dashboard_flights.clear()
+    crud.result_cache.clear()
+    crud._last_watermarks.clear()
@@ -0,0 +1,239 @@
+# Description: Synthetic satoshimachine dataset for benchmarks and DB tests
+#
+# Rows written here carry the BENCH_PREFIX id prefix and clear_dataset() only
+# deletes those, so a real admin database is never wiped. Still, point LNbits
+# at a scratch data folder (LNBITS_DATA_FOLDER) or a scratch PostgreSQL
+# database (LNBITS_DATABASE_URL) before seeding.
+
+import random
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, List, Optional, Protocol
+
+from lnbits.db import SQLITE
+
+from ..crud import dashboard_index_statements
+
+BENCH_PREFIX = "bench-"
+
+# Mirrors the admin extension's tables, limited to the columns read here
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS satoshimachine.dca_clients (
+        id TEXT PRIMARY KEY,
+        user_id TEXT NOT NULL,
+        wallet_id TEXT NOT NULL,
+        username TEXT,
+        dca_mode TEXT NOT NULL DEFAULT 'flow',
+        fixed_mode_daily_limit INTEGER,
+        status TEXT NOT NULL DEFAULT 'active',
+        created_at TIMESTAMP NOT NULL,
+        updated_at TIMESTAMP NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS satoshimachine.dca_deposits (
+        id TEXT PRIMARY KEY,
+        client_id TEXT NOT NULL,
+        amount DOUBLE PRECISION NOT NULL,
+        currency TEXT NOT NULL DEFAULT 'GTQ',
+        status TEXT NOT NULL DEFAULT 'pending',
+        notes TEXT,
+        created_at TIMESTAMP NOT NULL,
+        confirmed_at TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS satoshimachine.dca_payments (
+        id TEXT PRIMARY KEY,
+        client_id TEXT NOT NULL,
+        amount_sats BIGINT NOT NULL,
+        amount_fiat DOUBLE PRECISION NOT NULL,
+        exchange_rate DOUBLE PRECISION NOT NULL,
+        transaction_type TEXT NOT NULL,
+        lamassu_transaction_id TEXT,
+        payment_hash TEXT,
+        status TEXT NOT NULL DEFAULT 'pending',
+        created_at TIMESTAMP NOT NULL,
+        transaction_time TIMESTAMP
+    )
+    """,
+]
+
+# Rows per INSERT; keeps the parameter count below SQLite's default limit
+INSERT_BATCH = 80
+
+
+class DatasetDatabase(Protocol):
+    """What the dataset helpers use of a database: lnbits' Database, crud's
+    InstrumentedDatabase around it, or the tests' in-memory SQLite"""
+
+    type: str
+
+    async def execute(self, query: str, values: Optional[dict] = None) -> Any: ...
+
+    async def fetchone(self, query: str, values: Optional[dict] = None) -> Any: ...
+
+
+@dataclass
+class SeededClient:
+    client_id: str
+    user_id: str
+    wallet_id: str
+    payment_count: int = 0
+    deposit_ids: List[str] = field(default_factory=list)
+
+
+async def create_schema(db: DatasetDatabase) -> None:
+    if db.type != SQLITE:
+        await db.execute("CREATE SCHEMA IF NOT EXISTS satoshimachine")
+    for statement in SCHEMA + dashboard_index_statements(db.type):
+        await db.execute(statement)
+
+
+async def clear_dataset(db: DatasetDatabase) -> None:
+    """Delete every row written by seed_dataset()"""
+    for table in ("dca_payments", "dca_deposits", "dca_clients"):
+        await db.execute(
+            f"DELETE FROM satoshimachine.{table} WHERE id LIKE :prefix",
+            {"prefix": f"{BENCH_PREFIX}%"},
+        )
+
+
+async def count_foreign_rows(db: DatasetDatabase) -> int:
+    """Rows in the dca tables that were not written by seed_dataset()"""
+    total = 0
+    for table in ("dca_payments", "dca_deposits", "dca_clients"):
+        row = await db.fetchone(
+            f"""
+            SELECT COUNT(*) as row_count FROM satoshimachine.{table}
+            WHERE id NOT LIKE :prefix
+            """,
+            {"prefix": f"{BENCH_PREFIX}%"},
+        )
+        total += row["row_count"] if row else 0
+    return total
+
+
+async def _insert_rows(db: DatasetDatabase, table: str, rows: List[dict]) -> None:
+    if not rows:
+        return
+    columns = list(rows[0])
+    for start in range(0, len(rows), INSERT_BATCH):
+        batch = rows[start : start + INSERT_BATCH]
+        params: dict = {}
+        values = []
+        for i, row in enumerate(batch):
+            values.append("(" + ", ".join(f":{column}_{i}" for column in columns) + ")")
+            params.update({f"{column}_{i}": row[column] for column in columns})
+        await db.execute(
+            f"""
+            INSERT INTO satoshimachine.{table} ({", ".join(columns)})
+            VALUES {", ".join(values)}
+            """,
+            params,
+        )
+
+
+async def seed_dataset(
+    db: DatasetDatabase,
+    clients: int,
+    payments_per_client: int,
+    history_days: int = 3 * 365,
+    seed: int = 0,
+    now: Optional[datetime] = None,
+) -> List[SeededClient]:
+    """Seed `clients` DCA clients with `payments_per_client` payments each
+
+    Payments are spread over `history_days` with a random walk of the BTC
+    price; about 5% are left pending or failed, as the admin extension would.
+    Each client gets one deposit per 50 payments, the last one still pending.
+    Generation is deterministic for a given `seed`.
+    """
+    rng = random.Random(seed)
+    now = now or datetime.now()
+    start = now - timedelta(days=history_days)
+    seeded = []
+
+    for c in range(clients):
+        client = SeededClient(
+            client_id=f"{BENCH_PREFIX}client-{c}",
+            user_id=f"{BENCH_PREFIX}user-{c}",
+            wallet_id=f"{BENCH_PREFIX}wallet-{c}",
+            payment_count=payments_per_client,
+        )
+        await _insert_rows(
+            db,
+            "dca_clients",
+            [
+                {
+                    "id": client.client_id,
+                    "user_id": client.user_id,
+                    "wallet_id": client.wallet_id,
+                    "username": f"bench_{c}",
+                    "dca_mode": "flow" if c % 2 == 0 else "fixed",
+                    "fixed_mode_daily_limit": None if c % 2 == 0 else 500,
+                    "status": "active",
+                    "created_at": start,
+                    "updated_at": start,
+                }
+            ],
+        )
+
+        payments = []
+        fiat_spent = 0.0
+        price = 800_000.0  # GTQ per BTC
+        step = timedelta(days=history_days) / max(payments_per_client, 1)
+        for p in range(payments_per_client):
+            price *= 1 + rng.gauss(0.0005, 0.02)
+            amount_fiat = round(rng.uniform(20, 500), 2)
+            transaction_time = start + step * p
+            roll = rng.random()
+            status = (
+                "confirmed" if roll > 0.05 else ("pending" if roll > 0.02 else "failed")
+            )
+            if status == "confirmed":
+                fiat_spent += amount_fiat
+            payments.append(
+                {
+                    "id": f"{BENCH_PREFIX}payment-{c}-{p}",
+                    "client_id": client.client_id,
+                    "amount_sats": int(amount_fiat / price * 100_000_000),
+                    "amount_fiat": amount_fiat,
+                    "exchange_rate": price / 100_000_000,
+                    "transaction_type": "flow" if c % 2 == 0 else "fixed",
+                    "lamassu_transaction_id": f"{BENCH_PREFIX}lamassu-{c}-{p}",
+                    "payment_hash": f"{rng.getrandbits(256):064x}",
+                    "status": status,
+                    "created_at": transaction_time
+                    + timedelta(seconds=rng.randint(5, 90)),
+                    "transaction_time": transaction_time,
+                }
+            )
+        await _insert_rows(db, "dca_payments", payments)
+
+        deposit_count = max(payments_per_client // 50, 1)
+        deposit_amount = round(fiat_spent / deposit_count + 100, 2)
+        deposits = []
+        for d in range(deposit_count):
+            deposit_id = f"{BENCH_PREFIX}deposit-{c}-{d}"
+            created_at = start + timedelta(days=history_days) / deposit_count * d
+            confirmed = d < deposit_count - 1 or deposit_count == 1
+            deposits.append(
+                {
+                    "id": deposit_id,
+                    "client_id": client.client_id,
+                    "amount": deposit_amount,
+                    "currency": "GTQ",
+                    "status": "confirmed" if confirmed else "pending",
+                    "notes": None,
+                    "created_at": created_at,
+                    "confirmed_at": created_at if confirmed else None,
+                }
+            )
+            client.deposit_ids.append(deposit_id)
+        await _insert_rows(db, "dca_deposits", deposits)
+
+        seeded.append(client)
+
+    return seeded
@@ -0,0 +1,402 @@
+# Description: Drive mixed dashboard traffic at a given concurrency and report
+# throughput and latency percentiles per endpoint
+#
+# Each virtual user opens the dashboard like the browser does (bootstrap, then
+# the projection) and then clicks around: refreshes, chart range changes,
+# further transaction pages, an occasional export or settings change.
+# Conditional requests carry the ETags of earlier responses, as index.js does.
+# Run from an LNbits checkout with the extension installed, against a scratch
+# database (see dataset.py), e.g.:
+#
+#   LNBITS_DATA_FOLDER=/tmp/bench python -m satmachineclient.benchmarks.load \
+#       --users 50 --duration 60 --output /tmp/load-before.json
+#
+#   ... --compare /tmp/load-before.json --output /tmp/load-after.json
+
+import argparse
+import asyncio
+import json
+import platform
+import random
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional
+from urllib.parse import quote
+
+import httpx
+
+from .. import crud
+from .app import (
+    BENCH_USER_HEADER,
+    create_bench_app,
+    reset_caches,
+    use_fixed_exchange_rate,
+)
+from .dataset import (
+    SeededClient,
+    clear_dataset,
+    count_foreign_rows,
+    create_schema,
+    seed_dataset,
+)
+from .run import _percentile
+
+API = "/satmachineclient/api/v1"
+
+CHART_RANGES = ("7d", "30d", "90d", "1y", "all")
+CHART_MAX_POINTS = 500
+
+# Relative frequency of what a user does after the page has loaded
+ACTION_WEIGHTS = {
+    "refresh": 4,
+    "chart_range": 3,
+    "more_transactions": 2,
+    "export": 0.5,
+    "settings": 0.2,
+}
+
+
+class LoadRecorder:
+    """Latencies and status codes per endpoint"""
+
+    def __init__(self) -> None:
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+        self.error_samples: List[str] = []
+        self.started = time.perf_counter()
+
+    def record(self, endpoint: str, status: int, elapsed_ms: Optional[float]) -> None:
+        """Status 0 and no latency for a request that raised"""
+        self.statuses[endpoint][status] += 1
+        if elapsed_ms is not None:
+            self.latencies[endpoint].append(elapsed_ms)
+
+    def sample_error(self, endpoint: str, message: str) -> None:
+        if len(self.error_samples) < 10:
+            self.error_samples.append(f"{endpoint}: {message}")
+
+    def report(self, elapsed: Optional[float] = None) -> dict:
+        """Totals and per endpoint requests, errors, throughput and p50/p95/p99"""
+        elapsed = elapsed or time.perf_counter() - self.started
+        endpoints: Dict[str, dict] = {}
+        for endpoint in sorted(self.statuses):
+            statuses = self.statuses[endpoint]
+            samples = self.latencies[endpoint]
+            requests = sum(statuses.values())
+            endpoints[endpoint] = {
+                "requests": requests,
+                "errors": sum(
+                    n for status, n in statuses.items() if not 0 < status < 400
+                ),
+                "not_modified": statuses.get(304, 0),
+                "throughput_rps": round(requests / elapsed, 3),
+                **{
+                    f"p{pct}_ms": (
+                        round(_percentile(samples, pct / 100), 3) if samples else None
+                    )
+                    for pct in (50, 95, 99)
+                },
+                "max_ms": round(max(samples), 3) if samples else None,
+            }
+        requests = sum(stats["requests"] for stats in endpoints.values())
+        return {
+            "elapsed_s": round(elapsed, 3),
+            "requests": requests,
+            "errors": sum(stats["errors"] for stats in endpoints.values()),
+            "throughput_rps": round(requests / elapsed, 3),
+            "endpoints": endpoints,
+            "error_samples": self.error_samples,
+        }
+
+
+class VirtualUser:
+    """One dashboard tab of a seeded client"""
+
+    def __init__(
+        self,
+        http: httpx.AsyncClient,
+        client: SeededClient,
+        recorder: LoadRecorder,
+        rng: random.Random,
+    ) -> None:
+        self.http = http
+        self.headers = {BENCH_USER_HEADER: client.user_id}
+        self.recorder = recorder
+        self.rng = rng
+        self.etags: Dict[str, str] = {}
+        self.next_cursor: Optional[str] = None
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        conditional: bool = False,
+        body: Optional[dict] = None,
+    ) -> Optional[httpx.Response]:
+        endpoint = f"{method} {path.split('?')[0]}"
+        headers = dict(self.headers)
+        if conditional and path in self.etags:
+            headers["If-None-Match"] = self.etags[path]
+        started = time.perf_counter()
+        try:
+            response = await self.http.request(
+                method, f"{API}{path}", headers=headers, json=body
+            )
+        except Exception as exc:
+            self.recorder.record(endpoint, 0, None)
+            self.recorder.sample_error(endpoint, repr(exc))
+            return None
+        self.recorder.record(
+            endpoint, response.status_code, (time.perf_counter() - started) * 1000
+        )
+        if response.status_code >= 400:
+            self.recorder.sample_error(
+                endpoint, f"{response.status_code} {response.text[:200]}"
+            )
+            return None
+        if conditional and response.headers.get("etag"):
+            self.etags[path] = response.headers["etag"]
+        return response
+
+    async def page_load(self) -> None:
+        response = await self.request(
+            "GET", f"/dashboard/bootstrap?time_range=30d&max_points={CHART_MAX_POINTS}"
+        )
+        if response is not None:
+            transactions = response.json().get("transactions") or {}
+            self.next_cursor = transactions.get("next_cursor")
+        await self.request("GET", "/dashboard/projection", conditional=True)
+
+    async def refresh(self) -> None:
+        await asyncio.gather(
+            self.request("GET", "/dashboard/summary", conditional=True),
+            self.request(
+                "GET", "/dashboard/transactions?limit=50&cursor=", conditional=True
+            ),
+            self.request("GET", "/dashboard/projection", conditional=True),
+        )
+
+    async def chart_range(self) -> None:
+        time_range = self.rng.choice(CHART_RANGES)
+        await self.request(
+            "GET",
+            f"/dashboard/analytics?time_range={time_range}"
+            f"&max_points={CHART_MAX_POINTS}&format=columnar",
+            conditional=True,
+        )
+
+    async def more_transactions(self) -> None:
+        if not self.next_cursor:
+            return await self.refresh()
+        response = await self.request(
+            "GET", f"/dashboard/transactions?limit=50&cursor={quote(self.next_cursor)}"
+        )
+        self.next_cursor = response.json().get("next_cursor") if response else None
+
+    async def export(self) -> None:
+        await self.request("GET", "/dashboard/export/transactions?format=csv")
+
+    async def settings(self) -> None:
+        await self.request("PUT", "/dashboard/settings", body={"status": "active"})
+
+    async def session(self, actions: int, think_ms: float, deadline: float) -> None:
+        """A page load followed by up to `actions` random actions"""
+        await self.page_load()
+        names = list(ACTION_WEIGHTS)
+        weights = list(ACTION_WEIGHTS.values())
+        for _ in range(actions):
+            if think_ms:
+                await asyncio.sleep(self.rng.expovariate(1000 / think_ms))
+            if time.perf_counter() >= deadline:
+                return
+            action = self.rng.choices(names, weights)[0]
+            await getattr(self, action)()
+
+
+async def run_load(
+    http: httpx.AsyncClient,
+    clients: List[SeededClient],
+    users: int,
+    duration: float,
+    think_ms: float = 500.0,
+    actions: int = 5,
+    sessions: Optional[int] = None,
+    seed: int = 0,
+) -> LoadRecorder:
+    """Run `users` concurrent virtual users for `duration` seconds
+
+    Users are spread over the seeded clients round-robin and start sessions
+    back to back until the time is up or they have run `sessions` each.
+    """
+    recorder = LoadRecorder()
+    deadline = time.perf_counter() + duration
+
+    async def user(number: int) -> None:
+        virtual_user = VirtualUser(
+            http, clients[number % len(clients)], recorder, random.Random(seed + number)
+        )
+        completed = 0
+        while time.perf_counter() < deadline and (
+            sessions is None or completed < sessions
+        ):
+            await virtual_user.session(actions, think_ms, deadline)
+            completed += 1
+
+    await asyncio.gather(*(user(number) for number in range(users)))
+    return recorder
+
+
+def compare(
+    baseline: dict, current: dict, threshold: float, min_delta_ms: float
+) -> List[str]:
+    """Endpoints whose p95 got slower than the baseline by more than
+    `threshold`, ignoring differences under `min_delta_ms`"""
+    regressions = []
+    for endpoint, stats in current["endpoints"].items():
+        before = baseline["endpoints"].get(endpoint, {}).get("p95_ms")
+        after = stats["p95_ms"]
+        if before is None or after is None:
+            continue
+        if after - before > min_delta_ms and after > before * (1 + threshold):
+            regressions.append(f"{endpoint}: p95 {before:.2f}ms -> {after:.2f}ms")
+    return regressions
+
+
+def print_report(report: dict) -> None:
+    print(
+        f"{report['requests']} requests in {report['elapsed_s']:.1f}s, "
+        f"{report['throughput_rps']:.1f} req/s, {report['errors']} errors"
+    )
+    for endpoint, stats in report["endpoints"].items():
+        print(
+            f"  {endpoint:<45} {stats['requests']:>7} req"
+            f" {stats['throughput_rps']:>8.1f}/s"
+            f"  p50 {stats['p50_ms'] or 0:>9.2f}ms  p95 {stats['p95_ms'] or 0:>9.2f}ms"
+            f"  p99 {stats['p99_ms'] or 0:>9.2f}ms  errors {stats['errors']}"
+        )
+    for sample in report["error_samples"]:
+        print(f"  error: {sample}", file=sys.stderr)
+
+
+async def main(args: argparse.Namespace) -> int:
+    await create_schema(crud.db)
+    if not args.force and await count_foreign_rows(crud.db):
+        print(
+            "The satoshimachine tables hold rows that were not seeded by the "
+            "benchmark; point LNbits at a scratch database or pass --force.",
+            file=sys.stderr,
+        )
+        return 2
+    if not args.live_rates:
+        use_fixed_exchange_rate()
+
+    print(f"Seeding {args.clients} clients x {args.payments_per_client} payments ...")
+    await clear_dataset(crud.db)
+    seeded = await seed_dataset(
+        crud.db, args.clients, args.payments_per_client, seed=args.seed
+    )
+    reset_caches()
+
+    try:
+        transport = httpx.ASGITransport(app=create_bench_app())
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://bench", timeout=None
+        ) as http:
+            if args.warmup:
+                await run_load(
+                    http,
+                    seeded,
+                    args.users,
+                    args.warmup,
+                    args.think_ms,
+                    args.actions,
+                    seed=args.seed,
+                )
+            recorder = await run_load(
+                http,
+                seeded,
+                args.users,
+                args.duration,
+                args.think_ms,
+                args.actions,
+                seed=args.seed + args.users,
+            )
+    finally:
+        if not args.keep:
+            await clear_dataset(crud.db)
+
+    report = {
+        "backend": crud.db.type,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "users": args.users,
+        "duration_s": args.duration,
+        "warmup_s": args.warmup,
+        "think_ms": args.think_ms,
+        "actions": args.actions,
+        "clients": args.clients,
+        "payments_per_client": args.payments_per_client,
+        "seed": args.seed,
+        **recorder.report(),
+    }
+    print_report(report)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Wrote {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(
+            f"Throughput {baseline['throughput_rps']:.1f} -> "
+            f"{report['throughput_rps']:.1f} req/s"
+        )
+        regressions = compare(baseline, report, args.threshold, args.min_delta_ms)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            return 1
+        print(f"No regressions against {args.compare}")
+    return 1 if report["errors"] and args.fail_on_errors else 0
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Load test the satmachineclient dashboard on a synthetic dataset"
+    )
+    parser.add_argument(
+        "--users", type=int, default=20, help="concurrent virtual users"
+    )
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds measured")
+    parser.add_argument(
+        "--warmup", type=float, default=5.0, help="seconds not measured"
+    )
+    parser.add_argument(
+        "--think-ms",
+        type=float,
+        default=500.0,
+        help="mean pause between a user's actions, 0 for a closed-loop stress test",
+    )
+    parser.add_argument("--actions", type=int, default=5, help="actions per page load")
+    parser.add_argument("--clients", type=int, default=10)
+    parser.add_argument("--payments-per-client", type=int, default=2_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the report to this JSON file")
+    parser.add_argument("--compare", help="earlier report to check against")
+    parser.add_argument("--threshold", type=float, default=0.25)
+    parser.add_argument("--min-delta-ms", type=float, default=5.0)
+    parser.add_argument("--fail-on-errors", action="store_true")
+    parser.add_argument("--live-rates", action="store_true")
+    parser.add_argument("--keep", action="store_true", help="keep the seeded rows")
+    parser.add_argument("--force", action="store_true")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args())))
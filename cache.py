@@ -0,0 +1,542 @@
+# Description: Caches for the client extension's hot read paths
+#
+# Most caches live in the worker process. Computed dashboard results can also
+# go to a store shared by every LNbits worker on the host, chosen with:
+#
+#   SATMACHINECLIENT_CACHE_BACKEND    "memory" (default) or "sqlite"
+#   SATMACHINECLIENT_CACHE_PATH       SQLite file of the shared store (default
+#                                     satmachineclient/cache.sqlite3 in the
+#                                     LNbits data folder)
+#   SATMACHINECLIENT_CACHE_MAX_BYTES  size limit of either backend (64 MiB)
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    ClassVar,
+    Dict,
+    Hashable,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
+
+from lnbits.settings import settings
+from loguru import logger
+
+ENV_PREFIX = "SATMACHINECLIENT_"
+
+
+class CachedRate(NamedTuple):
+    """A BTC price in fiat and the time it was fetched"""
+
+    value: float
+    as_of: datetime
+    stale: bool = False
+
+
+class ExchangeRateCache:
+    """Per-currency exchange rate cache
+
+    - fresh values (younger than `ttl`) are served without touching the provider
+    - once a value is older than `ttl * refresh_ahead` a background refresh starts,
+      so busy dashboards never see an expired value
+    - concurrent misses for one currency share a single in-flight fetch
+    - an expired value is returned at once, flagged as stale, while it is
+      refreshed in the background; only a currency with no value yet waits
+      for the provider, and for at most `wait_timeout` seconds (None if it
+      hasn't answered by then)
+    - after a failed fetch the provider isn't asked again for `retry_after`
+      seconds, so requests don't pile fetches onto a failing provider
+    - with a `shared` result cache, a rate another worker fetched recently is
+      used instead of calling the provider again
+    """
+
+    def __init__(
+        self,
+        fetcher: Callable[[str], Awaitable[float]],
+        ttl: float = 60.0,
+        refresh_ahead: float = 0.8,
+        wait_timeout: float = 1.0,
+        retry_after: float = 10.0,
+        shared: Optional["ResultCache"] = None,
+    ):
+        self.fetcher = fetcher
+        self.ttl = ttl
+        self.refresh_ahead = refresh_ahead
+        self.wait_timeout = wait_timeout
+        self.retry_after = retry_after
+        self.shared = shared
+        self._values: Dict[str, CachedRate] = {}
+        self._fetched_at: Dict[str, float] = {}
+        self._failed_at: Dict[str, float] = {}
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    async def get(self, currency: str) -> Optional[CachedRate]:
+        """Return the cached rate for `currency`, fetching it if needed"""
+        cached = self._values.get(currency)
+        age = time.monotonic() - self._fetched_at.get(currency, float("-inf"))
+
+        if cached:
+            if age >= self.ttl * self.refresh_ahead:
+                self._refresh(currency)
+            return cached if age < self.ttl else cached._replace(stale=True)
+
+        task = self._refresh(currency)
+        if task is None:
+            return None
+        try:
+            await asyncio.wait_for(asyncio.shield(task), self.wait_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Exchange rate lookup for {currency} is slow")
+        return self._values.get(currency)
+
+    def invalidate(self, currency: Optional[str] = None) -> None:
+        """Forget cached rates so the next read refetches them"""
+        if currency is None:
+            self._values.clear()
+            self._fetched_at.clear()
+            self._failed_at.clear()
+        else:
+            self._values.pop(currency, None)
+            self._fetched_at.pop(currency, None)
+            self._failed_at.pop(currency, None)
+
+    def _refresh(self, currency: str) -> Optional[asyncio.Task]:
+        """The in-flight fetch for `currency`, started if there is none; None
+        while backing off after a failure"""
+        task = self._inflight.get(currency)
+        if task is None:
+            failed_at = self._failed_at.get(currency, float("-inf"))
+            if time.monotonic() - failed_at < self.retry_after:
+                return None
+            task = asyncio.create_task(self._fetch(currency))
+            self._inflight[currency] = task
+        return task
+
+    async def _fetch(self, currency: str) -> None:
+        key = f"rate:{currency}"
+        try:
+            stored = await self.shared.get(key) if self.shared else None
+            age = time.time() - stored["fetched_at"] if stored else self.ttl
+            if stored and age < self.ttl * self.refresh_ahead:
+                value = stored["value"]
+                as_of = datetime.fromisoformat(stored["as_of"])
+            else:
+                value = await self.fetcher(currency)
+                as_of = datetime.now()
+                age = 0.0
+                if self.shared:
+                    await self.shared.set(
+                        key,
+                        "rates",
+                        {
+                            "value": value,
+                            "as_of": as_of.isoformat(),
+                            "fetched_at": time.time(),
+                        },
+                        self.ttl,
+                    )
+            self._values[currency] = CachedRate(value=value, as_of=as_of)
+            self._fetched_at[currency] = time.monotonic() - age
+            self._failed_at.pop(currency, None)
+        except Exception as e:
+            self._failed_at[currency] = time.monotonic()
+            logger.warning(f"Could not fetch exchange rate for {currency}: {e}")
+        finally:
+            self._inflight.pop(currency, None)
+
+
+class TTLCache:
+    """Bounded LRU mapping whose entries also expire after `ttl` seconds
+
+    Counts hits and misses so callers can report the cache's effectiveness.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 30.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None or time.monotonic() - entry[0] >= self.ttl:
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self._entries[key] = (time.monotonic(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        self._entries.pop(key, None)
+
+    def invalidate_where(self, predicate: Callable[[Any], bool]) -> None:
+        """Drop every entry whose value matches `predicate`"""
+        for key in [k for k, (_, v) in self._entries.items() if predicate(v)]:
+            del self._entries[key]
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+
+class SingleFlight:
+    """Coalesces concurrent identical calls into one computation
+
+    Callers passing the same key while a call is in flight await that call
+    instead of starting their own; its result is then memoized for `ttl`
+    seconds. Keys are tuples whose first element is the owner (a client id),
+    so `invalidate(owner)` forgets everything computed for one client. Errors
+    are shared with the waiting callers but not memoized.
+    """
+
+    def __init__(self, ttl: float = 2.0, maxsize: int = 4096):
+        self.memo = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.coalesced = 0
+        self._inflight: Dict[Tuple, asyncio.Task] = {}
+
+    async def do(self, key: Tuple, compute: Callable[[], Awaitable[Any]]) -> Any:
+        memoized = self.memo.get(key)
+        if memoized is not None:
+            return memoized[1]
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._run(key, compute))
+            self._inflight[key] = task
+        else:
+            self.coalesced += 1
+        # A caller going away (client disconnect) mustn't cancel the others
+        return await asyncio.shield(task)
+
+    async def _run(self, key: Tuple, compute: Callable[[], Awaitable[Any]]) -> Any:
+        task = asyncio.current_task()
+        try:
+            result = await compute()
+            # Not memoized if the owner was invalidated meanwhile
+            if self._inflight.get(key) is task:
+                self.memo.set(key, (key[0], result))
+            return result
+        finally:
+            if self._inflight.get(key) is task:
+                del self._inflight[key]
+
+    def invalidate(self, owner: Hashable) -> None:
+        """Forget memoized results of `owner`; later calls don't join calls
+        already in flight, which may have read older data"""
+        self.memo.invalidate_where(lambda entry: entry[0] == owner)
+        for key in [key for key in self._inflight if key[0] == owner]:
+            del self._inflight[key]
+
+    def clear(self) -> None:
+        self.memo.clear()
+        self._inflight.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {**self.memo.stats(), "coalesced": self.coalesced}
+
+
+class ResultCache(ABC):
+    """Interface of the computed-result cache backends
+
+    Keys are strings and values JSON-serializable. A failing backend never
+    fails a request: errors are logged and count as misses. Every entry belongs to an
+    owner (a client id) so `invalidate(owner)` drops all of its entries;
+    callers put the client's data watermark into the key, so new payments or
+    deposits make older entries unreachable and they age out. Entries expire
+    after their `ttl`, and the least recently used ones are evicted once the
+    values exceed `max_bytes`.
+    """
+
+    name = "none"
+    shared = False
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[Any]:
+        """The value stored under `key`, or None if missing or expired"""
+
+    @abstractmethod
+    async def set(self, key: str, owner: str, value: Any, ttl: float) -> None:
+        """Store `value` under `key` for `ttl` seconds"""
+
+    @abstractmethod
+    async def invalidate(self, owner: str) -> None:
+        """Drop every entry of `owner`"""
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Drop every entry"""
+
+    @abstractmethod
+    def stats(self) -> Dict[str, int]:
+        """Hits, misses, size and bytes; never does I/O, since /metrics reads
+        it on the event loop"""
+
+
+class MemoryResultCache(ResultCache):
+    """Per-worker LRU, sized by the JSON length of its values"""
+
+    name = "memory"
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        super().__init__(max_bytes)
+        self.bytes = 0
+        # key -> (owner, expires_at, size, value)
+        self._entries: "OrderedDict[str, Tuple[str, float, int, Any]]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None or entry[1] <= time.monotonic():
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[3]
+
+    async def set(self, key: str, owner: str, value: Any, ttl: float) -> None:
+        size = len(json.dumps(value, separators=(",", ":")))
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (owner, time.monotonic() + ttl, size, value)
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+
+    async def invalidate(self, owner: str) -> None:
+        for key in [k for k, entry in self._entries.items() if entry[0] == owner]:
+            self._remove(key)
+
+    def _remove(self, key: str) -> None:
+        self.bytes -= self._entries.pop(key)[2]
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._entries),
+            "bytes": self.bytes,
+        }
+
+
+class SQLiteResultCache(ResultCache):
+    """Store in a local SQLite file shared by every worker on the host
+
+    The file survives restarts. Queries are short and run in a thread; WAL
+    mode lets workers read while one of them writes. Hits and misses are
+    counted per worker. Size and bytes are the store's: kept as running
+    totals of this worker's writes, and recounted at most every
+    `recount_interval` seconds and before evicting, so other workers'
+    writes show up too.
+    """
+
+    name = "sqlite"
+    shared = True
+
+    SCHEMA: ClassVar[List[str]] = [
+        """
+        CREATE TABLE IF NOT EXISTS results (
+            key TEXT PRIMARY KEY,
+            owner TEXT NOT NULL,
+            value TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            expires_at REAL NOT NULL,
+            used_at REAL NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS results_owner ON results (owner)",
+        "CREATE INDEX IF NOT EXISTS results_used_at ON results (used_at)",
+    ]
+
+    def __init__(
+        self,
+        path: str,
+        max_bytes: int = 64 * 1024 * 1024,
+        recount_interval: float = 30.0,
+    ):
+        super().__init__(max_bytes)
+        self.path = path
+        self.recount_interval = recount_interval
+        self.entries = 0
+        self.bytes = 0
+        self._counted_at = 0.0
+        self._lock = threading.Lock()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=2.0)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            for statement in self.SCHEMA:
+                self._conn.execute(statement)
+            self._recount()
+
+    async def get(self, key: str) -> Optional[Any]:
+        try:
+            value = await asyncio.to_thread(self._get, key)
+        except sqlite3.Error as e:
+            logger.warning(f"Shared result cache read failed: {e}")
+            value = None
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(value)
+
+    async def set(self, key: str, owner: str, value: Any, ttl: float) -> None:
+        encoded = json.dumps(value, separators=(",", ":"))
+        if len(encoded) > self.max_bytes:
+            return
+        try:
+            await asyncio.to_thread(self._set, key, owner, encoded, ttl)
+        except sqlite3.Error as e:
+            logger.warning(f"Shared result cache write failed: {e}")
+
+    async def invalidate(self, owner: str) -> None:
+        try:
+            await asyncio.to_thread(self._invalidate, owner)
+        except sqlite3.Error as e:
+            logger.warning(f"Shared result cache invalidation failed: {e}")
+
+    def clear(self) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM results")
+            self.entries = self.bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": self.entries,
+            "bytes": self.bytes,
+        }
+
+    def _get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at, used_at FROM results WHERE key = ?", (key,)
+            ).fetchone()
+            self._maybe_recount()
+            if row is None or row[1] <= now:
+                return None
+            # Recency only needs to be roughly right; spare most hits a write
+            if now - row[2] > 1.0:
+                with self._conn:
+                    self._conn.execute(
+                        "UPDATE results SET used_at = ? WHERE key = ?", (now, key)
+                    )
+            return row[0]
+
+    def _set(self, key: str, owner: str, encoded: str, ttl: float) -> None:
+        now = time.time()
+        with self._lock, self._conn:
+            replaced = self._conn.execute(
+                "SELECT size FROM results WHERE key = ?", (key,)
+            ).fetchone()
+            self._conn.execute(
+                """
+                INSERT OR REPLACE INTO results
+                    (key, owner, value, size, expires_at, used_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                (key, owner, encoded, len(encoded), now + ttl, now),
+            )
+            self.entries += replaced is None
+            self.bytes += len(encoded) - (replaced[0] if replaced else 0)
+            self._maybe_recount()
+            if self.bytes > self.max_bytes:
+                # Other workers may have evicted already
+                self._recount()
+            if self.bytes > self.max_bytes:
+                self._conn.execute("DELETE FROM results WHERE expires_at <= ?", (now,))
+                self._evict()
+                self._recount()
+
+    def _evict(self) -> None:
+        """Drop least recently used entries until the store fits"""
+        excess = self.bytes - self.max_bytes
+        doomed: List[str] = []
+        for key, size in self._conn.execute(
+            "SELECT key, size FROM results ORDER BY used_at"
+        ):
+            if excess <= 0:
+                break
+            doomed.append(key)
+            excess -= size
+        self._conn.executemany(
+            "DELETE FROM results WHERE key = ?", [(k,) for k in doomed]
+        )
+
+    def _invalidate(self, owner: str) -> None:
+        with self._lock, self._conn:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results WHERE owner = ?",
+                (owner,),
+            ).fetchone()
+            self._conn.execute("DELETE FROM results WHERE owner = ?", (owner,))
+            self.entries -= entries
+            self.bytes -= size
+            self._maybe_recount()
+
+    def _maybe_recount(self) -> None:
+        if time.monotonic() - self._counted_at >= self.recount_interval:
+            self._recount()
+
+    def _recount(self) -> None:
+        """Exact totals, including other workers' writes; a full scan"""
+        self.entries, self.bytes = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results"
+        ).fetchone()
+        self._counted_at = time.monotonic()
+
+
+def result_cache_from_env() -> ResultCache:
+    max_bytes = int(os.environ.get(f"{ENV_PREFIX}CACHE_MAX_BYTES") or 64 * 1024 * 1024)
+    backend = os.environ.get(f"{ENV_PREFIX}CACHE_BACKEND", "memory")
+    if backend == "sqlite":
+        path = os.environ.get(f"{ENV_PREFIX}CACHE_PATH") or str(
+            Path(settings.lnbits_data_folder, "satmachineclient", "cache.sqlite3")
+        )
+        try:
+            return SQLiteResultCache(path, max_bytes)
+        except sqlite3.Error as e:
+            logger.warning(
+                f"Shared result cache at {path} unavailable ({e}), using memory"
+            )
+    elif backend != "memory":
+        logger.warning(f"Unknown cache backend {backend!r}, using memory")
+    return MemoryResultCache(max_bytes)
@@ -0,0 +1,110 @@
+# Description: Column-oriented wire format for the dashboard's long series
+#
+# With format=columnar a list of records becomes one array per field, so key
+# names are sent once instead of once per row, and times are epoch seconds
+# instead of ISO strings:
+#
+#   moments (payment times, cost basis points)  seconds since the epoch
+#   calendar days (accumulation buckets)        midnight UTC of that day
+#
+# Payloads are JSON, or MessagePack when the client accepts
+# application/msgpack and the optional msgpack package is installed.
+
+import calendar
+import json
+from datetime import date
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+from .analytics import to_datetime
+from .models import ClientAnalytics, ClientTransaction
+
+try:
+    import msgpack
+except ImportError:  # optional, JSON is always available
+    msgpack = None
+
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+
+
+def epoch_seconds(value: Any) -> Optional[int]:
+    moment = to_datetime(value)
+    return int(moment.timestamp()) if moment else None
+
+
+def day_epoch_seconds(value: str) -> int:
+    return calendar.timegm(date.fromisoformat(value).timetuple())
+
+
+def _same(value: Any) -> Any:
+    return value
+
+
+COST_BASIS_COLUMNS: Dict[str, Callable[[Any], Any]] = {
+    "date": epoch_seconds,
+    "average_cost_basis": _same,
+    "cumulative_sats": _same,
+    "cumulative_fiat": _same,
+}
+
+TIMELINE_COLUMNS: Dict[str, Callable[[Any], Any]] = {
+    "date": day_epoch_seconds,
+    "sats": _same,
+    "fiat": _same,
+    "transactions": _same,
+}
+
+TRANSACTION_COLUMNS: Dict[str, Callable[[Any], Any]] = {
+    field: epoch_seconds if field in ("created_at", "transaction_time") else _same
+    for field in ClientTransaction.__fields__
+}
+
+
+def to_columns(
+    rows: Sequence[Any],
+    converters: Dict[str, Callable[[Any], Any]],
+    get: Callable[[Any, str], Any] = dict.__getitem__,
+) -> Dict[str, List[Any]]:
+    """One list per field; `get` reads a field from a row"""
+    return {
+        field: [convert(get(row, field)) for row in rows]
+        for field, convert in converters.items()
+    }
+
+
+def columnar_analytics(analytics: ClientAnalytics) -> dict:
+    """ClientAnalytics with both series as columns"""
+    return {
+        "user_id": analytics.user_id,
+        "cost_basis_history": to_columns(
+            analytics.cost_basis_history, COST_BASIS_COLUMNS
+        ),
+        "accumulation_timeline": to_columns(
+            analytics.accumulation_timeline, TIMELINE_COLUMNS
+        ),
+        "transaction_frequency": analytics.transaction_frequency,
+        "performance_vs_market": analytics.performance_vs_market,
+    }
+
+
+def columnar_transactions(
+    transactions: Iterable[ClientTransaction], next_cursor: Optional[str] = None
+) -> dict:
+    """A transaction list or page with the transactions as columns"""
+    return {
+        "transactions": to_columns(list(transactions), TRANSACTION_COLUMNS, getattr),
+        "next_cursor": next_cursor,
+    }
+
+
+def negotiate_media_type(accept: str) -> str:
+    """MessagePack if the client asks for it and it is available, else JSON"""
+    if msgpack is not None and MSGPACK_MEDIA_TYPE in accept:
+        return MSGPACK_MEDIA_TYPE
+    return JSON_MEDIA_TYPE
+
+
+def encode(payload: dict, media_type: str) -> bytes:
+    if media_type == MSGPACK_MEDIA_TYPE:
+        return msgpack.packb(payload, use_bin_type=True)
+    return json.dumps(payload, separators=(",", ":")).encode()
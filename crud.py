@@ -1,22 +1,212 @@
 # Description: Client extension CRUD operations - reads from admin extension database
 
-from typing import List, Optional
-from datetime import datetime, timedelta
+import asyncio
+import base64
+import hashlib
+import json
+import time
+from contextvars import ContextVar
+from decimal import Decimal
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+from datetime import date, datetime, timedelta
 
-from lnbits.db import Database
+from lnbits.db import SQLITE, Database
 from lnbits.utils.exchange_rates import satoshis_amount_as_fiat
-from lnbits.core.crud.wallets import get_wallet
+from loguru import logger
 
+from .analytics import SATS_PER_BTC, PaymentIndex, downsample_analytics, to_datetime
+from .cache import (
+    CachedRate,
+    ExchangeRateCache,
+    SingleFlight,
+    TTLCache,
+    result_cache_from_env,
+)
+from .metrics import InstrumentedDatabase, metrics
+from .projection import project
+from .replica import read_target
 from .models import (
     ClientDashboardSummary,
     ClientTransaction,
+    ClientTransactionPage,
     ClientAnalytics,
+    ClientProjection,
     UpdateClientSettings,
     ClientRegistrationData,
 )
 
-# Connect to admin extension's database
-db = Database("ext_satoshimachine")
+# Connect to admin extension's database; every query is timed per caller
+db = InstrumentedDatabase(Database("ext_satoshimachine"))
+
+
+# Set for the rest of a request whose client the read target hasn't caught up
+# with yet (see get_client_watermark)
+_primary_reads: ContextVar[bool] = ContextVar(
+    "satmachineclient_primary_reads", default=False
+)
+
+
+def _read_db():
+    """Database for read-only queries: the configured read target (replica or
+    snapshot) while it keeps up, the admin database otherwise"""
+    if _primary_reads.get():
+        return db
+    return read_target.choose(db)
+
+# Indexes the dashboard's queries are written against, as (name, table,
+# columns). The tables belong to the admin extension, which creates them;
+# they are listed here for its migrations, the benchmarks and the query-plan
+# tests. Every query filters by client first, then by status and/or time, so
+# each one is a seek rather than a scan of the client's rows.
+DASHBOARD_INDEXES = [
+    # client lookup on every request
+    ("dca_clients_user", "dca_clients", "user_id"),
+    # transaction pages and exports (keyset on created_at, id), index deltas
+    ("dca_payments_client_created", "dca_payments", "client_id, created_at, id"),
+    # confirmed aggregates and watermarks, covered without touching the table
+    (
+        "dca_payments_client_status_created",
+        "dca_payments",
+        "client_id, status, created_at",
+    ),
+    ("dca_deposits_client_status", "dca_deposits", "client_id, status"),
+]
+
+
+def dashboard_index_statements(db_type: str) -> List[str]:
+    """CREATE INDEX statements for DASHBOARD_INDEXES in the given dialect"""
+    if db_type == SQLITE:
+        # SQLite qualifies the index name and leaves the table bare
+        template = (
+            "CREATE INDEX IF NOT EXISTS satoshimachine.{name} ON {table} ({columns})"
+        )
+    else:
+        template = (
+            "CREATE INDEX IF NOT EXISTS {name} ON satoshimachine.{table} ({columns})"
+        )
+    return [
+        template.format(name=name, table=table, columns=columns)
+        for name, table, columns in DASHBOARD_INDEXES
+    ]
+
+
+# Deposits and DCA payments are recorded in GTQ
+DASHBOARD_CURRENCY = "GTQ"
+
+
+async def _fetch_btc_price(currency: str) -> float:
+    """Price of one BTC in `currency` from LNbits' exchange rate providers"""
+    started = time.perf_counter()
+    try:
+        return await satoshis_amount_as_fiat(SATS_PER_BTC, currency)
+    except Exception:
+        metrics.inc("exchange_rate_fetch_errors_total", currency=currency)
+        raise
+    finally:
+        metrics.observe(
+            "exchange_rate_fetch_duration_seconds",
+            time.perf_counter() - started,
+            currency=currency,
+        )
+
+
+# Computed summaries and analytics, per worker or in a store shared by every
+# worker on the host (see cache.py)
+result_cache = result_cache_from_env()
+metrics.register_cache(f"results_{result_cache.name}", result_cache)
+
+# Shared per-currency BTC price cache, so dashboard reads don't wait on the
+# exchange rate providers
+rate_cache = ExchangeRateCache(
+    _fetch_btc_price, ttl=60.0, shared=result_cache if result_cache.shared else None
+)
+
+
+# user_id -> dca_clients row; every dashboard request starts with this lookup
+client_cache = TTLCache(maxsize=1024, ttl=30.0)
+metrics.register_cache("client", client_cache)
+
+# Identical summary and analytics computations for one client (several tabs,
+# repeated chart loads) share a single run and its result for a moment. Keys
+# start with the client id; entries are dropped when the client's watermark
+# moves or its settings change.
+dashboard_flights = SingleFlight(ttl=2.0)
+metrics.register_cache("dashboard", dashboard_flights)
+
+# client_id -> (monotonic time, watermark) of the last watermark query, kept
+# for a while to tell when a client's watermark moves
+_last_watermarks = TTLCache(maxsize=4096, ttl=60.0)
+
+# Results are cached under the watermark the request's ETag was computed from
+# just before; calls without a recent one skip the result cache rather than
+# pay for another watermark query
+WATERMARK_REUSE_SECONDS = 1.0
+RESULT_TTL = 300.0
+# Projections only move with new payments and the date, and cost far more
+PROJECTION_TTL = 3600.0
+
+
+def _result_key(client_id: str, parts: tuple) -> Optional[str]:
+    recorded = _last_watermarks.get(client_id)
+    if recorded is None or time.monotonic() - recorded[0] > WATERMARK_REUSE_SECONDS:
+        return None
+    digest = hashlib.sha256(repr((recorded[1], parts)).encode()).hexdigest()[:32]
+    return f"{client_id}:{digest}"
+
+
+async def _cached_result(
+    client_id: str,
+    parts: tuple,
+    compute: Callable[[], Awaitable[Any]],
+    encode: Callable[[Any], Any],
+    decode: Callable[[Any], Any],
+    ttl: float = RESULT_TTL,
+) -> Any:
+    """`compute()`, or its cached result for the client's current watermark"""
+    key = _result_key(client_id, parts)
+    if key is None:
+        return await compute()
+    cached = await result_cache.get(key)
+    if cached is not None:
+        return decode(cached)
+    result = await compute()
+    if result is not None:
+        await result_cache.set(key, client_id, encode(result), ttl)
+    return result
+
+
+def _plain_row(row: Any) -> dict:
+    """A result row as JSON-safe values"""
+    plain = {}
+    for key, value in dict(row).items():
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        elif isinstance(value, Decimal):
+            value = int(value) if value == value.to_integral_value() else float(value)
+        plain[key] = value
+    return plain
+
+
+async def get_client_by_user_id(user_id: str) -> Optional[dict]:
+    """Get client by user_id - returns dict instead of model for easier access
+    
+    Rows are cached for a short TTL; register_dca_client and
+    update_client_dca_settings invalidate the entry. Unregistered users are
+    not cached so a fresh registration shows up immediately.
+    """
+    client = client_cache.get(user_id)
+    if client is not None:
+        return client
+    # Always the primary, so registrations and settings show up at once
+    row = await db.fetchone(
+        "SELECT * FROM satoshimachine.dca_clients WHERE user_id = :user_id",
+        {"user_id": user_id}
+    )
+    if not row:
+        return None
+    client = dict(row)
+    client_cache.set(user_id, client)
+    return client
 
 
 ###################################################
@@ -24,95 +214,91 @@ db = Database("ext_satoshimachine")
 ###################################################
 
 async def get_client_dashboard_summary(user_id: str) -> Optional[ClientDashboardSummary]:
-    """Get dashboard summary for a specific user"""
+    """Get dashboard summary for a specific user
+    
+    Concurrent requests for one client share a single aggregation query,
+    whose result is cached under the client's watermark.
+    """
     
     # Get client info
-    client = await db.fetchone(
-        "SELECT * FROM satoshimachine.dca_clients WHERE user_id = :user_id",
-        {"user_id": user_id}
-    )
+    client = await get_client_by_user_id(user_id)
     
     if not client:
         return None
     
-    # Get wallet to determine currency
-    wallet = await get_wallet(client["wallet_id"])
-    # TODO: Get currency from wallet; bit more difficult to do in a different 
-    # currency than deposit cause of cross exchange rates
-    # currency = wallet.currency or "GTQ"  # Default to GTQ if no currency set
-    currency = "GTQ"  # Default to GTQ if no currency set
+    currency = DASHBOARD_CURRENCY
     
-    # Get total sats accumulated from DCA transactions
-    sats_result = await db.fetchone(
-        """
-        SELECT COALESCE(SUM(amount_sats), 0) as total_sats 
-        FROM satoshimachine.dca_payments 
-        WHERE client_id = :client_id AND status = 'confirmed'
-        """,
-        {"client_id": client["id"]}
+    totals = await dashboard_flights.do(
+        (client["id"], "summary"),
+        lambda: _cached_result(
+            client["id"],
+            ("summary",),
+            lambda: _fetch_summary_totals(client["id"]),
+            _plain_row,
+            dict,
+        ),
     )
-    
-    # Get total confirmed deposits (this is the "total invested")
-    deposits_result = await db.fetchone(
-        """
-        SELECT COALESCE(SUM(amount), 0) as confirmed_deposits
-        FROM satoshimachine.dca_deposits 
-        WHERE client_id = :client_id AND status = 'confirmed'
-        """,
-        {"client_id": client["id"]}
-    )
-    
-    # Get total pending deposits (for additional info)
-    pending_deposits_result = await db.fetchone(
-        """
-        SELECT COALESCE(SUM(amount), 0) as pending_deposits
-        FROM satoshimachine.dca_deposits 
-        WHERE client_id = :client_id AND status = 'pending'
-        """,
-        {"client_id": client["id"]}
-    )
-    
-    # Get total fiat spent on DCA transactions (to calculate remaining balance)
-    dca_spent_result = await db.fetchone(
-        """
-        SELECT COALESCE(SUM(amount_fiat), 0) as dca_spent
-        FROM satoshimachine.dca_payments 
-        WHERE client_id = :client_id AND status = 'confirmed'
-        """,
-        {"client_id": client["id"]}
-    )
-    
-    # Get transaction count and last transaction date
-    tx_stats = await db.fetchone(
+    rate = await rate_cache.get(currency)
+    return _build_summary(user_id, client, totals, currency, rate)
+
+
+async def _fetch_summary_totals(client_id: str) -> Any:
+    # Aggregate payments and deposits in a single round-trip; each table is
+    # scanned once and split by status with conditional aggregates
+    return await _read_db().fetchone(
         """
-        SELECT 
-            COUNT(*) as tx_count,
-            MAX(created_at) as last_tx_date
-        FROM satoshimachine.dca_payments 
-        WHERE client_id = :client_id AND status = 'confirmed'
+        SELECT
+            payments.total_sats,
+            payments.dca_spent,
+            payments.tx_count,
+            payments.last_tx_date,
+            deposits.confirmed_deposits,
+            deposits.pending_deposits
+        FROM (
+            SELECT
+                COALESCE(SUM(amount_sats), 0) as total_sats,
+                COALESCE(SUM(amount_fiat), 0) as dca_spent,
+                COUNT(*) as tx_count,
+                MAX(created_at) as last_tx_date
+            FROM satoshimachine.dca_payments 
+            WHERE client_id = :client_id AND status = 'confirmed'
+        ) payments,
+        (
+            SELECT
+                COALESCE(SUM(CASE WHEN status = 'confirmed' THEN amount ELSE 0 END), 0)
+                    as confirmed_deposits,
+                COALESCE(SUM(CASE WHEN status = 'pending' THEN amount ELSE 0 END), 0)
+                    as pending_deposits
+            FROM satoshimachine.dca_deposits 
+            WHERE client_id = :client_id
+        ) deposits
         """,
-        {"client_id": client["id"]}
+        {"client_id": client_id},
+        name="get_client_dashboard_summary"
     )
+
+
+def _build_summary(
+    user_id: str, client, totals, currency: str, rate: Optional[CachedRate]
+) -> ClientDashboardSummary:
+    """Derive the dashboard metrics from a client's payment and deposit totals"""
     
     # Extract values from query results
-    total_sats = sats_result["total_sats"] if sats_result else 0
-    confirmed_deposits = deposits_result["confirmed_deposits"] if deposits_result else 0
-    pending_deposits = pending_deposits_result["pending_deposits"] if pending_deposits_result else 0
-    dca_spent = dca_spent_result["dca_spent"] if dca_spent_result else 0
+    total_sats = totals["total_sats"] if totals else 0
+    confirmed_deposits = totals["confirmed_deposits"] if totals else 0
+    pending_deposits = totals["pending_deposits"] if totals else 0
+    dca_spent = totals["dca_spent"] if totals else 0
     
     # Calculate metrics
     total_invested = confirmed_deposits  # Total invested = all confirmed deposits
     remaining_balance = confirmed_deposits - dca_spent  # Remaining = deposits - DCA spending
     avg_cost_basis = total_sats / dca_spent if dca_spent > 0 else 0  # Cost basis = sats / GTQ
     
-    # Calculate current fiat value of total sats
-    current_sats_fiat_value = 0.0
-    if total_sats > 0:
-        try:
-            current_sats_fiat_value = await satoshis_amount_as_fiat(total_sats, currency)
-        except Exception as e:
-            print(f"Warning: Could not fetch exchange rate for {currency}: {e}")
-            current_sats_fiat_value = 0.0
+    # Calculate current fiat value of total sats from the cached BTC price
+    # Without any known price the value is unknown, not zero
+    current_sats_fiat_value = (
+        total_sats * rate.value / SATS_PER_BTC if rate else None
+    )
     
     return ClientDashboardSummary(
         user_id=user_id,
@@ -122,14 +308,173 @@ async def get_client_dashboard_summary(user_id: str) -> Optional[ClientDashboard
         current_sats_fiat_value=current_sats_fiat_value,  # Current fiat value of sats
         average_cost_basis=avg_cost_basis,
         current_fiat_balance=remaining_balance,  # Confirmed deposits - DCA spent
-        total_transactions=tx_stats["tx_count"] if tx_stats else 0,
+        total_transactions=totals["tx_count"] if totals else 0,
         dca_mode=client["dca_mode"],
         dca_status=client["status"],
-        last_transaction_date=tx_stats["last_tx_date"] if tx_stats else None,
-        currency=currency  # Wallet's currency
+        last_transaction_date=totals["last_tx_date"] if totals else None,
+        currency=currency,  # Wallet's currency
+        exchange_rate_as_of=rate.as_of if rate else None,
+        exchange_rate_stale=rate.stale if rate else True,
     )
 
 
+# Most user ids per batched summary query, well below SQLite's parameter limit
+SUMMARY_BATCH_SIZE = 500
+
+
+async def iter_dashboard_summaries(
+    user_ids: Optional[List[str]] = None,
+    batch_size: int = SUMMARY_BATCH_SIZE
+) -> AsyncIterator[List[ClientDashboardSummary]]:
+    """Yield dashboard summaries for many clients, one batch per query
+    
+    Payments and deposits are aggregated with GROUP BY client_id, so each
+    batch is a single statement whatever its size; without `user_ids` every
+    client is covered by one query. The BTC price is looked up once. Users
+    that aren't registered are skipped.
+    """
+    currency = DASHBOARD_CURRENCY
+    rate = await rate_cache.get(currency)
+    
+    if user_ids is None:
+        batches: List[Optional[List[str]]] = [None]
+    else:
+        batches = [
+            user_ids[i : i + batch_size] for i in range(0, len(user_ids), batch_size)
+        ]
+    
+    for batch in batches:
+        client_filter = ""
+        where_clause = ""
+        params: dict = {}
+        if batch is not None:
+            placeholders, params = _in_clause("user_id_", batch)
+            where_clause = f"WHERE c.user_id IN ({placeholders})"
+            client_filter = f"""
+                AND client_id IN (
+                    SELECT id FROM satoshimachine.dca_clients
+                    WHERE user_id IN ({placeholders})
+                )"""
+        rows = await _read_db().fetchall(
+            f"""
+            SELECT
+                c.id,
+                c.user_id,
+                c.dca_mode,
+                c.status,
+                COALESCE(payments.total_sats, 0) as total_sats,
+                COALESCE(payments.dca_spent, 0) as dca_spent,
+                COALESCE(payments.tx_count, 0) as tx_count,
+                payments.last_tx_date,
+                COALESCE(deposits.confirmed_deposits, 0) as confirmed_deposits,
+                COALESCE(deposits.pending_deposits, 0) as pending_deposits
+            FROM satoshimachine.dca_clients c
+            LEFT JOIN (
+                SELECT
+                    client_id,
+                    SUM(amount_sats) as total_sats,
+                    SUM(amount_fiat) as dca_spent,
+                    COUNT(*) as tx_count,
+                    MAX(created_at) as last_tx_date
+                FROM satoshimachine.dca_payments 
+                WHERE status = 'confirmed' {client_filter}
+                GROUP BY client_id
+            ) payments ON payments.client_id = c.id
+            LEFT JOIN (
+                SELECT
+                    client_id,
+                    SUM(CASE WHEN status = 'confirmed' THEN amount ELSE 0 END)
+                        as confirmed_deposits,
+                    SUM(CASE WHEN status = 'pending' THEN amount ELSE 0 END)
+                        as pending_deposits
+                FROM satoshimachine.dca_deposits 
+                WHERE 1 = 1 {client_filter}
+                GROUP BY client_id
+            ) deposits ON deposits.client_id = c.id
+            {where_clause}
+            ORDER BY c.user_id
+            """,
+            params
+        )
+        if rows:
+            yield [
+                _build_summary(row["user_id"], row, row, currency, rate)
+                for row in rows
+            ]
+
+
+async def get_dashboard_summaries(
+    user_ids: Optional[List[str]] = None
+) -> List[ClientDashboardSummary]:
+    """Dashboard summaries of `user_ids` (every client if None), see
+    iter_dashboard_summaries"""
+    summaries: List[ClientDashboardSummary] = []
+    async for batch in iter_dashboard_summaries(user_ids):
+        summaries.extend(batch)
+    return summaries
+
+
+def _transaction_filters(
+    client_id: str,
+    transaction_type: Optional[str] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None
+) -> Tuple[List[str], dict]:
+    """Build WHERE conditions and params shared by the transaction queries"""
+    where_conditions = ["client_id = :client_id"]
+    params: dict = {"client_id": client_id}
+    
+    if transaction_type:
+        where_conditions.append("transaction_type = :transaction_type")
+        params["transaction_type"] = transaction_type
+    
+    if start_date:
+        where_conditions.append("created_at >= :start_date")
+        params["start_date"] = start_date
+    
+    if end_date:
+        where_conditions.append("created_at <= :end_date")
+        params["end_date"] = end_date
+    
+    return where_conditions, params
+
+
+def _row_to_transaction(tx) -> ClientTransaction:
+    return ClientTransaction(
+        id=tx["id"],
+        amount_sats=tx["amount_sats"],
+        amount_fiat=tx["amount_fiat"],
+        exchange_rate=tx["exchange_rate"],
+        transaction_type=tx["transaction_type"],
+        status=tx["status"],
+        created_at=tx["created_at"],
+        transaction_time=tx["transaction_time"],
+        lamassu_transaction_id=tx["lamassu_transaction_id"]
+    )
+
+
+def encode_transaction_cursor(created_at: Any, tx_id: str) -> str:
+    """Opaque cursor pointing just past the (created_at, id) of a transaction"""
+    if isinstance(created_at, datetime):
+        created_at = created_at.isoformat()
+    raw = json.dumps([created_at, tx_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_transaction_cursor(cursor: str) -> Tuple[Any, str]:
+    """Inverse of encode_transaction_cursor, raises ValueError if malformed"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, tx_id = json.loads(base64.urlsafe_b64decode(padded))
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
+    if isinstance(created_at, str):
+        created_at = datetime.fromisoformat(created_at)
+    elif not isinstance(created_at, (int, float)):
+        raise ValueError("Invalid cursor")
+    return created_at, str(tx_id)
+
+
 async def get_client_transactions(
     user_id: str, 
     limit: int = 50,
@@ -141,293 +486,735 @@ async def get_client_transactions(
     """Get client's transaction history with filtering"""
     
     # Get client ID first
-    client = await db.fetchone(
-        "SELECT id FROM satoshimachine.dca_clients WHERE user_id = :user_id",
-        {"user_id": user_id}
-    )
+    client = await get_client_by_user_id(user_id)
     
     if not client:
         return []
     
     # Build query with filters
-    where_conditions = ["client_id = :client_id"]
-    params = {"client_id": client["id"], "limit": limit, "offset": offset}
+    where_conditions, params = _transaction_filters(
+        client["id"], transaction_type, start_date, end_date
+    )
+    params.update({"limit": limit, "offset": offset})
+    where_clause = " AND ".join(where_conditions)
     
-    if transaction_type:
-        where_conditions.append("transaction_type = :transaction_type")
-        params["transaction_type"] = transaction_type
+    transactions = await _read_db().fetchall(
+        f"""
+        SELECT id, amount_sats, amount_fiat, exchange_rate, transaction_type, 
+               status, created_at, transaction_time, lamassu_transaction_id
+        FROM satoshimachine.dca_payments 
+        WHERE {where_clause}
+        ORDER BY created_at DESC, id DESC
+        LIMIT :limit OFFSET :offset
+        """,
+        params
+    )
     
-    if start_date:
-        where_conditions.append("created_at >= :start_date")
-        params["start_date"] = start_date
+    return [_row_to_transaction(tx) for tx in transactions]
+
+
+async def _fetch_transactions_after(
+    client_id: str,
+    limit: int,
+    after: Optional[Tuple[Any, str]] = None,
+    transaction_type: Optional[str] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None
+) -> list:
+    """Fetch up to `limit` rows ordered by (created_at, id) descending that
+    come strictly after the `after` key"""
+    where_conditions, params = _transaction_filters(
+        client_id, transaction_type, start_date, end_date
+    )
     
-    if end_date:
-        where_conditions.append("created_at <= :end_date")
-        params["end_date"] = end_date
+    if after:
+        where_conditions.append(
+            "(created_at < :cursor_created_at"
+            " OR (created_at = :cursor_created_at AND id < :cursor_id))"
+        )
+        params["cursor_created_at"], params["cursor_id"] = after
     
+    params["limit"] = limit
     where_clause = " AND ".join(where_conditions)
     
-    transactions = await db.fetchall(
+    return await _read_db().fetchall(
         f"""
         SELECT id, amount_sats, amount_fiat, exchange_rate, transaction_type, 
                status, created_at, transaction_time, lamassu_transaction_id
         FROM satoshimachine.dca_payments 
         WHERE {where_clause}
-        ORDER BY created_at DESC
-        LIMIT :limit OFFSET :offset
+        ORDER BY created_at DESC, id DESC
+        LIMIT :limit
         """,
         params
     )
+
+
+async def get_client_transactions_page(
+    user_id: str,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    transaction_type: Optional[str] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None
+) -> ClientTransactionPage:
+    """Get one page of transaction history using keyset pagination
+    
+    Pages are ordered by (created_at, id) descending and the cursor seeks past
+    the last row of the previous page, so deep pages cost the same as the first
+    one and don't shift when new payments arrive.
+    """
+    
+    client = await get_client_by_user_id(user_id)
+    
+    if not client:
+        return ClientTransactionPage(transactions=[])
+    
+    after = decode_transaction_cursor(cursor) if cursor else None
+    
+    # Fetch one extra row to know whether another page follows
+    rows = await _fetch_transactions_after(
+        client["id"], limit + 1, after, transaction_type, start_date, end_date
+    )
     
-    return [
-        ClientTransaction(
-            id=tx["id"],
-            amount_sats=tx["amount_sats"],
-            amount_fiat=tx["amount_fiat"],
-            exchange_rate=tx["exchange_rate"],
-            transaction_type=tx["transaction_type"],
-            status=tx["status"],
-            created_at=tx["created_at"],
-            transaction_time=tx["transaction_time"],
-            lamassu_transaction_id=tx["lamassu_transaction_id"]
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_transaction_cursor(rows[-1]["created_at"], rows[-1]["id"])
+    
+    return ClientTransactionPage(
+        transactions=[_row_to_transaction(tx) for tx in rows],
+        next_cursor=next_cursor
+    )
+
+
+async def stream_client_transactions(
+    user_id: str,
+    chunk_size: int = 500,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None
+) -> AsyncIterator[List[ClientTransaction]]:
+    """Yield the client's whole transaction history in fixed-size chunks
+    
+    Each chunk is a separate keyset query, so memory stays bounded by
+    `chunk_size` however long the history is.
+    """
+    
+    client = await get_client_by_user_id(user_id)
+    
+    if not client:
+        return
+    
+    after = None
+    while True:
+        rows = await _fetch_transactions_after(
+            client["id"], chunk_size, after, start_date=start_date, end_date=end_date
         )
-        for tx in transactions
-    ]
+        if not rows:
+            return
+        yield [_row_to_transaction(tx) for tx in rows]
+        if len(rows) < chunk_size:
+            return
+        after = (rows[-1]["created_at"], rows[-1]["id"])
 
 
-async def get_client_analytics(user_id: str, time_range: str = "30d") -> Optional[ClientAnalytics]:
-    """Get client performance analytics"""
+async def stream_period_transactions(
+    client_id: str,
+    start_date: datetime,
+    end_date: datetime,
+    chunk_size: int = 500
+) -> AsyncIterator[List[ClientTransaction]]:
+    """Yield the confirmed payments of a statement period in fixed-size chunks
     
-    try:
-        from datetime import datetime
-        
-        # Get client ID
-        client = await db.fetchone(
-            "SELECT id FROM satoshimachine.dca_clients WHERE user_id = :user_id",
-            {"user_id": user_id}
+    Payments belong to the period of COALESCE(transaction_time, created_at),
+    the date the payment index (and so the period snapshot) buckets them by,
+    and come oldest first. Each chunk is a keyset query on that date and id.
+    """
+    transaction_date = "COALESCE(transaction_time, created_at)"
+    params: Dict[str, Any] = {
+        "client_id": client_id,
+        "start_date": start_date,
+        "end_date": end_date,
+        "limit": chunk_size,
+    }
+    
+    after = None
+    while True:
+        conditions = [
+            "client_id = :client_id",
+            "status = 'confirmed'",
+            f"{transaction_date} >= :start_date",
+            f"{transaction_date} <= :end_date",
+        ]
+        if after:
+            conditions.append(
+                f"({transaction_date} > :after_date"
+                f" OR ({transaction_date} = :after_date AND id > :after_id))"
+            )
+            params["after_date"], params["after_id"] = after
+        rows = await _read_db().fetchall(
+            f"""
+            SELECT id, amount_sats, amount_fiat, exchange_rate, transaction_type,
+                   status, created_at, transaction_time, lamassu_transaction_id,
+                   {transaction_date} as transaction_date
+            FROM satoshimachine.dca_payments
+            WHERE {" AND ".join(conditions)}
+            ORDER BY {transaction_date}, id
+            LIMIT :limit
+            """,
+            params
+        )
+        if not rows:
+            return
+        yield [_row_to_transaction(tx) for tx in rows]
+        if len(rows) < chunk_size:
+            return
+        after = (rows[-1]["transaction_date"], rows[-1]["id"])
+
+
+async def stream_confirmed_payments(
+    client_id: str,
+    chunk_size: int = 500,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None
+) -> AsyncIterator[List[dict]]:
+    """Yield the client's confirmed payments oldest first in fixed-size chunks
+    
+    Rows carry id, amount_sats, payment_hash and created_at. Each chunk is a
+    keyset query on (created_at, id).
+    """
+    where_conditions = ["client_id = :client_id", "status = 'confirmed'"]
+    params: Dict[str, Any] = {"client_id": client_id, "limit": chunk_size}
+    if start_date:
+        where_conditions.append("created_at >= :start_date")
+        params["start_date"] = start_date
+    if end_date:
+        where_conditions.append("created_at <= :end_date")
+        params["end_date"] = end_date
+    
+    after = None
+    while True:
+        conditions = list(where_conditions)
+        if after:
+            conditions.append(
+                "(created_at > :after_created_at"
+                " OR (created_at = :after_created_at AND id > :after_id))"
+            )
+            params["after_created_at"], params["after_id"] = after
+        rows = await _read_db().fetchall(
+            f"""
+            SELECT id, amount_sats, payment_hash, created_at
+            FROM satoshimachine.dca_payments
+            WHERE {" AND ".join(conditions)}
+            ORDER BY created_at, id
+            LIMIT :limit
+            """,
+            params
+        )
+        if not rows:
+            return
+        yield [dict(row) for row in rows]
+        if len(rows) < chunk_size:
+            return
+        after = (rows[-1]["created_at"], rows[-1]["id"])
+
+
+def _core_db() -> Any:
+    """LNbits' own database, which holds every wallet's payments"""
+    from lnbits.core.db import db as core_db
+
+    return core_db
+
+
+async def stream_wallet_ledger(
+    wallet_id: str,
+    chunk_size: int = 500,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None
+) -> AsyncIterator[List[dict]]:
+    """Yield the settled incoming payments of an LNbits wallet oldest first
+    
+    Rows carry checking_id, payment_hash, amount (msat) and time, read from
+    LNbits' payments table in keyset chunks on (time, checking_id).
+    """
+    from lnbits.db import compat_timestamp_placeholder
+    
+    core_db = _core_db()
+    where_conditions = ["wallet_id = :wallet_id", "amount > 0", "status = 'success'"]
+    params: Dict[str, Any] = {"wallet_id": wallet_id, "limit": chunk_size}
+    if start_date:
+        where_conditions.append(
+            f"time >= {compat_timestamp_placeholder('start_time')}"
+        )
+        params["start_time"] = int(start_date.timestamp())
+    if end_date:
+        where_conditions.append(
+            f"time < {compat_timestamp_placeholder('end_time')}"
+        )
+        params["end_time"] = int(end_date.timestamp()) + 1
+    
+    after = None
+    while True:
+        conditions = list(where_conditions)
+        if after:
+            # LNbits stores the time as an epoch on SQLite and a timestamp on
+            # PostgreSQL, so the cursor is bound like the bounds; fractional
+            # seconds are kept so rows within one second aren't read twice
+            after_time = compat_timestamp_placeholder("after_time")
+            conditions.append(
+                f"(time > {after_time}"
+                f" OR (time = {after_time} AND checking_id > :after_id))"
+            )
+            params["after_time"] = after[0].timestamp()
+            params["after_id"] = after[1]
+        rows = await core_db.fetchall(
+            f"""
+            SELECT checking_id, payment_hash, amount, time
+            FROM apipayments
+            WHERE {" AND ".join(conditions)}
+            ORDER BY time, checking_id
+            LIMIT :limit
+            """,
+            params
         )
+        if not rows:
+            return
+        yield [dict(row) for row in rows]
+        if len(rows) < chunk_size:
+            return
+        last_time = to_datetime(rows[-1]["time"])
+        if last_time is None:
+            raise ValueError(f"Unreadable payment time {rows[-1]['time']!r}")
+        after = (last_time, rows[-1]["checking_id"])
+
+
+async def get_client_watermark(client_id: str) -> Optional[tuple]:
+    """Cheap fingerprint of everything the dashboard shows for a client
+    
+    Row counts per status and the newest created_at of the client's payments
+    and deposits, the deposit total and the client's updated_at. If none of
+    these moved, the summary, transactions and analytics are unchanged.
+    
+    It is read from the primary, since ETags and cached results are keyed by
+    it. If the read target's watermark differs, the target hasn't caught up
+    with this client, and the rest of the request reads from the primary
+    too, so the response matches its ETag.
+    """
+    watermark = await _fetch_client_watermark(db, client_id)
+    if watermark is None:
+        return None
+    reader = _read_db()
+    if reader is not db and (
+        await _fetch_client_watermark(reader, client_id) != watermark
+    ):
+        _primary_reads.set(True)
+        metrics.inc("read_target_behind_total")
+    previous = _last_watermarks.get(client_id)
+    if previous and previous[1] != watermark:
+        dashboard_flights.invalidate(client_id)
+    _last_watermarks.set(client_id, (time.monotonic(), watermark))
+    return watermark
+
+
+async def _fetch_client_watermark(database: Any, client_id: str) -> Optional[tuple]:
+    row = await database.fetchone(
+        """
+        SELECT
+            payments.payment_count,
+            payments.confirmed_payments,
+            payments.last_payment_at,
+            deposits.deposit_count,
+            deposits.confirmed_deposits,
+            deposits.deposit_total,
+            deposits.last_deposit_at,
+            (
+                SELECT updated_at FROM satoshimachine.dca_clients
+                WHERE id = :client_id
+            ) as client_updated_at
+        FROM (
+            SELECT
+                COUNT(*) as payment_count,
+                COALESCE(SUM(CASE WHEN status = 'confirmed' THEN 1 ELSE 0 END), 0)
+                    as confirmed_payments,
+                MAX(created_at) as last_payment_at
+            FROM satoshimachine.dca_payments 
+            WHERE client_id = :client_id
+        ) payments,
+        (
+            SELECT
+                COUNT(*) as deposit_count,
+                COALESCE(SUM(CASE WHEN status = 'confirmed' THEN 1 ELSE 0 END), 0)
+                    as confirmed_deposits,
+                COALESCE(SUM(amount), 0) as deposit_total,
+                MAX(created_at) as last_deposit_at
+            FROM satoshimachine.dca_deposits 
+            WHERE client_id = :client_id
+        ) deposits
+        """,
+        {"client_id": client_id},
+        name="get_client_watermark"
+    )
+    if not row:
+        return None
+    return tuple(row[key] for key in row.keys())
+
+
+class _PaymentIndexEntry:
+    """A client's payment index and the lock its updates are made under"""
+
+    def __init__(self) -> None:
+        self.lock = asyncio.Lock()
+        self.index: Optional[PaymentIndex] = None
+
+
+# Per-client prefix-sum indexes over confirmed payments, kept in process and
+# extended from their watermark as the admin extension records new payments.
+# The background workers visit every client, so only the most recently used
+# are kept, and none unused for an hour.
+_payment_indexes = TTLCache(maxsize=256, ttl=3600.0)
+metrics.register_cache("payment_index", _payment_indexes)
+
+
+async def get_payment_index(client_id: str) -> PaymentIndex:
+    """Get the client's payment index, brought up to date with the database
+    
+    A cheap watermark query (count and newest created_at of confirmed payments)
+    decides whether the index is current. New payments are appended from the
+    watermark on; anything else (backfilled transaction times, status changes
+    of older rows) triggers a full rebuild from one ordered scan.
+    """
+    entry = _payment_indexes.get(client_id) or _PaymentIndexEntry()
+    # Setting it again restarts its expiry
+    _payment_indexes.set(client_id, entry)
+    async with entry.lock:
+        reader = _read_db()
+        watermark_row = await reader.fetchone(
+            """
+            SELECT 
+                COUNT(*) as payment_count,
+                MAX(created_at) as last_created_at
+            FROM satoshimachine.dca_payments 
+            WHERE client_id = :client_id AND status = 'confirmed'
+            """,
+            {"client_id": client_id},
+            name="get_payment_index.watermark"
+        )
+        watermark = (watermark_row["payment_count"], watermark_row["last_created_at"])
         
-        if not client:
-            print(f"No client found for user_id: {user_id}")
-            return None
+        index = entry.index
+        if index and index.watermark == watermark:
+            return index
         
-        print(f"Found client {client['id']} for user {user_id}, loading analytics for time_range: {time_range}")
-    
-        # Calculate date range
-        if time_range == "7d":
-            start_date = datetime.now() - timedelta(days=7)
-        elif time_range == "30d":
-            start_date = datetime.now() - timedelta(days=30)
-        elif time_range == "90d":
-            start_date = datetime.now() - timedelta(days=90)
-        elif time_range == "1y":
-            start_date = datetime.now() - timedelta(days=365)
-        else:  # "all"
-            start_date = datetime(2020, 1, 1)  # Arbitrary early date
+        if index and index.watermark and index.watermark[1] is not None:
+            new_payments = await reader.fetchall(
+                """
+                SELECT 
+                    COALESCE(transaction_time, created_at) as transaction_date,
+                    amount_sats,
+                    amount_fiat,
+                    exchange_rate
+                FROM satoshimachine.dca_payments 
+                WHERE client_id = :client_id 
+                  AND status = 'confirmed'
+                  AND created_at > :last_created_at
+                ORDER BY COALESCE(transaction_time, created_at)
+                """,
+                {"client_id": client_id, "last_created_at": index.watermark[1]},
+                name="get_payment_index.delta"
+            )
+            if len(index) + len(new_payments) == watermark[0] and index.extend(
+                new_payments
+            ):
+                index.watermark = watermark
+                return index
         
-        # Get cost basis history (running average)
-        cost_basis_data = await db.fetchall(
+        payments = await reader.fetchall(
             """
             SELECT 
                 COALESCE(transaction_time, created_at) as transaction_date,
                 amount_sats,
                 amount_fiat,
-                exchange_rate,
-                SUM(amount_sats) OVER (ORDER BY COALESCE(transaction_time, created_at)) as cumulative_sats,
-                SUM(amount_fiat) OVER (ORDER BY COALESCE(transaction_time, created_at)) as cumulative_fiat
+                exchange_rate
             FROM satoshimachine.dca_payments 
             WHERE client_id = :client_id 
               AND status = 'confirmed'
-              AND COALESCE(transaction_time, created_at) IS NOT NULL
-              AND COALESCE(transaction_time, created_at) >= :start_date
             ORDER BY COALESCE(transaction_time, created_at)
             """,
-            {"client_id": client["id"], "start_date": start_date}
+            {"client_id": client_id},
+            name="get_payment_index.rebuild"
         )
+        index = PaymentIndex.from_rows(payments, watermark)
+        entry.index = index
+        return index
+
+
+async def get_confirmed_deposits(client_id: str) -> List[Tuple[datetime, float]]:
+    """(date, amount) of the client's confirmed deposits, oldest first"""
+    rows = await _read_db().fetchall(
+        """
+        SELECT COALESCE(confirmed_at, created_at) as deposit_date, amount
+        FROM satoshimachine.dca_deposits 
+        WHERE client_id = :client_id AND status = 'confirmed'
+        ORDER BY COALESCE(confirmed_at, created_at)
+        """,
+        {"client_id": client_id}
+    )
+    deposits = []
+    for row in rows:
+        moment = to_datetime(row["deposit_date"])
+        if moment is not None:
+            deposits.append((moment, row["amount"]))
+    return deposits
+
+
+ANALYTICS_TIME_RANGES = {
+    "7d": timedelta(days=7),
+    "30d": timedelta(days=30),
+    "90d": timedelta(days=90),
+    "1y": timedelta(days=365),
+}
+
+
+async def get_client_analytics(
+    user_id: str,
+    time_range: str = "30d",
+    granularity: str = "day",
+    max_points: Optional[int] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None
+) -> Optional[ClientAnalytics]:
+    """Get client performance analytics
+    
+    The client's payment index feeds the cost basis curve, the accumulation
+    timeline (bucketed by day, week or month) and the frequency metrics, so
+    only payments inside the time range are visited. An explicit
+    `start_date`/`end_date` (either may be open) replaces the `time_range`
+    preset. With `max_points` both
+    series are downsampled to that budget. `performance_vs_market` compares
+    the whole history with lump-sum buys at the confirmed deposits.
+    Concurrent identical calls share one computation, and results are cached
+    under the client's watermark.
+    """
+    
+    try:
+        # Get client ID
+        client = await get_client_by_user_id(user_id)
         
-        # Build cost basis history
-        cost_basis_history = []
-        for record in cost_basis_data:
-            avg_cost_basis = record["cumulative_sats"] / record["cumulative_fiat"] if record["cumulative_fiat"] > 0 else 0  # Cost basis = sats / GTQ
-            # Use transaction_date (which is COALESCE(transaction_time, created_at))
-            date_to_use = record["transaction_date"]
-            if date_to_use is None:
-                print(f"Warning: Null date in cost basis data, skipping record")
-                continue
-            elif hasattr(date_to_use, 'isoformat'):
-                # This is a datetime object
-                date_str = date_to_use.isoformat()
-            elif hasattr(date_to_use, 'strftime'):
-                # This is a date object 
-                date_str = date_to_use.strftime('%Y-%m-%d')
-            elif isinstance(date_to_use, (int, float)):
-                # This might be a Unix timestamp - check if it's in a reasonable range
-                timestamp = float(date_to_use)
-                # Check if this looks like a timestamp (between 1970 and 2100)
-                if 0 < timestamp < 4102444800:  # Jan 1, 2100
-                    # Could be seconds or milliseconds
-                    if timestamp > 1000000000000:  # Likely milliseconds
-                        timestamp = timestamp / 1000
-                    date_str = datetime.fromtimestamp(timestamp).isoformat()
-                else:
-                    # Not a timestamp, treat as string
-                    date_str = str(date_to_use)
-                    print(f"Warning: Numeric date value out of timestamp range: {date_to_use}")
-            elif isinstance(date_to_use, str) and date_to_use.isdigit():
-                # This is a numeric string - might be a timestamp
-                timestamp = float(date_to_use)
-                # Check if this looks like a timestamp
-                if 0 < timestamp < 4102444800:  # Jan 1, 2100
-                    # Could be seconds or milliseconds
-                    if timestamp > 1000000000000:  # Likely milliseconds
-                        timestamp = timestamp / 1000
-                    date_str = datetime.fromtimestamp(timestamp).isoformat()
-                else:
-                    # Not a timestamp, treat as string
-                    date_str = str(date_to_use)
-                    print(f"Warning: Numeric date string out of timestamp range: {date_to_use}")
-            else:
-                # Convert string representation to proper format
-                date_str = str(date_to_use)
-                print(f"Warning: Unexpected date format: {date_to_use} (type: {type(date_to_use)})")
-            
-            cost_basis_history.append({
-                "date": date_str,
-                "average_cost_basis": avg_cost_basis,
-                "cumulative_sats": record["cumulative_sats"],
-                "cumulative_fiat": record["cumulative_fiat"]
-            })
-        
-        # Get accumulation timeline (daily/weekly aggregation)
-        accumulation_data = await db.fetchall(
-            """
-            SELECT 
-                DATE(COALESCE(transaction_time, created_at)) as date,
-                SUM(amount_sats) as daily_sats,
-                SUM(amount_fiat) as daily_fiat,
-                COUNT(*) as daily_transactions
-            FROM satoshimachine.dca_payments 
-            WHERE client_id = :client_id 
-              AND status = 'confirmed'
-              AND COALESCE(transaction_time, created_at) IS NOT NULL
-              AND COALESCE(transaction_time, created_at) >= :start_date
-            GROUP BY DATE(COALESCE(transaction_time, created_at))
-            ORDER BY date
-            """,
-            {"client_id": client["id"], "start_date": start_date}
-        )
+        if not client:
+            logger.debug(f"No client found for user_id: {user_id}")
+            return None
         
-        accumulation_timeline = []
-        for record in accumulation_data:
-            # Handle date conversion safely
-            date_value = record["date"]
-            if date_value is None:
-                print(f"Warning: Null date in accumulation data, skipping record")
-                continue
-            elif hasattr(date_value, 'isoformat'):
-                # This is a datetime object
-                date_str = date_value.isoformat()
-            elif hasattr(date_value, 'strftime'):
-                # This is a date object (from DATE() function)
-                date_str = date_value.strftime('%Y-%m-%d')
-            elif isinstance(date_value, (int, float)):
-                # This might be a Unix timestamp - check if it's in a reasonable range
-                timestamp = float(date_value)
-                # Check if this looks like a timestamp (between 1970 and 2100)
-                if 0 < timestamp < 4102444800:  # Jan 1, 2100
-                    # Could be seconds or milliseconds
-                    if timestamp > 1000000000000:  # Likely milliseconds
-                        timestamp = timestamp / 1000
-                    date_str = datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d')
-                else:
-                    # Not a timestamp, treat as string
-                    date_str = str(date_value)
-                    print(f"Warning: Numeric accumulation date out of timestamp range: {date_value}")
-            elif isinstance(date_value, str) and date_value.isdigit():
-                # This is a numeric string - might be a timestamp
-                timestamp = float(date_value)
-                # Check if this looks like a timestamp
-                if 0 < timestamp < 4102444800:  # Jan 1, 2100
-                    # Could be seconds or milliseconds
-                    if timestamp > 1000000000000:  # Likely milliseconds
-                        timestamp = timestamp / 1000
-                    date_str = datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d')
-                else:
-                    # Not a timestamp, treat as string
-                    date_str = str(date_value)
-                    print(f"Warning: Numeric accumulation date string out of timestamp range: {date_value}")
-            else:
-                # Convert string representation to proper format
-                date_str = str(date_value)
-                print(f"Warning: Unexpected accumulation date format: {date_value} (type: {type(date_value)})")
-            
-            accumulation_timeline.append({
-                "date": date_str,
-                "sats": record["daily_sats"],
-                "fiat": record["daily_fiat"],
-                "transactions": record["daily_transactions"]
-            })
+        if start_date is None and end_date is None:
+            # Presets are relative to now; "all" has no lower bound
+            window = ANALYTICS_TIME_RANGES.get(time_range)
+            start_date = datetime.now() - window if window else None
+            key: tuple = (
+                client["id"], "analytics", time_range, granularity, max_points
+            )
+        else:
+            key = (
+                client["id"],
+                "analytics",
+                start_date,
+                end_date,
+                granularity,
+                max_points,
+            )
         
-        # Get transaction frequency metrics
-        frequency_stats = await db.fetchone(
-            """
-            SELECT 
-                COUNT(*) as total_transactions,
-                AVG(amount_sats) as avg_sats_per_tx,
-                AVG(amount_fiat) as avg_fiat_per_tx,
-                MIN(COALESCE(transaction_time, created_at)) as first_tx,
-                MAX(COALESCE(transaction_time, created_at)) as last_tx
-            FROM satoshimachine.dca_payments 
-            WHERE client_id = :client_id AND status = 'confirmed'
-            """,
-            {"client_id": client["id"]}
+        return await dashboard_flights.do(
+            key,
+            lambda: _cached_result(
+                client["id"],
+                # presets move with the date, like the endpoint's ETag
+                key[1:] + (date.today(),),
+                lambda: _compute_analytics(
+                    user_id, client["id"], start_date, end_date, granularity, max_points
+                ),
+                ClientAnalytics.dict,
+                ClientAnalytics.parse_obj,
+            ),
         )
         
-        # Build transaction frequency with safe date handling
-        transaction_frequency = {
-            "total_transactions": frequency_stats["total_transactions"] if frequency_stats else 0,
-            "avg_sats_per_transaction": frequency_stats["avg_sats_per_tx"] if frequency_stats else 0,
-            "avg_fiat_per_transaction": frequency_stats["avg_fiat_per_tx"] if frequency_stats else 0,
-            "first_transaction": None,
-            "last_transaction": None
-        }
-        
-        # Handle first_tx date safely
-        if frequency_stats and frequency_stats["first_tx"]:
-            first_tx = frequency_stats["first_tx"]
-            if hasattr(first_tx, 'isoformat'):
-                transaction_frequency["first_transaction"] = first_tx.isoformat()
-            else:
-                transaction_frequency["first_transaction"] = str(first_tx)
-        
-        # Handle last_tx date safely
-        if frequency_stats and frequency_stats["last_tx"]:
-            last_tx = frequency_stats["last_tx"]
-            if hasattr(last_tx, 'isoformat'):
-                transaction_frequency["last_transaction"] = last_tx.isoformat()
-            else:
-                transaction_frequency["last_transaction"] = str(last_tx)
-    
-        return ClientAnalytics(
-            user_id=user_id,
-            cost_basis_history=cost_basis_history,
-            accumulation_timeline=accumulation_timeline,
-            transaction_frequency=transaction_frequency
+    except Exception:
+        metrics.inc("errors_total", operation="get_client_analytics")
+        logger.exception(f"Error in get_client_analytics for user {user_id}")
+        return None
+
+
+async def _compute_analytics(
+    user_id: str,
+    client_id: str,
+    start_date: Optional[datetime],
+    end_date: Optional[datetime],
+    granularity: str,
+    max_points: Optional[int],
+) -> ClientAnalytics:
+    index, deposits = await asyncio.gather(
+        get_payment_index(client_id), get_confirmed_deposits(client_id)
+    )
+    cost_basis_history, accumulation_timeline, transaction_frequency = (
+        index.analytics(start_date, granularity, end_date)
+    )
+    if max_points:
+        cost_basis_history, accumulation_timeline = downsample_analytics(
+            cost_basis_history, accumulation_timeline, max_points
         )
-        
-    except Exception as e:
-        print(f"Error in get_client_analytics for user {user_id}: {str(e)}")
-        import traceback
-        traceback.print_exc()
+
+    return ClientAnalytics(
+        user_id=user_id,
+        cost_basis_history=cost_basis_history,
+        accumulation_timeline=accumulation_timeline,
+        transaction_frequency=transaction_frequency,
+        performance_vs_market=index.performance_vs_market(deposits)
+    )
+
+
+async def get_client_projection(
+    user_id: str, years: int = 3, paths: int = 10_000
+) -> Optional[ClientProjection]:
+    """Monte Carlo projection of the client's accumulation (see projection.py)
+
+    Price paths are drawn from the client's own exchange rate history, seeded
+    by the client id so a reload shows the same bands. The simulation runs in
+    a worker thread; concurrent identical calls share it, and results are
+    cached under the client's watermark for the day.
+    """
+    client = await get_client_by_user_id(user_id)
+    if not client:
         return None
 
+    key = (client["id"], "projection", years, paths)
+    return await dashboard_flights.do(
+        key,
+        lambda: _cached_result(
+            client["id"],
+            key[1:] + (date.today(),),
+            lambda: _compute_projection(user_id, client["id"], years, paths),
+            ClientProjection.dict,
+            ClientProjection.parse_obj,
+            ttl=PROJECTION_TTL,
+        ),
+    )
 
-async def get_client_by_user_id(user_id: str):
-    """Get client record by user_id"""
-    return await db.fetchone(
-        "SELECT * FROM satoshimachine.dca_clients WHERE user_id = :user_id",
-        {"user_id": user_id}
+
+async def _compute_projection(
+    user_id: str, client_id: str, years: int, paths: int
+) -> ClientProjection:
+    index, deposits, rate = await asyncio.gather(
+        get_payment_index(client_id),
+        get_confirmed_deposits(client_id),
+        rate_cache.get(DASHBOARD_CURRENCY),
+    )
+    # rate_cache holds the BTC price; payments record sats per fiat unit
+    sats_per_fiat = SATS_PER_BTC / rate.value if rate and rate.value else None
+    # The shared index may be extended by other requests while the thread runs
+    result = await asyncio.to_thread(
+        project, index.snapshot(), deposits, sats_per_fiat, years, paths, client_id
+    )
+    return ClientProjection(user_id=user_id, **result)
+
+
+async def get_active_clients() -> List[dict]:
+    """Id, user, wallet and registration time of every active client"""
+    rows = await _read_db().fetchall(
+        """
+        SELECT id, user_id, wallet_id, created_at
+        FROM satoshimachine.dca_clients 
+        WHERE status = 'active'
+        ORDER BY id
+        """
+    )
+    return [dict(row) for row in rows]
+
+
+def _in_clause(prefix: str, values: List[str]) -> Tuple[str, dict]:
+    """Named placeholders for an IN (...) list"""
+    params = {f"{prefix}{i}": value for i, value in enumerate(values)}
+    return ", ".join(f":{key}" for key in params), params
+
+
+# Columns of the rows the dashboard event stream watches, per table
+EVENT_COLUMNS = {
+    "dca_payments": (
+        "id, client_id, amount_sats, amount_fiat, exchange_rate, transaction_type,"
+        " status, created_at, transaction_time, lamassu_transaction_id"
+    ),
+    "dca_deposits": "id, client_id, amount, status, created_at",
+}
+
+
+async def get_event_baseline(
+    table: str, client_ids: List[str]
+) -> Tuple[Dict[str, Any], List[dict]]:
+    """Where the dashboard event stream starts watching `table` for
+    `client_ids`: each client's newest created_at and its pending rows"""
+    if not client_ids:
+        return {}, []
+    placeholders, params = _in_clause("client_id_", client_ids)
+    reader = _read_db()
+    newest = await reader.fetchall(
+        f"""
+        SELECT client_id, MAX(created_at) as newest
+        FROM satoshimachine.{table}
+        WHERE client_id IN ({placeholders})
+        GROUP BY client_id
+        """,
+        params,
+        name="get_event_baseline.newest"
+    )
+    pending = await reader.fetchall(
+        f"""
+        SELECT {EVENT_COLUMNS[table]}
+        FROM satoshimachine.{table}
+        WHERE client_id IN ({placeholders}) AND status = 'pending'
+        """,
+        params,
+        name="get_event_baseline.pending"
+    )
+    return (
+        {row["client_id"]: row["newest"] for row in newest},
+        [dict(row) for row in pending],
+    )
+
+
+async def get_event_changes(
+    table: str, watermarks: Dict[str, Any], pending_ids: List[str]
+) -> List[dict]:
+    """Rows of `table` created after their client's watermark (all of the
+    client's rows if it is None), and the rows `pending_ids` as they are now,
+    oldest first
+
+    Neither table records when a row changed, so rows that may still change
+    status are watched by id; everything else only ever adds rows.
+    """
+    conditions = []
+    params: Dict[str, Any] = {}
+    for i, (client_id, watermark) in enumerate(watermarks.items()):
+        params[f"client_id_{i}"] = client_id
+        if watermark is None:
+            conditions.append(f"client_id = :client_id_{i}")
+        else:
+            conditions.append(
+                f"(client_id = :client_id_{i} AND created_at > :after_{i})"
+            )
+            params[f"after_{i}"] = watermark
+    if pending_ids:
+        placeholders, pending_params = _in_clause("pending_id_", pending_ids)
+        conditions.append(f"id IN ({placeholders})")
+        params.update(pending_params)
+    if not conditions:
+        return []
+    rows = await _read_db().fetchall(
+        f"""
+        SELECT {EVENT_COLUMNS[table]}
+        FROM satoshimachine.{table}
+        WHERE {" OR ".join(conditions)}
+        ORDER BY created_at, id
+        """,
+        params,
+        name="get_event_changes"
     )
+    return [dict(row) for row in rows]
 
 
 async def update_client_dca_settings(client_id: str, settings: UpdateClientSettings) -> bool:
@@ -445,6 +1232,9 @@ async def update_client_dca_settings(client_id: str, settings: UpdateClientSetti
             f"UPDATE satoshimachine.dca_clients SET {set_clause} WHERE id = :id",
             update_data
         )
+        client_cache.invalidate_where(lambda client: client["id"] == client_id)
+        dashboard_flights.invalidate(client_id)
+        await result_cache.invalidate(client_id)
         return True
     except Exception:
         return False
@@ -465,13 +1255,10 @@ async def register_dca_client(user_id: str, wallet_id: str, registration_data: C
         username = registration_data.username or (user.username if user else f"user_{user_id[:8]}")
         
         # Check if client already exists
-        existing_client = await db.fetchone(
-            "SELECT id FROM satoshimachine.dca_clients WHERE user_id = :user_id",
-            {"user_id": user_id}
-        )
+        existing_client = await get_client_by_user_id(user_id)
         
         if existing_client:
-            return {"error": "Client already registered", "client_id": existing_client[0]}
+            return {"error": "Client already registered", "client_id": existing_client["id"]}
         
         # Create new client
         client_id = urlsafe_short_hash()
@@ -493,6 +1280,7 @@ async def register_dca_client(user_id: str, wallet_id: str, registration_data: C
                 "updated_at": datetime.now()
             }
         )
+        client_cache.invalidate(user_id)
         
         return {
             "success": True,
@@ -501,21 +1289,10 @@ async def register_dca_client(user_id: str, wallet_id: str, registration_data: C
         }
         
     except Exception as e:
-        print(f"Error registering DCA client: {e}")
+        metrics.inc("errors_total", operation="register_dca_client")
+        logger.error(f"Error registering DCA client: {e}")
         return {"error": f"Registration failed: {str(e)}"}
 
 
-async def get_client_by_user_id(user_id: str) -> Optional[dict]:
-    """Get client by user_id - returns dict instead of model for easier access"""
-    try:
-        client = await db.fetchone(
-            "SELECT * FROM satoshimachine.dca_clients WHERE user_id = :user_id",
-            {"user_id": user_id}
-        )
-        return dict(client) if client else None
-    except Exception:
-        return None
-
-
 # Removed get_active_lamassu_config - client should not access sensitive admin config
 # Client limits are now fetched via secure public API endpoint
\ No newline at end of file
@@ -0,0 +1,272 @@
+# Description: Lightweight in-process metrics, rendered in Prometheus text format
+#
+# Recording a sample is a perf_counter delta, a bisect and a few dict lookups,
+# so instrumentation stays on in production.
+
+import sys
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Upper bounds in seconds, from a fast indexed lookup to a full history scan
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """Cumulative-bucket histogram as Prometheus expects it"""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        total = 0
+        result = []
+        for bound, count in zip((*self.buckets, float("inf")), self.counts):
+            total += count
+            result.append(("+Inf" if bound == float("inf") else repr(bound), total))
+        return result
+
+
+class _Family:
+    __slots__ = ("kind", "help", "samples")
+
+    def __init__(self, kind: str, help_text: str):
+        self.kind = kind
+        self.help = help_text
+        self.samples: Dict[Labels, Any] = {}
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = (*labels, extra) if extra else labels
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+
+class MetricsRegistry:
+    """Named counters, gauges and histograms keyed by label values
+
+    Families are declared once with `counter()`/`gauge()`/`histogram()`;
+    samples are created on first use. Caches registered with
+    `register_cache()` are read at render time.
+    """
+
+    def __init__(self, namespace: str):
+        self.namespace = namespace
+        self._families: Dict[str, _Family] = {}
+        self._caches: Dict[str, Any] = {}
+
+    def counter(self, name: str, help_text: str) -> None:
+        self._families.setdefault(name, _Family("counter", help_text))
+
+    def histogram(self, name: str, help_text: str) -> None:
+        self._families.setdefault(name, _Family("histogram", help_text))
+
+    def gauge(self, name: str, help_text: str) -> None:
+        self._families.setdefault(name, _Family("gauge", help_text))
+
+    def register_cache(self, name: str, cache: Any) -> None:
+        """Expose a cache's `stats()` hits, misses, size and (if reported)
+        bytes, along with its hit ratio"""
+        self._caches[name] = cache
+
+    def inc(self, name: str, amount: float = 1, **labels: str) -> None:
+        samples = self._families[name].samples
+        key = tuple(labels.items())
+        samples[key] = samples.get(key, 0) + amount
+
+    def set(self, name: str, value: float, **labels: str) -> None:
+        self._families[name].samples[tuple(labels.items())] = value
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        samples = self._families[name].samples
+        key = tuple(labels.items())
+        histogram = samples.get(key)
+        if histogram is None:
+            histogram = samples[key] = Histogram()
+        histogram.observe(value)
+
+    def get(self, name: str, **labels: str) -> Any:
+        """Current value of a sample, mostly for tests"""
+        return self._families[name].samples.get(tuple(labels.items()))
+
+    def reset(self) -> None:
+        for family in self._families.values():
+            family.samples.clear()
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format (0.0.4)"""
+        lines = []
+        for name, family in self._families.items():
+            full_name = f"{self.namespace}_{name}"
+            lines.append(f"# HELP {full_name} {family.help}")
+            lines.append(f"# TYPE {full_name} {family.kind}")
+            for labels, sample in family.samples.items():
+                if family.kind == "histogram":
+                    for bound, count in sample.cumulative():
+                        lines.append(
+                            f"{full_name}_bucket{_format_labels(labels, ('le', bound))}"
+                            f" {count}"
+                        )
+                    lines.append(
+                        f"{full_name}_sum{_format_labels(labels)} {sample.sum}"
+                    )
+                    lines.append(
+                        f"{full_name}_count{_format_labels(labels)} {sample.count}"
+                    )
+                else:
+                    lines.append(f"{full_name}{_format_labels(labels)} {sample}")
+
+        if self._caches:
+            stats = {name: cache.stats() for name, cache in self._caches.items()}
+            for values in stats.values():
+                lookups = values["hits"] + values["misses"]
+                values["hit_ratio"] = values["hits"] / lookups if lookups else 0.0
+            for stat, suffix, kind in (
+                ("hits", "_total", "counter"),
+                ("misses", "_total", "counter"),
+                ("size", "_entries", "gauge"),
+                ("bytes", "", "gauge"),
+                ("hit_ratio", "", "gauge"),
+            ):
+                full_name = f"{self.namespace}_cache_{stat}{suffix}"
+                lines.append(f"# HELP {full_name} Cache {stat.replace('_', ' ')}")
+                lines.append(f"# TYPE {full_name} {kind}")
+                for cache_name, values in stats.items():
+                    if stat in values:
+                        cache_label = f'{{cache="{_escape(cache_name)}"}}'
+                        lines.append(f"{full_name}{cache_label} {values[stat]}")
+
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry("satmachineclient")
+metrics.histogram("db_query_duration_seconds", "Database query latency by query name")
+metrics.counter("db_query_rows_total", "Rows returned or affected by query name")
+metrics.counter("db_query_errors_total", "Failed database queries by query name")
+metrics.histogram(
+    "http_request_duration_seconds", "API latency by method, route and status"
+)
+metrics.histogram(
+    "exchange_rate_fetch_duration_seconds", "Exchange rate provider latency"
+)
+metrics.counter("exchange_rate_fetch_errors_total", "Failed exchange rate lookups")
+metrics.counter("errors_total", "Errors handled without failing the request")
+metrics.gauge("read_target_lag_seconds", "Staleness of the read-only database target")
+metrics.counter(
+    "read_target_fallback_total", "Reads sent to the primary because the target lags"
+)
+metrics.counter(
+    "read_target_behind_total",
+    "Requests read from the primary because the target lacked the client's data",
+)
+metrics.gauge(
+    "reconciliation_unreconciled_clients",
+    "Active clients whose payments didn't reconcile with their wallet on the last run",
+)
+
+
+class InstrumentedDatabase:
+    """Wraps lnbits' Database to time every query
+
+    Queries are named after the calling function unless `name` is given;
+    everything other than fetchone/fetchall/execute is passed through.
+    """
+
+    def __init__(self, db: Any, registry: MetricsRegistry = metrics):
+        self._db = db
+        self._registry = registry
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self._db, attr)
+
+    async def fetchone(
+        self,
+        query: str,
+        values: Optional[dict] = None,
+        name: Optional[str] = None,
+        **kwargs,
+    ) -> Any:
+        return await self._run(
+            self._db.fetchone, query, values, name, kwargs, lambda row: int(bool(row))
+        )
+
+    async def fetchall(
+        self,
+        query: str,
+        values: Optional[dict] = None,
+        name: Optional[str] = None,
+        **kwargs,
+    ) -> Any:
+        return await self._run(self._db.fetchall, query, values, name, kwargs, len)
+
+    async def execute(
+        self,
+        query: str,
+        values: Optional[dict] = None,
+        name: Optional[str] = None,
+        **kwargs,
+    ) -> Any:
+        return await self._run(
+            self._db.execute,
+            query,
+            values,
+            name,
+            kwargs,
+            lambda result: max(getattr(result, "rowcount", 0) or 0, 0),
+        )
+
+    async def _run(
+        self,
+        method: Callable,
+        query: str,
+        values: Optional[dict],
+        name: Optional[str],
+        kwargs: dict,
+        count_rows: Callable[[Any], int],
+    ) -> Any:
+        # frame 0 is _run, 1 the public method, 2 its caller
+        name = name or sys._getframe(2).f_code.co_name
+        started = time.perf_counter()
+        try:
+            result = await method(query, values, **kwargs)
+        except Exception:
+            self._registry.inc("db_query_errors_total", query=name)
+            raise
+        finally:
+            self._registry.observe(
+                "db_query_duration_seconds", time.perf_counter() - started, query=name
+            )
+        self._registry.inc("db_query_rows_total", count_rows(result), query=name)
+        return result
@@ -1,7 +1,7 @@
 # Description: Pydantic data models for client extension API responses
 
 from datetime import datetime
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 from pydantic import BaseModel
 
@@ -43,7 +43,7 @@ class ClientDashboardSummary(BaseModel):
     total_sats_accumulated: int
     total_fiat_invested: float  # Confirmed deposits in GTQ
     pending_fiat_deposits: float  # Pending deposits awaiting confirmation in GTQ
-    current_sats_fiat_value: float  # Current fiat value of total sats in GTQ
+    current_sats_fiat_value: Optional[float]  # In GTQ; None if no price is known
     average_cost_basis: float  # Average sats per GTQ
     current_fiat_balance: float  # Available balance for DCA in GTQ
     total_transactions: int
@@ -51,6 +51,9 @@ class ClientDashboardSummary(BaseModel):
     dca_status: str  # 'active' or 'inactive'
     last_transaction_date: Optional[datetime]
     currency: str = "GTQ"
+    exchange_rate_as_of: Optional[datetime] = None  # When the BTC price was fetched
+    exchange_rate_stale: bool = False  # True if the price provider is unavailable
+    # (with no price at all, current_sats_fiat_value is None)
 
 
 class ClientTransaction(BaseModel):
@@ -66,6 +69,12 @@ class ClientTransaction(BaseModel):
     lamassu_transaction_id: Optional[str] = None
 
 
+class ClientTransactionPage(BaseModel):
+    """One page of client transactions for cursor (keyset) pagination"""
+    transactions: List[ClientTransaction]
+    next_cursor: Optional[str] = None  # Pass back as `cursor` for the next page
+
+
 class ClientAnalytics(BaseModel):
     """Performance analytics for client dashboard"""
     user_id: str
@@ -75,6 +84,28 @@ class ClientAnalytics(BaseModel):
     performance_vs_market: Optional[dict] = None  # Market comparison data
 
 
+class ClientProjection(BaseModel):
+    """Monte Carlo projection of the client's accumulation at its current pace"""
+    user_id: str
+    paths: int  # Simulated price paths
+    step_days: int
+    dates: List[str]  # End of each step (ISO dates)
+    percentiles: Dict[str, List[float]]  # "p10".."p90" -> sats at each date
+    milestones: List[dict]  # sats, probability, p10/p50/p90 dates reached
+    assumptions: dict  # Current sats, rate, balance and pace the paths start from
+
+
+class ClientDashboardBootstrap(BaseModel):
+    """Registration state and initial dashboard data in a single response"""
+    is_registered: bool
+    client_id: Optional[str] = None
+    dca_mode: Optional[str] = None
+    status: Optional[str] = None
+    summary: Optional[ClientDashboardSummary] = None
+    transactions: Optional[ClientTransactionPage] = None  # First page
+    analytics: Optional[ClientAnalytics] = None
+
+
 class ClientPreferences(BaseModel):
     """Client dashboard preferences and settings"""
     user_id: str
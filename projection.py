@@ -0,0 +1,216 @@
+# Description: Monte Carlo projection of a client's future sats accumulation
+#
+# Price paths are bootstrapped from the client's own exchange rate history:
+# each step multiplies the rate by a change drawn from the historical
+# step-long changes. The fiat spent per step doesn't depend on the price, so
+# it is a single schedule shared by all paths; only the rates are random.
+#
+# Paths are advanced together, one list operation per step (map over all
+# paths), which keeps the per-path work in C; 10k paths over three years of
+# monthly steps take a few hundred milliseconds.
+
+import random
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timedelta
+from itertools import repeat
+from operator import add, mul
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .analytics import PaymentIndex
+
+PROJECTION_STEP_DAYS = 30
+PERCENTILES = (10, 25, 50, 75, 90)
+
+# The ladder getNextMilestone() in static/js/index.js walks through
+MILESTONES = (
+    10_000,
+    50_000,
+    100_000,
+    500_000,
+    1_000_000,
+    5_000_000,
+    10_000_000,
+    50_000_000,
+    100_000_000,
+    500_000_000,
+)
+MAX_MILESTONES = 4
+
+# Recent window the current spending pace is measured over
+SPENDING_WINDOW_DAYS = 90
+DEPOSIT_WINDOW_DAYS = 365
+
+# Draws index a table of 2**16 multipliers with two random bytes each
+_TABLE_SIZE = 1 << 16
+
+
+def rate_multipliers(index: PaymentIndex, step_days: int) -> List[float]:
+    """Historical changes of the exchange rate over `step_days`
+
+    Windows overlap, one starting every day of the history, so short
+    histories still give a usable sample.
+    """
+    if len(index) < 2:
+        return []
+    span = timedelta(days=step_days)
+    start = datetime.fromtimestamp(index.times[0])
+    end = datetime.fromtimestamp(index.times[-1])
+    multipliers = []
+    moment = start
+    while moment + span <= end:
+        before = index.rate_at(moment)
+        after = index.rate_at(moment + span)
+        if before > 0 and after > 0:
+            multipliers.append(after / before)
+        moment += timedelta(days=1)
+    return multipliers
+
+
+def fiat_schedule(
+    balance: float, spend_per_step: float, deposit_per_step: float, steps: int
+) -> List[float]:
+    """Fiat spent in each step: the current pace, limited by the balance"""
+    schedule = []
+    for _ in range(steps):
+        balance += deposit_per_step
+        spent = min(balance, spend_per_step)
+        balance -= spent
+        schedule.append(spent)
+    return schedule
+
+
+def spending_pace(
+    index: PaymentIndex,
+    deposits: Sequence[Tuple[datetime, float]],
+    step_days: int,
+    now: datetime,
+) -> Tuple[float, float]:
+    """Fiat spent and deposited per step at the client's recent pace"""
+    _, recent_fiat, _ = index.range_totals(
+        start_date=now - timedelta(days=SPENDING_WINDOW_DAYS)
+    )
+    spend_per_day = recent_fiat / SPENDING_WINDOW_DAYS
+    if not spend_per_day and len(index):
+        # Nothing recent: the average since the first payment
+        days = max((now.timestamp() - index.times[0]) / 86400, step_days)
+        spend_per_day = index.cum_fiat[-1] / days
+
+    window_start = now - timedelta(days=DEPOSIT_WINDOW_DAYS)
+    deposit_per_day = (
+        sum(amount for moment, amount in deposits if moment >= window_start)
+        / DEPOSIT_WINDOW_DAYS
+    )
+    return spend_per_day * step_days, deposit_per_day * step_days
+
+
+def simulate(
+    current_sats: float,
+    rate: float,
+    multipliers: Sequence[float],
+    schedule: Sequence[float],
+    paths: int,
+    milestones: Sequence[int],
+    rng: random.Random,
+) -> Tuple[Dict[int, List[float]], Dict[int, List[float]]]:
+    """Percentiles of sats after each step, and the share of paths that have
+    reached each milestone by then
+
+    Sats only grow, so a path has reached a milestone by a step exactly when
+    its sats at that step are at or above it.
+    """
+    table = [
+        multipliers[i * len(multipliers) // _TABLE_SIZE] for i in range(_TABLE_SIZE)
+    ]
+    draw = table.__getitem__
+    rates = [rate] * paths
+    sats = [float(current_sats)] * paths
+
+    bands: Dict[int, List[float]] = {p: [] for p in PERCENTILES}
+    reached: Dict[int, List[float]] = {m: [] for m in milestones}
+    for fiat in schedule:
+        changes = map(draw, array("H", rng.randbytes(2 * paths)))
+        rates = list(map(mul, rates, changes))
+        if fiat:
+            sats = list(map(add, sats, map(mul, rates, repeat(fiat))))
+        ordered = sorted(sats)
+        for p in PERCENTILES:
+            bands[p].append(ordered[(paths - 1) * p // 100])
+        for milestone in milestones:
+            reached[milestone].append((paths - bisect_left(ordered, milestone)) / paths)
+    return bands, reached
+
+
+def project(
+    index: PaymentIndex,
+    deposits: Sequence[Tuple[datetime, float]],
+    rate: Optional[float],
+    years: int = 3,
+    paths: int = 10_000,
+    seed: str = "",
+    now: Optional[datetime] = None,
+) -> dict:
+    """Percentile bands of sats accumulated and milestone dates
+
+    `rate` is the current exchange rate in sats per fiat unit (the latest
+    payment's if None). A milestone's "p10"/"p50"/"p90" date is the first
+    step by which 10%/50%/90% of the paths have reached it, so "p10" is the
+    optimistic date; None if that share isn't reached within the horizon.
+    The same `seed` gives the same paths.
+    """
+    now = now or datetime.now()
+    step_days = PROJECTION_STEP_DAYS
+    steps = max(1, round(years * 365 / step_days))
+    current_sats = index.cum_sats[-1]
+    balance = max(sum(amount for _, amount in deposits) - index.cum_fiat[-1], 0.0)
+    if rate is None:
+        rate = index.rates[-1] if len(index) else 0.0
+
+    multipliers = rate_multipliers(index, step_days)
+    spend, deposit = spending_pace(index, deposits, step_days, now)
+    schedule = fiat_schedule(balance, spend, deposit, steps)
+    milestones = [m for m in MILESTONES if m > current_sats][:MAX_MILESTONES]
+
+    bands, reached = simulate(
+        current_sats,
+        rate,
+        # Without enough history the price is held flat
+        multipliers or [1.0],
+        schedule,
+        paths,
+        milestones,
+        random.Random(seed),
+    )
+
+    dates = [(now + timedelta(days=step_days * (i + 1))).date() for i in range(steps)]
+
+    def first_date(shares: List[float], share: float) -> Optional[str]:
+        for day, reached_share in zip(dates, shares):
+            if reached_share >= share:
+                return day.isoformat()
+        return None
+
+    return {
+        "paths": paths,
+        "step_days": step_days,
+        "dates": [day.isoformat() for day in dates],
+        "percentiles": {f"p{p}": values for p, values in bands.items()},
+        "milestones": [
+            {
+                "sats": milestone,
+                "probability": reached[milestone][-1],
+                "p10": first_date(reached[milestone], 0.1),
+                "p50": first_date(reached[milestone], 0.5),
+                "p90": first_date(reached[milestone], 0.9),
+            }
+            for milestone in milestones
+        ],
+        "assumptions": {
+            "current_sats": current_sats,
+            "current_rate": rate,
+            "fiat_balance": balance,
+            "fiat_spent_per_step": spend,
+            "fiat_deposited_per_step": deposit,
+            "price_history_windows": len(multipliers),
+        },
+    }
@@ -0,0 +1,175 @@
+# Description: Reconcile a client's DCA payments with its LNbits wallet ledger
+#
+# Both sides arrive oldest first in chunks (crud.stream_confirmed_payments and
+# crud.stream_wallet_ledger) and are merge-joined in a single pass. Only the
+# ledger entries within `window` of the current payment are held in memory,
+# so years of history reconcile in constant memory.
+#
+#   matched     a payment and the ledger entry it produced
+#   missing     a confirmed payment with no ledger entry
+#   unexpected  a ledger entry no payment accounts for (e.g. another sender)
+#
+# Payments that recorded a payment hash only match the ledger entry with that
+# hash; others match the closest unmatched entry of the same amount.
+
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Tuple
+
+from .analytics import to_datetime
+
+RECONCILIATION_WINDOW = timedelta(minutes=30)
+STATUSES = ("matched", "missing", "unexpected")
+
+
+async def _items(chunks: AsyncIterator[List[dict]]) -> AsyncIterator[dict]:
+    async for chunk in chunks:
+        for row in chunk:
+            yield row
+
+
+async def _next(items: AsyncIterator[dict]) -> Optional[dict]:
+    try:
+        return await items.__anext__()
+    except StopAsyncIteration:
+        return None
+
+
+def _moment(value: Any) -> datetime:
+    """Time of a payment or ledger row; both columns are NOT NULL"""
+    moment = to_datetime(value)
+    if moment is None:
+        raise ValueError(f"Unreadable timestamp {value!r}")
+    return moment
+
+
+def _isoformat(moment: Optional[datetime]) -> Optional[str]:
+    return moment.isoformat() if moment else None
+
+
+def _entry(
+    status: str,
+    payment: Optional[dict] = None,
+    ledger: Optional[dict] = None,
+    matched_on: Optional[str] = None,
+) -> dict:
+    payment_time = to_datetime(payment["created_at"]) if payment else None
+    ledger_time = to_datetime(ledger["time"]) if ledger else None
+    return {
+        "status": status,
+        "matched_on": matched_on,
+        "payment_id": payment["id"] if payment else None,
+        "payment_time": _isoformat(payment_time),
+        "amount_sats": payment["amount_sats"] if payment else None,
+        "checking_id": ledger["checking_id"] if ledger else None,
+        "ledger_time": _isoformat(ledger_time),
+        # the ledger counts millisatoshis
+        "ledger_amount_sats": ledger["amount"] // 1000 if ledger else None,
+        "payment_hash": (payment or {}).get("payment_hash")
+        or (ledger or {}).get("payment_hash"),
+        "time_delta_seconds": (
+            round((ledger_time - payment_time).total_seconds(), 3)
+            if payment_time and ledger_time
+            else None
+        ),
+    }
+
+
+def _find_match(
+    payment: dict,
+    moment: datetime,
+    candidates: Deque[Tuple[datetime, dict]],
+    window: timedelta,
+) -> Tuple[Optional[int], Optional[str]]:
+    """Position of the ledger entry `payment` produced among `candidates`"""
+    payment_hash = payment.get("payment_hash")
+    if payment_hash:
+        for i, (_, ledger) in enumerate(candidates):
+            if ledger["payment_hash"] == payment_hash:
+                return i, "payment_hash"
+        return None, None
+
+    msat = payment["amount_sats"] * 1000
+    best, best_delta = None, window
+    for i, (ledger_time, ledger) in enumerate(candidates):
+        delta = abs(ledger_time - moment)
+        if ledger["amount"] == msat and delta <= best_delta:
+            best, best_delta = i, delta
+    return (best, "amount_time") if best is not None else (None, None)
+
+
+async def reconcile(
+    payments: AsyncIterator[List[dict]],
+    ledger: AsyncIterator[List[dict]],
+    window: timedelta = RECONCILIATION_WINDOW,
+) -> AsyncIterator[dict]:
+    """Merge-join time-ordered payment and ledger chunks into entries
+
+    Entries come out roughly in time order: a ledger entry is reported
+    unexpected once the payments have moved more than `window` past it.
+    """
+    ledger_items = _items(ledger)
+    upcoming = await _next(ledger_items)
+    # Unmatched ledger entries near the current payment, oldest first
+    candidates: Deque[Tuple[datetime, dict]] = deque()
+
+    async for payment in _items(payments):
+        moment = _moment(payment["created_at"])
+        while upcoming is not None:
+            ledger_time = _moment(upcoming["time"])
+            if ledger_time > moment + window:
+                break
+            candidates.append((ledger_time, upcoming))
+            upcoming = await _next(ledger_items)
+        # Too old for this payment, so for every later one too
+        while candidates and candidates[0][0] < moment - window:
+            yield _entry("unexpected", ledger=candidates.popleft()[1])
+
+        i, matched_on = _find_match(payment, moment, candidates, window)
+        if i is None:
+            yield _entry("missing", payment=payment)
+        else:
+            ledger_entry = candidates[i][1]
+            del candidates[i]
+            yield _entry("matched", payment, ledger_entry, matched_on)
+
+    for _, ledger_entry in candidates:
+        yield _entry("unexpected", ledger=ledger_entry)
+    while upcoming is not None:
+        yield _entry("unexpected", ledger=upcoming)
+        upcoming = await _next(ledger_items)
+
+
+class ReconciliationTotals:
+    """Running counts and sats per status, for a summary after the entries"""
+
+    def __init__(self) -> None:
+        self.counts: Dict[str, int] = {status: 0 for status in STATUSES}
+        self.sats: Dict[str, int] = {status: 0 for status in STATUSES}
+        self.amount_mismatches = 0
+
+    def add(self, entry: dict) -> None:
+        status = entry["status"]
+        self.counts[status] += 1
+        self.sats[status] += (
+            entry["ledger_amount_sats"]
+            if status == "unexpected"
+            else entry["amount_sats"]
+        )
+        if status == "matched" and entry["amount_sats"] != entry["ledger_amount_sats"]:
+            self.amount_mismatches += 1
+
+    @property
+    def discrepancies(self) -> int:
+        return (
+            self.counts["missing"] + self.counts["unexpected"] + self.amount_mismatches
+        )
+
+    def dict(self, **extra: Any) -> dict:
+        return {
+            **extra,
+            "counts": self.counts,
+            "sats": self.sats,
+            "amount_mismatches": self.amount_mismatches,
+            "reconciled": self.discrepancies == 0,
+        }
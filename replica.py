@@ -0,0 +1,271 @@
+# Description: Optional read-only database target for the dashboard's queries
+#
+# The admin extension writes to ext_satoshimachine while it processes Lamassu
+# transactions. Heavy dashboard reads can go to a separate target instead:
+#
+#   SATMACHINECLIENT_READ_DATABASE_URL    postgres:// DSN of a read replica
+#   SATMACHINECLIENT_READ_SNAPSHOT_INTERVAL
+#                                         seconds between SQLite snapshots of
+#                                         the primary (SQLite deployments)
+#   SATMACHINECLIENT_MAX_READ_LAG         seconds of staleness tolerated before
+#                                         reads fall back to the primary
+#                                         (default 30, or twice the snapshot
+#                                         interval)
+#   SATMACHINECLIENT_READ_POOL_SIZE       replica connections (default 5)
+#
+# Writes, the client lookup and the client's watermark always use the primary,
+# so a registration or a settings change is visible on the next request, and
+# a request whose client the target hasn't caught up with reads from the
+# primary (see crud.get_client_watermark).
+
+import asyncio
+import os
+import sqlite3
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, AsyncIterator, Optional
+
+from lnbits.db import POSTGRES, SQLITE, Connection
+from lnbits.settings import settings
+from loguru import logger
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from .metrics import InstrumentedDatabase, metrics
+
+ENV_PREFIX = "SATMACHINECLIENT_"
+
+# Lag of a streaming replica; 0 on a primary or a replica that replayed all it
+# received, since pg_last_xact_replay_timestamp() doesn't move while idle
+REPLICA_LAG_QUERY = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END AS lag_seconds
+"""
+
+
+class ReadDatabase:
+    """Read-only counterpart of lnbits' Database with its own engine
+
+    Unlike Database it doesn't serialize access behind a lock, so concurrent
+    dashboard reads use separate connections from the pool.
+    """
+
+    def __init__(
+        self,
+        uri: str,
+        typ: str,
+        sqlite_path: Optional[str] = None,
+        **engine_options: Any,
+    ):
+        self.type = typ
+        self.schema = "satoshimachine"
+        self.sqlite_path = sqlite_path
+        self.engine = create_async_engine(uri, **engine_options)
+
+    @asynccontextmanager
+    async def connect(self) -> AsyncIterator[Connection]:
+        async with self.engine.connect() as conn:
+            wconn = Connection(conn, self.type, "ext_satoshimachine", self.schema)
+            if self.type == SQLITE:
+                await wconn.execute(f"ATTACH '{self.sqlite_path}' AS {self.schema}")
+            yield wconn
+
+    async def fetchall(self, query: str, values: Optional[dict] = None) -> Any:
+        async with self.connect() as conn:
+            return await conn.fetchall(query, values)
+
+    async def fetchone(self, query: str, values: Optional[dict] = None) -> Any:
+        async with self.connect() as conn:
+            return await conn.fetchone(query, values)
+
+    async def dispose(self) -> None:
+        await self.engine.dispose()
+
+
+def _copy_sqlite(source: str, target: str) -> None:
+    """Consistent copy of a live SQLite database, swapped in atomically"""
+    # Unique per copy: every LNbits worker process refreshes the snapshot
+    fd, tmp = tempfile.mkstemp(
+        dir=os.path.dirname(target),
+        prefix=f".{os.path.basename(target)}.",
+        suffix=".tmp",
+    )
+    os.close(fd)
+    try:
+        src = sqlite3.connect(f"file:{source}?mode=ro", uri=True)
+        dst = sqlite3.connect(tmp)
+        try:
+            with dst:
+                src.backup(dst)
+        finally:
+            src.close()
+            dst.close()
+        os.replace(tmp, target)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+
+class ReadTarget:
+    """Routes read-only queries to a replica or snapshot while it is fresh
+
+    `check()` measures the replica's lag, or refreshes the snapshot when it is
+    due; `run()` calls it every `check_interval` seconds. The target is used
+    only while the last measured lag is within `max_lag` and recent.
+    """
+
+    def __init__(
+        self,
+        url: Optional[str] = None,
+        snapshot_interval: Optional[float] = None,
+        max_lag: Optional[float] = None,
+        pool_size: int = 5,
+        check_interval: float = 5.0,
+    ):
+        self.url = url
+        self.snapshot_interval = snapshot_interval
+        self.max_lag = max_lag or max(30.0, 2 * (snapshot_interval or 0))
+        self.pool_size = pool_size
+        self.check_interval = check_interval
+        self.database: Optional[InstrumentedDatabase] = None
+        self.lag: Optional[float] = None
+        self._checked_at: Optional[float] = None
+        self._snapshot_at: Optional[float] = None
+        self._snapshot_path: Optional[str] = None
+        self._fallback = False
+
+    @classmethod
+    def from_env(cls) -> "ReadTarget":
+        def number(name: str) -> Optional[float]:
+            value = os.environ.get(f"{ENV_PREFIX}{name}")
+            return float(value) if value else None
+
+        return cls(
+            url=os.environ.get(f"{ENV_PREFIX}READ_DATABASE_URL") or None,
+            snapshot_interval=number("READ_SNAPSHOT_INTERVAL"),
+            max_lag=number("MAX_READ_LAG"),
+            pool_size=int(number("READ_POOL_SIZE") or 5),
+        )
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.url or self.snapshot_interval)
+
+    @property
+    def kind(self) -> Optional[str]:
+        if self.url:
+            return "replica"
+        return "snapshot" if self.snapshot_interval else None
+
+    @property
+    def healthy(self) -> bool:
+        if self.database is None or self.lag is None or self._checked_at is None:
+            return False
+        recent = time.monotonic() - self._checked_at < 3 * self.check_interval
+        return recent and self.lag <= self.max_lag
+
+    def choose(self, primary: Any) -> Any:
+        """The database read-only queries should use right now"""
+        if not self.configured:
+            return primary
+        if self.healthy:
+            if self._fallback:
+                logger.info("Dashboard reads are back on the read target")
+                self._fallback = False
+            return self.database
+        if not self._fallback:
+            logger.warning(
+                f"Read target lags ({self.lag}s, max {self.max_lag}s), "
+                "using the primary database"
+            )
+            self._fallback = True
+        metrics.inc("read_target_fallback_total")
+        return primary
+
+    async def check(self, primary: Any) -> None:
+        if self.url:
+            await self._check_replica(self.url)
+        elif self.snapshot_interval:
+            await self._refresh_snapshot(primary, self.snapshot_interval)
+        self._checked_at = time.monotonic()
+        if self.lag is not None:
+            metrics.set("read_target_lag_seconds", self.lag)
+
+    async def _check_replica(self, url: str) -> None:
+        if self.database is None:
+            uri = url.replace("postgres://", "postgresql+asyncpg://", 1)
+            self.database = InstrumentedDatabase(
+                ReadDatabase(
+                    uri,
+                    POSTGRES,
+                    pool_size=self.pool_size,
+                    max_overflow=0,
+                    pool_pre_ping=True,
+                )
+            )
+        try:
+            row = await self.database.fetchone(
+                REPLICA_LAG_QUERY, name="read_target.lag"
+            )
+            self.lag = float(row["lag_seconds"] or 0)
+        except Exception as e:
+            logger.warning(f"Could not measure read replica lag: {e}")
+            self.lag = None
+
+    async def _refresh_snapshot(self, primary: Any, interval: float) -> None:
+        if primary.type != SQLITE:
+            logger.warning("Read snapshots need a SQLite primary; disabling them")
+            self.snapshot_interval = None
+            return
+        now = time.time()
+        if self._snapshot_at is None or now - self._snapshot_at >= interval:
+            if self._snapshot_path is None:
+                folder = Path(settings.lnbits_data_folder, "satmachineclient")
+                folder.mkdir(parents=True, exist_ok=True)
+                self._snapshot_path = str(
+                    folder / "ext_satoshimachine.snapshot.sqlite3"
+                )
+            try:
+                await asyncio.get_running_loop().run_in_executor(
+                    None, _copy_sqlite, primary.path, self._snapshot_path
+                )
+            except Exception as e:
+                logger.warning(f"Could not refresh the read snapshot: {e}")
+            else:
+                self._snapshot_at = now
+                if self.database is None:
+                    self.database = InstrumentedDatabase(
+                        ReadDatabase(
+                            f"sqlite+aiosqlite:///{self._snapshot_path}",
+                            SQLITE,
+                            sqlite_path=self._snapshot_path,
+                        )
+                    )
+                else:
+                    # Connections still pointing at the replaced file are dropped
+                    await self.database.dispose()
+        self.lag = time.time() - self._snapshot_at if self._snapshot_at else None
+
+    async def run(self, primary: Any) -> None:
+        while True:
+            try:
+                await self.check(primary)
+            except Exception as e:
+                logger.warning(f"Read target check failed: {e}")
+            await asyncio.sleep(self.check_interval)
+
+    def status(self) -> dict:
+        return {
+            "configured": self.configured,
+            "kind": self.kind,
+            "healthy": self.healthy,
+            "lag_seconds": self.lag,
+            "max_lag_seconds": self.max_lag,
+        }
+
+
+read_target = ReadTarget.from_env()
@@ -23,6 +23,8 @@ window.app = Vue.createApp({
       // Dashboard state
       dashboardData: null,
       transactions: [],
+      transactionsCursor: null,  // Keyset cursor for "load more"
+      loadingMoreTransactions: false,
       loading: true,
       error: null,
       showFiatValues: false,  // Hide fiat values by default
@@ -72,6 +74,11 @@ window.app = Vue.createApp({
       chartTimeRange: '30d',
       dcaChart: null,
       analyticsData: null,
+      projection: null,  // Monte Carlo bands and milestone dates
+      chartMaxPoints: 500,  // Server-side downsampling budget per series
+      etagCache: {},  // url -> { etag, data } for conditional refreshes
+      eventSource: null,
+      eventStreamRetry: null,
       chartLoading: false
     }
   },
@@ -95,11 +102,11 @@ window.app = Vue.createApp({
     },
 
     // Registration Methods
-    async checkRegistrationStatus() {
+    async loadBootstrap() {
       try {
         const { data } = await LNbits.api.request(
           'GET',
-          '/satmachineclient/api/v1/registration-status',
+          `/satmachineclient/api/v1/dashboard/bootstrap?time_range=${this.chartTimeRange}&max_points=${this.chartMaxPoints}`,
           this.g.user.wallets[0].adminkey
         )
 
@@ -110,12 +117,22 @@ window.app = Vue.createApp({
           // Fetch current user info to get the username
           await this.loadCurrentUser()
           this.registrationForm.selectedWallet = this.g.user.wallets[0]?.id || null
+          return data
         }
 
+        this.dashboardData = data.summary
+        this.transactions = this.sortTransactions(data.transactions.transactions)
+        this.transactionsCursor = data.transactions.next_cursor
+        // The analyticsData watcher draws the chart once the canvas exists
+        this.analyticsData = this.analyticsColumns(data.analytics)
+        this.startEventStream()
+        // Milestone dates are a nice-to-have; don't hold the dashboard for them
+        this.loadProjection()
+
         return data
       } catch (error) {
-        console.error('Error checking registration status:', error)
-        this.error = 'Failed to check registration status'
+        console.error('Error loading dashboard:', error)
+        this.error = 'Failed to load dashboard data'
         this.registrationChecked = true
       }
     },
@@ -169,6 +186,7 @@ window.app = Vue.createApp({
 
         // Load dashboard data after successful registration
         await this.loadDashboardData()
+        this.startEventStream()
 
       } catch (error) {
         console.error('Error registering client:', error)
@@ -245,41 +263,57 @@ window.app = Vue.createApp({
       return formatted + ' sats'
     },
 
+    // GET with If-None-Match; a 304 reuses the body cached for that URL
+    async conditionalGet(url) {
+      const cached = this.etagCache[url]
+      const headers = { 'X-Api-Key': this.g.user.wallets[0].adminkey }
+      if (cached) headers['If-None-Match'] = cached.etag
+
+      const response = await axios({
+        method: 'GET',
+        url: url,
+        headers: headers,
+        validateStatus: status => status === 200 || status === 304
+      })
+
+      if (response.status === 304 && cached) return cached.data
+      if (response.headers.etag) {
+        this.etagCache[url] = { etag: response.headers.etag, data: response.data }
+      }
+      return response.data
+    },
+
     async loadDashboardData() {
       try {
-        const { data } = await LNbits.api.request(
-          'GET',
-          '/satmachineclient/api/v1/dashboard/summary',
-          this.g.user.wallets[0].adminkey
+        this.dashboardData = await this.conditionalGet(
+          '/satmachineclient/api/v1/dashboard/summary'
         )
-        this.dashboardData = data
       } catch (error) {
         console.error('Error loading dashboard data:', error)
         this.error = 'Failed to load dashboard data'
       }
     },
 
-    async loadTransactions() {
+    async loadProjection() {
       try {
-        const { data } = await LNbits.api.request(
-          'GET',
-          '/satmachineclient/api/v1/dashboard/transactions?limit=50',
-          this.g.user.wallets[0].adminkey
+        this.projection = await this.conditionalGet(
+          '/satmachineclient/api/v1/dashboard/projection'
         )
+      } catch (error) {
+        console.error('Error loading projection:', error)
+        this.projection = null
+      }
+    },
 
-        // Debug: Log the first transaction to see date format
-        if (data.length > 0) {
-          console.log('Sample transaction data:', data[0])
-          console.log('transaction_time:', data[0].transaction_time)
-          console.log('created_at:', data[0].created_at)
-        }
+    async loadTransactions() {
+      try {
+        const data = await this.conditionalGet(
+          '/satmachineclient/api/v1/dashboard/transactions?limit=50&cursor='
+        )
 
         // Sort by most recent first and store
-        this.transactions = data.sort((a, b) => {
-          const dateA = new Date(a.transaction_time || a.created_at)
-          const dateB = new Date(b.transaction_time || b.created_at)
-          return dateB - dateA  // Most recent first
-        })
+        this.transactions = this.sortTransactions(data.transactions)
+        this.transactionsCursor = data.next_cursor
       } catch (error) {
         console.error('Error loading transactions:', error)
         this.$q.notify({
@@ -290,12 +324,48 @@ window.app = Vue.createApp({
       }
     },
 
+    async loadMoreTransactions() {
+      if (!this.transactionsCursor || this.loadingMoreTransactions) return
+
+      try {
+        this.loadingMoreTransactions = true
+        const { data } = await LNbits.api.request(
+          'GET',
+          `/satmachineclient/api/v1/dashboard/transactions?limit=50&cursor=${encodeURIComponent(this.transactionsCursor)}`,
+          this.g.user.wallets[0].adminkey
+        )
+
+        this.transactions = this.transactions.concat(
+          this.sortTransactions(data.transactions)
+        )
+        this.transactionsCursor = data.next_cursor
+      } catch (error) {
+        console.error('Error loading more transactions:', error)
+        this.$q.notify({
+          type: 'negative',
+          message: 'Failed to load more transactions',
+          position: 'top'
+        })
+      } finally {
+        this.loadingMoreTransactions = false
+      }
+    },
+
+    sortTransactions(transactions) {
+      return transactions.sort((a, b) => {
+        const dateA = new Date(a.transaction_time || a.created_at)
+        const dateB = new Date(b.transaction_time || b.created_at)
+        return dateB - dateA  // Most recent first
+      })
+    },
+
     async refreshAllData() {
       try {
         this.loading = true
         await Promise.all([
           this.loadDashboardData(),
-          this.loadTransactions()
+          this.loadTransactions(),
+          this.loadProjection()
         ])
         this.$q.notify({
           type: 'positive',
@@ -315,6 +385,74 @@ window.app = Vue.createApp({
       }
     },
 
+    // Live updates pushed by the server, applied in place
+    async startEventStream() {
+      if (this.eventSource || typeof EventSource === 'undefined') return
+
+      // EventSource can't send the admin key as a header; trade it for a
+      // short-lived token that only opens the stream
+      let token
+      try {
+        const { data } = await LNbits.api.request(
+          'POST',
+          '/satmachineclient/api/v1/dashboard/stream/token',
+          this.g.user.wallets[0].adminkey
+        )
+        token = data.token
+      } catch (error) {
+        console.error('Error opening live updates:', error)
+        return
+      }
+      if (this.eventSource) return
+
+      this.eventSource = new EventSource(
+        `/satmachineclient/api/v1/dashboard/stream?token=${encodeURIComponent(token)}`
+      )
+      this.eventSource.addEventListener('payment', event => {
+        const data = JSON.parse(event.data)
+        // Already counted (e.g. by a refresh that raced the event)
+        if (this.transactions.some(tx => tx.id === data.transaction.id)) return
+        this.transactions.unshift(data.transaction)
+        this.applySummaryDelta(data.delta, data.transaction.created_at)
+      })
+      this.eventSource.addEventListener('deposit', event => {
+        this.applySummaryDelta(JSON.parse(event.data).delta)
+      })
+      this.eventSource.addEventListener('resync', () => this.refreshAllData())
+      this.eventSource.onerror = () => {
+        // Reconnects reuse the URL, so an expired token closes the stream
+        if (this.eventSource?.readyState !== EventSource.CLOSED) return
+        this.stopEventStream()
+        this.eventStreamRetry = setTimeout(() => this.startEventStream(), 5000)
+      }
+    },
+
+    stopEventStream() {
+      clearTimeout(this.eventStreamRetry)
+      this.eventStreamRetry = null
+      if (this.eventSource) {
+        this.eventSource.close()
+        this.eventSource = null
+      }
+    },
+
+    applySummaryDelta(delta, lastTransactionDate) {
+      if (!this.dashboardData) return
+      Object.entries(delta).forEach(([key, value]) => {
+        this.dashboardData[key] = (this.dashboardData[key] || 0) + value
+      })
+      if (lastTransactionDate) {
+        this.dashboardData.last_transaction_date = lastTransactionDate
+      }
+      // Cost basis = sats / fiat spent on DCA
+      const spent = this.dashboardData.total_fiat_invested - this.dashboardData.current_fiat_balance
+      this.dashboardData.average_cost_basis = spent > 0
+        ? this.dashboardData.total_sats_accumulated / spent
+        : 0
+      // Cached conditional responses are outdated now
+      this.etagCache = {}
+    },
+
     getNextMilestone() {
       if (!this.dashboardData) return { target: 10000, name: '10k sats' }
       const sats = this.dashboardData.total_sats_accumulated
@@ -332,6 +470,22 @@ window.app = Vue.createApp({
       return { target: 500000000, name: '500M sats (5 BTC)' }
     },
 
+    getMilestoneEta() {
+      // Median projected date for the next milestone, with the 10%/90% dates
+      if (!this.projection || !this.dashboardData) return null
+      const target = this.getNextMilestone().target
+      const milestone = this.projection.milestones.find(m => m.sats === target)
+      if (!milestone || !milestone.p50) return null
+      const month = iso => new Date(`${iso}T00:00:00`).toLocaleDateString('en-US', {
+        month: 'short',
+        year: 'numeric'
+      })
+      const range = milestone.p10 && milestone.p90
+        ? ` (${month(milestone.p10)} – ${month(milestone.p90)})`
+        : ''
+      return `likely by ${month(milestone.p50)}${range}`
+    },
+
     getMilestoneProgress() {
       if (!this.dashboardData) {
         console.log('getMilestoneProgress: no dashboard data')
@@ -346,6 +500,33 @@ window.app = Vue.createApp({
       console.log('getMilestoneProgress:', { sats, milestone, progress, result })
       return result
     },
+    analyticsColumns(analytics) {
+      // Analytics in the default row format (bootstrap) as format=columnar
+      // would return them
+      if (!analytics || !Array.isArray(analytics.cost_basis_history)) {
+        return analytics
+      }
+      const columns = (rows, fields, toEpoch) =>
+        Object.fromEntries(
+          fields.map(field => [
+            field,
+            rows.map(row => (field === 'date' ? toEpoch(row.date) : row[field]))
+          ])
+        )
+      return {
+        ...analytics,
+        cost_basis_history: columns(
+          analytics.cost_basis_history,
+          ['date', 'average_cost_basis', 'cumulative_sats', 'cumulative_fiat'],
+          date => new Date(date).getTime() / 1000
+        ),
+        accumulation_timeline: columns(
+          analytics.accumulation_timeline,
+          ['date', 'sats', 'fiat', 'transactions'],
+          day => Date.parse(day) / 1000
+        )
+      }
+    },
     async loadChartData() {
       // Prevent multiple simultaneous requests
       if (this.chartLoading) {
@@ -363,17 +544,12 @@ window.app = Vue.createApp({
           this.dcaChart = null
         }
 
-        const { data } = await LNbits.api.request(
-          'GET',
-          `/satmachineclient/api/v1/dashboard/analytics?time_range=${this.chartTimeRange}`,
-          this.g.user.wallets[0].adminkey
+        const data = await this.conditionalGet(
+          `/satmachineclient/api/v1/dashboard/analytics?time_range=${this.chartTimeRange}&max_points=${this.chartMaxPoints}&format=columnar`
         )
 
         // Debug: Log analytics data
         console.log('Analytics data received:', data)
-        if (data && data.cost_basis_history && data.cost_basis_history.length > 0) {
-          console.log('Sample cost basis point:', data.cost_basis_history[0])
-        }
 
         this.analyticsData = data
 
@@ -439,31 +615,22 @@ window.app = Vue.createApp({
 
       const ctx = this.$refs.dcaChart.getContext('2d')
 
-      // Use accumulation_timeline data which is already grouped by day
-      const timelineData = this.analyticsData.accumulation_timeline || []
-      console.log('Timeline data sample:', timelineData.slice(0, 2)) // Debug first 2 records
+      // Series arrive as columns (format=columnar): one array per field,
+      // dates in epoch seconds; timeline days are midnight UTC
+      const timeline = this.analyticsData.accumulation_timeline
+      const dayLabel = { month: 'short', day: 'numeric', timeZone: 'UTC' }
 
       // If we have timeline data, use it (already grouped by day)
-      if (timelineData.length > 0) {
+      if (timeline.date.length > 0) {
         // Calculate running totals from daily data
         let runningSats = 0
         const labels = []
         const cumulativeSats = []
 
-        timelineData.forEach(point => {
-          // Ensure sats is a valid number
-          const sats = point.sats || 0
-          const validSats = typeof sats === 'number' ? sats : parseFloat(sats) || 0
-          runningSats += validSats
-
-          const date = new Date(point.date)
-          if (!isNaN(date.getTime())) {
-            labels.push(date.toLocaleDateString('en-US', {
-              month: 'short',
-              day: 'numeric'
-            }))
-            cumulativeSats.push(runningSats)
-          }
+        timeline.date.forEach((day, i) => {
+          runningSats += timeline.sats[i] || 0
+          labels.push(new Date(day * 1000).toLocaleDateString('en-US', dayLabel))
+          cumulativeSats.push(runningSats)
         })
 
         console.log('Timeline chart data:', { labels, cumulativeSats })
@@ -474,11 +641,10 @@ window.app = Vue.createApp({
 
       // Fallback to cost_basis_history but group by date to avoid duplicates
       console.log('No timeline data, using cost_basis_history as fallback')
-      const chartData = this.analyticsData.cost_basis_history || []
-      console.log('Chart data sample:', chartData.slice(0, 2)) // Debug first 2 records
+      const chartData = this.analyticsData.cost_basis_history
 
       // Handle empty data case
-      if (chartData.length === 0) {
+      if (chartData.date.length === 0) {
         console.log('No chart data available')
         // Create gradient for placeholder chart
         const placeholderGradient = ctx.createLinearGradient(0, 0, 0, 300)
@@ -554,63 +720,21 @@ window.app = Vue.createApp({
         return
       }
 
-      // Group cost_basis_history by date to eliminate duplicates
-      const groupedData = new Map()
-      chartData.forEach(point => {
-        const dateStr = new Date(point.date).toDateString()
-        if (!groupedData.has(dateStr)) {
-          groupedData.set(dateStr, point)
-        } else {
-          // Use the latest cumulative values for the same date
-          const existing = groupedData.get(dateStr)
-          if (point.cumulative_sats > existing.cumulative_sats) {
-            groupedData.set(dateStr, point)
-          }
-        }
-      })
-
-      const uniqueChartData = Array.from(groupedData.values()).sort((a, b) =>
-        new Date(a.date).getTime() - new Date(b.date).getTime()
-      )
-
-      const labels = uniqueChartData.map(point => {
-        // Handle different date formats with enhanced timezone handling
-        let date;
-        if (point.date) {
-          console.log('Raw date from API:', point.date); // Debug the actual date string
-
-          // If it's an ISO string with timezone info, parse it correctly
-          if (typeof point.date === 'string' && point.date.includes('T')) {
-            // ISO string - parse and convert to local date
-            date = new Date(point.date);
-            // For display purposes, use the date part only to avoid timezone shifts
-            const localDateStr = date.getFullYear() + '-' +
-              String(date.getMonth() + 1).padStart(2, '0') + '-' +
-              String(date.getDate()).padStart(2, '0');
-            date = new Date(localDateStr + 'T00:00:00'); // Force local midnight
-          } else {
-            date = new Date(point.date);
-          }
-
-          // Check if date is valid
-          if (isNaN(date.getTime())) {
-            date = new Date();
-          }
-        } else {
-          date = new Date();
-        }
-
-        console.log('Formatted date:', date.toLocaleDateString('en-US', { month: 'short', day: 'numeric' }));
-
-        return date.toLocaleDateString('en-US', {
+      // Keep the last point of each local day; the curve is cumulative, so
+      // that is the day's highest total
+      const labels = []
+      const cumulativeSats = []
+      chartData.date.forEach((moment, i) => {
+        const label = new Date(moment * 1000).toLocaleDateString('en-US', {
           month: 'short',
           day: 'numeric'
         })
-      })
-      const cumulativeSats = uniqueChartData.map(point => {
-        // Ensure cumulative_sats is a valid number
-        const sats = point.cumulative_sats || 0
-        return typeof sats === 'number' ? sats : parseFloat(sats) || 0
+        if (labels[labels.length - 1] === label) {
+          cumulativeSats[cumulativeSats.length - 1] = chartData.cumulative_sats[i]
+        } else {
+          labels.push(label)
+          cumulativeSats.push(chartData.cumulative_sats[i])
+        }
       })
 
       console.log('Final chart data:', { labels, cumulativeSats })
@@ -797,20 +921,12 @@ window.app = Vue.createApp({
     try {
       this.loading = true
 
-      // Load client limits first
-      await this.loadClientLimits()
-
-      // Check registration status
-      await this.checkRegistrationStatus()
-
-      // Only load dashboard data if registered
-      if (this.isRegistered) {
-        await Promise.all([
-          this.loadDashboardData(),
-          this.loadTransactions(),
-          this.loadChartData()
-        ])
-      }
+      // Client limits come from the admin extension; everything else arrives
+      // in a single bootstrap response
+      await Promise.all([
+        this.loadClientLimits(),
+        this.loadBootstrap()
+      ])
     } catch (error) {
       console.error('Error initializing dashboard:', error)
       this.error = 'Failed to initialize dashboard'
@@ -836,6 +952,10 @@ window.app = Vue.createApp({
     })
   },
 
+  beforeUnmount() {
+    this.stopEventStream()
+  },
+
   computed: {
     hasData() {
       return this.dashboardData && !this.loading && this.isRegistered
@@ -1,2 +1,678 @@
-# No background tasks needed in client extension
-# Client extension is a read-only dashboard
\ No newline at end of file
+# Description: Background tasks for the client extension
+# The extension stays read-only on the admin extension's tables; prebuilt
+# statements are written to LNbits' data folder
+
+import asyncio
+import csv
+import json
+import os
+import tempfile
+from contextlib import asynccontextmanager
+from datetime import date, datetime, timedelta
+from io import StringIO
+from pathlib import Path
+from typing import IO, Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+
+from lnbits.settings import settings
+from loguru import logger
+
+from .analytics import to_datetime
+from .crud import (
+    EVENT_COLUMNS,
+    get_active_clients,
+    get_event_baseline,
+    get_event_changes,
+    get_payment_index,
+    stream_confirmed_payments,
+    stream_period_transactions,
+    stream_wallet_ledger,
+)
+from .metrics import metrics
+from .models import ClientTransaction
+from .reconciliation import RECONCILIATION_WINDOW, ReconciliationTotals, reconcile
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; every process then runs the workers
+    fcntl = None  # type: ignore[assignment]
+
+
+class DashboardEventHub:
+    """Fan out new payments and deposit status changes to dashboard streams
+
+    A single poller per process watches every subscribed client with one
+    delta query per table and interval, and pushes events to each
+    subscriber's queue. It starts with the first subscriber and stops when
+    the last one leaves.
+
+    Per client and table it keeps a watermark, the newest created_at seen,
+    and the ids of the rows still pending; each poll reads the rows created
+    after the watermarks and those pending rows, however long they take to
+    be confirmed.
+    """
+
+    def __init__(self, interval: float = 5.0, queue_size: int = 100):
+        self.interval = interval
+        self.queue_size = queue_size
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        # client id -> table -> newest created_at seen (None: no rows yet)
+        self._watermarks: Dict[str, Dict[str, Any]] = {}
+        # table -> id of a pending row -> its client id
+        self._pending: Dict[str, Dict[str, str]] = {
+            table: {} for table in EVENT_COLUMNS
+        }
+        self._task: Optional[asyncio.Task] = None
+
+    def subscribe(self, client_id: str) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.setdefault(client_id, set()).add(queue)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return queue
+
+    def unsubscribe(self, client_id: str, queue: asyncio.Queue) -> None:
+        queues = self._subscribers.get(client_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._subscribers[client_id]
+            self._watermarks.pop(client_id, None)
+            for pending in self._pending.values():
+                for row_id in [r for r, c in pending.items() if c == client_id]:
+                    del pending[row_id]
+
+    def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self) -> None:
+        while self._subscribers:
+            try:
+                await self.poll()
+            except Exception as e:
+                logger.warning(f"Dashboard event poll failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def poll(self) -> None:
+        # Clients polled for the first time only record what already exists
+        new_clients = [cid for cid in self._subscribers if cid not in self._watermarks]
+        watched = [cid for cid in self._subscribers if cid in self._watermarks]
+
+        for table, pending in self._pending.items():
+            changes = await get_event_changes(
+                table,
+                {
+                    client_id: self._watermarks[client_id][table]
+                    for client_id in watched
+                },
+                list(pending),
+            )
+            for row in changes:
+                self._apply(table, row)
+
+            newest, pending_rows = await get_event_baseline(table, new_clients)
+            for client_id in new_clients:
+                self._watermarks.setdefault(client_id, {})[table] = newest.get(
+                    client_id
+                )
+            for row in pending_rows:
+                pending[row["id"]] = row["client_id"]
+
+    def _apply(self, table: str, row: dict) -> None:
+        """Advance the watermarks past `row` and publish what changed"""
+        client_id = row["client_id"]
+        watermarks = self._watermarks.get(client_id)
+        if watermarks is None:
+            return
+        newest = to_datetime(watermarks[table])
+        created_at = to_datetime(row["created_at"])
+        if newest is None or (created_at is not None and created_at > newest):
+            watermarks[table] = row["created_at"]
+
+        pending = self._pending[table]
+        previous = "pending" if row["id"] in pending else None
+        if row["status"] == "pending":
+            pending[row["id"]] = client_id
+        else:
+            pending.pop(row["id"], None)
+        if row["status"] == previous:
+            return
+
+        if table == "dca_payments":
+            if row["status"] != "confirmed":
+                return
+            tx = ClientTransaction.parse_obj(row)
+            self._publish(
+                client_id,
+                {
+                    "type": "payment",
+                    "transaction": tx.dict(),
+                    "delta": {
+                        "total_sats_accumulated": tx.amount_sats,
+                        "total_transactions": 1,
+                        "current_fiat_balance": -tx.amount_fiat,
+                    },
+                },
+            )
+        else:
+            deposit = {key: row[key] for key in ("id", "client_id", "amount", "status")}
+            self._publish(
+                client_id,
+                {
+                    "type": "deposit",
+                    "deposit": {**deposit, "previous_status": previous},
+                    "delta": _deposit_delta(row["amount"], previous, row["status"]),
+                },
+            )
+
+    def _publish(self, client_id: str, event: dict) -> None:
+        for queue in self._subscribers.get(client_id, ()):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # A stalled subscriber lost events; tell it to reload instead
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait({"type": "resync"})
+
+
+def _deposit_delta(amount: float, previous: Optional[str], status: str) -> dict:
+    """Summary changes caused by a deposit moving from `previous` to `status`"""
+    delta = {
+        "total_fiat_invested": 0.0,
+        "pending_fiat_deposits": 0.0,
+        "current_fiat_balance": 0.0,
+    }
+    for state, sign in ((previous, -1), (status, 1)):
+        if state == "confirmed":
+            delta["total_fiat_invested"] += sign * amount
+            delta["current_fiat_balance"] += sign * amount
+        elif state == "pending":
+            delta["pending_fiat_deposits"] += sign * amount
+    return delta
+
+
+def format_sse(event: dict) -> str:
+    """Serialize an event for a text/event-stream response"""
+    data = json.dumps(
+        event, default=lambda o: o.isoformat() if isinstance(o, datetime) else str(o)
+    )
+    return f"event: {event['type']}\ndata: {data}\n\n"
+
+
+dashboard_events = DashboardEventHub()
+
+
+###################################################
+############## MONTHLY STATEMENTS #################
+###################################################
+
+CSV_HEADER = [
+    "Date",
+    "Amount (Sats)",
+    "Amount (Fiat)",
+    "Exchange Rate",
+    "Type",
+    "Status",
+]
+
+
+async def transactions_csv(
+    chunks: AsyncIterator[List[ClientTransaction]],
+) -> AsyncIterator[str]:
+    """Render chunks of transactions as CSV text, header first"""
+    output = StringIO()
+    writer = csv.writer(output)
+    writer.writerow(CSV_HEADER)
+    yield output.getvalue()
+    async for transactions in chunks:
+        output.seek(0)
+        output.truncate()
+        for tx in transactions:
+            writer.writerow(
+                [
+                    tx.created_at.isoformat(),
+                    tx.amount_sats,
+                    tx.amount_fiat,  # Amount already in GTQ
+                    tx.exchange_rate,
+                    tx.transaction_type,
+                    tx.status,
+                ]
+            )
+        yield output.getvalue()
+
+
+def period_of(day: date) -> str:
+    return f"{day.year:04d}-{day.month:02d}"
+
+
+def next_period(period: str) -> str:
+    start, _ = period_bounds(period)
+    return period_of((start + timedelta(days=32)).date())
+
+
+def period_bounds(period: str) -> Tuple[datetime, datetime]:
+    """First and last instant of a YYYY-MM period"""
+    start = datetime.strptime(period, "%Y-%m")
+    next_start = (start + timedelta(days=32)).replace(day=1)
+    return start, next_start - timedelta(microseconds=1)
+
+
+def last_closed_period(today: Optional[date] = None) -> str:
+    today = today or date.today()
+    return period_of(today.replace(day=1) - timedelta(days=1))
+
+
+def _temporary_file(path: Path) -> IO[str]:
+    """A new file next to `path`, unique to this writer
+
+    Every LNbits worker process runs the background tasks, so a fixed
+    temporary name could be written by two of them at once.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    return tempfile.NamedTemporaryFile(
+        "w",
+        dir=path.parent,
+        prefix=f".{path.name}.",
+        suffix=".tmp",
+        delete=False,
+        newline="",
+    )
+
+
+async def write_text_atomic(path: Path, chunks: AsyncIterator[str]) -> None:
+    """Write chunks to a temporary file and rename it to `path`, so readers
+    never see a partial file; the file I/O runs off the event loop"""
+    tmp = await asyncio.to_thread(_temporary_file, path)
+    try:
+        async for chunk in chunks:
+            await asyncio.to_thread(tmp.write, chunk)
+        await asyncio.to_thread(tmp.close)
+        await asyncio.to_thread(os.replace, tmp.name, path)
+    except BaseException:
+        tmp.close()
+        Path(tmp.name).unlink(missing_ok=True)
+        raise
+
+
+async def _json_chunks(data: Any) -> AsyncIterator[str]:
+    yield json.dumps(data)
+
+
+def _load_json(path: Path) -> Optional[Any]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+async def read_json(path: Path) -> Optional[Any]:
+    """Parsed contents of a JSON file, or None if there is none"""
+    return await asyncio.to_thread(_load_json, path)
+
+
+def _try_lock(path: Path) -> Optional[IO[str]]:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    f = open(path, "a")
+    if fcntl is None:
+        return f
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        f.close()
+        return None
+    return f
+
+
+@asynccontextmanager
+async def single_runner(path: Path) -> AsyncIterator[bool]:
+    """Whether this process holds the lock file at `path` for the block
+
+    Every LNbits worker process starts the background tasks; the one that
+    gets the lock does the work and the others skip that run. The lock is
+    released when the block ends, or by the OS if the process dies.
+    """
+    lock = await asyncio.to_thread(_try_lock, path)
+    try:
+        yield lock is not None
+    finally:
+        if lock is not None:
+            lock.close()
+
+
+class StatementStore:
+    """Prebuilt statements on disk
+
+    `<root>/<client_id>/<YYYY-MM>.csv` holds the month's transactions and
+    `<YYYY-MM>.json` its analytics snapshot; `<root>/<client_id>/checkpoint.json`
+    the last month built for that client. Files are written to a temporary
+    name and renamed, so a crash never leaves a partial artifact behind. The
+    file system is only touched from worker threads, off the event loop.
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+
+    def path(self, client_id: str, period: str, kind: str) -> Path:
+        return self.root / client_id / f"{period}.{kind}"
+
+    def _has(self, client_id: str, period: str) -> bool:
+        return all(
+            self.path(client_id, period, kind).exists() for kind in ("csv", "json")
+        )
+
+    async def has(self, client_id: str, period: str) -> bool:
+        """Whether both artifacts of the month exist"""
+        return await asyncio.to_thread(self._has, client_id, period)
+
+    def _periods(self, client_id: str) -> List[str]:
+        folder = self.root / client_id
+        if not folder.is_dir():
+            return []
+        return sorted(
+            path.stem
+            for path in folder.glob("????-??.json")
+            if self._has(client_id, path.stem)
+        )
+
+    async def periods(self, client_id: str) -> List[str]:
+        """Months with a complete statement, oldest first"""
+        return await asyncio.to_thread(self._periods, client_id)
+
+    async def write_text(self, path: Path, chunks: AsyncIterator[str]) -> None:
+        await write_text_atomic(path, chunks)
+
+    async def read_text(self, path: Path, size: int = 64 * 1024) -> AsyncIterator[str]:
+        f = await asyncio.to_thread(open, path, newline="")
+        try:
+            while True:
+                chunk = await asyncio.to_thread(f.read, size)
+                if not chunk:
+                    return
+                yield chunk
+        finally:
+            f.close()
+
+    async def load_snapshot(self, client_id: str, period: str) -> Optional[dict]:
+        return await read_json(self.path(client_id, period, "json"))
+
+    async def load_checkpoint(self, client_id: str) -> Optional[str]:
+        checkpoint = await read_json(self.root / client_id / "checkpoint.json")
+        return checkpoint.get("completed_through") if checkpoint else None
+
+    async def save_checkpoint(self, client_id: str, period: str) -> None:
+        await self.write_text(
+            self.root / client_id / "checkpoint.json",
+            _json_chunks({"completed_through": period}),
+        )
+
+
+async def build_period_snapshot(client_id: str, period: str) -> dict:
+    """Totals, cost basis curve and daily accumulation of one month"""
+    start, end = period_bounds(period)
+    index = await get_payment_index(client_id)
+    total_sats, total_fiat, count = index.range_totals(start, end)
+    cost_basis_history, accumulation_timeline, _ = index.analytics(start, "day", end)
+    return {
+        "client_id": client_id,
+        "period": period,
+        "generated_at": datetime.now().isoformat(),
+        "total_sats": total_sats,
+        "total_fiat": total_fiat,
+        "total_transactions": count,
+        "average_cost_basis": total_sats / total_fiat if total_fiat > 0 else 0,
+        "cost_basis_history": cost_basis_history,
+        "accumulation_timeline": accumulation_timeline,
+    }
+
+
+class StatementWorker:
+    """Builds each active client's statement once a month has closed
+
+    Each client's months are processed oldest first, from the month after its
+    checkpoint (or its registration) to the last closed one, with at most
+    `concurrency` statements built at a time. A client's checkpoint only
+    advances past a month once its statement is built; artifacts that already
+    exist are skipped, so a restart resumes where the worker stopped. Only
+    one process runs at a time (see `single_runner`).
+    """
+
+    def __init__(
+        self,
+        store: Optional[StatementStore] = None,
+        concurrency: int = 4,
+        interval: float = 3600.0,
+    ):
+        self._store = store
+        self.concurrency = concurrency
+        self.interval = interval
+        # Clients skipped for an unreadable registration time, logged once
+        self._skipped: Set[str] = set()
+
+    @property
+    def store(self) -> StatementStore:
+        if self._store is None:
+            self._store = StatementStore(
+                Path(settings.lnbits_data_folder, "satmachineclient", "statements")
+            )
+        return self._store
+
+    async def run(self) -> None:
+        while True:
+            try:
+                built = await self.run_once()
+                if built:
+                    logger.info(f"Built {built} monthly DCA statements")
+            except Exception as e:
+                logger.warning(f"Statement generation failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def run_once(self, today: Optional[date] = None) -> int:
+        """Build every missing statement up to the last closed month"""
+        async with single_runner(self.store.root / ".lock") as runner:
+            if not runner:
+                return 0
+            clients = await get_active_clients()
+            last_period = last_closed_period(today)
+            semaphore = asyncio.Semaphore(self.concurrency)
+            built = await asyncio.gather(
+                *(self._catch_up(semaphore, client, last_period) for client in clients)
+            )
+            return sum(built)
+
+    async def _catch_up(
+        self, semaphore: asyncio.Semaphore, client: dict, last_period: str
+    ) -> int:
+        """Build a client's missing statements; returns how many were built"""
+        checkpoint = await self.store.load_checkpoint(client["id"])
+        if checkpoint:
+            period = next_period(checkpoint)
+        else:
+            registered = to_datetime(client["created_at"])
+            if registered is None:
+                if client["id"] not in self._skipped:
+                    self._skipped.add(client["id"])
+                    logger.warning(
+                        f"Skipping statements for {client['id']}: unreadable "
+                        f"registration time {client['created_at']!r}"
+                    )
+                return 0
+            period = period_of(registered.date())
+        built = 0
+        while period <= last_period:
+            if not await self.store.has(client["id"], period):
+                async with semaphore:
+                    try:
+                        await self.build_statement(client, period)
+                    except Exception as e:
+                        # Retried on the next run; the checkpoint stays put
+                        logger.warning(
+                            f"Could not build {period} statement for "
+                            f"{client['id']}: {e}"
+                        )
+                        return built
+                built += 1
+            await self.store.save_checkpoint(client["id"], period)
+            period = next_period(period)
+        return built
+
+    async def build_statement(self, client: dict, period: str) -> None:
+        start, end = period_bounds(period)
+        # The same payments, by the same date, as the snapshot's
+        await self.store.write_text(
+            self.store.path(client["id"], period, "csv"),
+            transactions_csv(stream_period_transactions(client["id"], start, end)),
+        )
+        snapshot = await build_period_snapshot(client["id"], period)
+        await self.store.write_text(
+            self.store.path(client["id"], period, "json"), _json_chunks(snapshot)
+        )
+
+
+def _age_seconds(timestamp: str) -> float:
+    return (datetime.now() - datetime.fromisoformat(timestamp)).total_seconds()
+
+
+statement_worker = StatementWorker()
+
+
+def _widen(moment: Optional[datetime], by: timedelta) -> Optional[datetime]:
+    return moment + by if moment else None
+
+
+def _entry_time(entry: dict) -> datetime:
+    """When an entry happened: its payment's time, or its ledger entry's"""
+    return datetime.fromisoformat(entry["payment_time"] or entry["ledger_time"])
+
+
+async def reconcile_client(
+    client: dict,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    window: timedelta = RECONCILIATION_WINDOW,
+    chunk_size: int = 500,
+) -> AsyncIterator[dict]:
+    """Reconciliation entries of a dca_clients row against its wallet
+
+    Both sides are read `window` beyond the range, so payments and ledger
+    entries near its edges meet their counterpart just outside it. Entries
+    whose time falls outside the range are then dropped; they belong to the
+    neighbouring range.
+    """
+    start, end = _widen(start_date, -window), _widen(end_date, window)
+    entries = reconcile(
+        stream_confirmed_payments(client["id"], chunk_size, start, end),
+        stream_wallet_ledger(client["wallet_id"], chunk_size, start, end),
+        window,
+    )
+    async for entry in entries:
+        moment = _entry_time(entry)
+        if (start_date and moment < start_date) or (end_date and moment > end_date):
+            continue
+        yield entry
+
+
+class ReconciliationWorker:
+    """Reconciles every active client's full history once a day
+
+    The latest report per client is kept at `<root>/<client_id>.json`: the
+    totals plus the missing, unexpected and mismatched entries (at most
+    `max_discrepancies` of them). Matched entries are only counted. Only one
+    process runs at a time (see `single_runner`), and reports younger than
+    `interval` are kept, so the other processes don't redo the day's work.
+    """
+
+    def __init__(
+        self,
+        root: Optional[Path] = None,
+        concurrency: int = 2,
+        interval: float = 24 * 3600.0,
+        max_discrepancies: int = 500,
+    ):
+        self._root = root
+        self.concurrency = concurrency
+        self.interval = interval
+        self.max_discrepancies = max_discrepancies
+
+    @property
+    def root(self) -> Path:
+        if self._root is None:
+            self._root = Path(
+                settings.lnbits_data_folder, "satmachineclient", "reconciliation"
+            )
+        return self._root
+
+    def path(self, client_id: str) -> Path:
+        return self.root / f"{client_id}.json"
+
+    async def load_report(self, client_id: str) -> Optional[dict]:
+        return await read_json(self.path(client_id))
+
+    async def run(self) -> None:
+        while True:
+            try:
+                unreconciled = await self.run_once()
+                if unreconciled:
+                    logger.warning(
+                        f"{unreconciled} DCA clients have payments that don't "
+                        "reconcile with their wallet"
+                    )
+            except Exception as e:
+                logger.warning(f"Payment reconciliation failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def run_once(self) -> int:
+        """Reconcile every active client; returns how many don't reconcile"""
+        async with single_runner(self.root / ".lock") as runner:
+            if not runner:
+                return 0
+            clients = await get_active_clients()
+            semaphore = asyncio.Semaphore(self.concurrency)
+            results = await asyncio.gather(
+                *(self._reconcile(semaphore, client) for client in clients)
+            )
+        unreconciled = sum(
+            1 for report in results if report and not report["reconciled"]
+        )
+        metrics.set("reconciliation_unreconciled_clients", unreconciled)
+        return unreconciled
+
+    async def _reconcile(
+        self, semaphore: asyncio.Semaphore, client: dict
+    ) -> Optional[dict]:
+        report = await self.load_report(client["id"])
+        if report and _age_seconds(report["generated_at"]) < self.interval * 0.9:
+            return report
+        async with semaphore:
+            try:
+                report = await self.build_report(client)
+            except Exception as e:
+                logger.warning(f"Could not reconcile {client['id']}: {e}")
+                return None
+        await write_text_atomic(self.path(client["id"]), _json_chunks(report))
+        return report
+
+    async def build_report(self, client: dict) -> dict:
+        totals = ReconciliationTotals()
+        discrepancies: List[dict] = []
+        async for entry in reconcile_client(client):
+            totals.add(entry)
+            if entry["status"] != "matched" or (
+                entry["amount_sats"] != entry["ledger_amount_sats"]
+            ):
+                if len(discrepancies) < self.max_discrepancies:
+                    discrepancies.append(entry)
+        return totals.dict(
+            client_id=client["id"],
+            wallet_id=client["wallet_id"],
+            generated_at=datetime.now().isoformat(),
+            window_seconds=RECONCILIATION_WINDOW.total_seconds(),
+            discrepancies=discrepancies,
+            truncated=totals.discrepancies > len(discrepancies),
+        )
+
+
+reconciliation_worker = ReconciliationWorker()
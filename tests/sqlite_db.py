@@ -0,0 +1,44 @@
+import sqlite3
+import sys
+from datetime import datetime
+
+from lnbits.db import SQLITE
+
+
+class RecordingSQLite:
+    """In-memory SQLite with lnbits' Database interface, logging statements"""
+
+    type = SQLITE
+
+    def __init__(self):
+        self.conn = sqlite3.connect(":memory:")
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("ATTACH DATABASE ':memory:' AS satoshimachine")
+        self.statements = []
+        self.executed = []
+
+    def _run(self, query, values, name):
+        caller = name or sys._getframe(2).f_code.co_name
+        self.statements.append((caller, " ".join(query.split())))
+        # datetimes are bound as epochs, like lnbits' Connection.rewrite_values
+        params = {
+            key: int(value.timestamp()) if isinstance(value, datetime) else value
+            for key, value in (values or {}).items()
+        }
+        self.executed.append((caller, query, params))
+        return self.conn.execute(query, params)
+
+    def explain(self, query, params):
+        """SQLite's query plan for a statement, one detail string per step"""
+        return [
+            row[3] for row in self.conn.execute(f"EXPLAIN QUERY PLAN {query}", params)
+        ]
+
+    async def fetchone(self, query, values=None, name=None):
+        return self._run(query, values, name).fetchone()
+
+    async def fetchall(self, query, values=None, name=None):
+        return self._run(query, values, name).fetchall()
+
+    async def execute(self, query, values=None, name=None):
+        return self._run(query, values, name)
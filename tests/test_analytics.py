@@ -0,0 +1,213 @@
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from ..analytics import (
+    SATS_PER_BTC,
+    PaymentIndex,
+    bucket_start,
+    downsample_analytics,
+    lttb,
+    to_datetime,
+)
+
+
+def _payment(moment, sats, fiat):
+    return {
+        "transaction_date": moment,
+        "amount_sats": sats,
+        "amount_fiat": fiat,
+        # fiat per BTC, as Lamassu reports it
+        "exchange_rate": SATS_PER_BTC / (sats / fiat),
+    }
+
+
+PAYMENTS = [
+    _payment(datetime(2025, 1, 1, 9), 1000, 10.0),
+    _payment(datetime(2025, 1, 1, 17), 2000, 20.0),
+    _payment(datetime(2025, 1, 8, 12), 3000, 30.0),
+    _payment(datetime(2025, 2, 3, 12), 4000, 40.0),
+]
+
+
+def test_to_datetime_normalizes_db_values():
+    moment = datetime(2025, 6, 9, 19, 12, 42)
+    timestamp = moment.timestamp()
+
+    assert to_datetime(moment) == moment
+    assert to_datetime(date(2025, 6, 9)) == datetime(2025, 6, 9)
+    assert to_datetime(int(timestamp)) == moment
+    assert to_datetime(int(timestamp * 1000)) == moment
+    assert to_datetime(str(int(timestamp))) == moment
+    assert to_datetime(moment.isoformat()) == moment
+    assert to_datetime(None) is None
+    assert to_datetime("not a date") is None
+
+
+def test_bucket_start():
+    moment = datetime(2025, 1, 8, 12)  # a Wednesday
+    assert bucket_start(moment, "day") == date(2025, 1, 8)
+    assert bucket_start(moment, "week") == date(2025, 1, 6)
+    assert bucket_start(moment, "month") == date(2025, 1, 1)
+
+
+def test_index_analytics_single_pass():
+    cost_basis, timeline, frequency = PaymentIndex.from_rows(PAYMENTS).analytics()
+
+    assert [point["cumulative_sats"] for point in cost_basis] == [
+        1000,
+        3000,
+        6000,
+        10000,
+    ]
+    assert cost_basis[-1]["average_cost_basis"] == 100.0
+    assert [(b["date"], b["sats"], b["transactions"]) for b in timeline] == [
+        ("2025-01-01", 3000, 2),
+        ("2025-01-08", 3000, 1),
+        ("2025-02-03", 4000, 1),
+    ]
+    assert frequency["total_transactions"] == 4
+    assert frequency["avg_sats_per_transaction"] == 2500
+    assert frequency["first_transaction"] == "2025-01-01T09:00:00"
+    assert frequency["last_transaction"] == "2025-02-03T12:00:00"
+
+
+def test_index_analytics_window_and_granularity():
+    cost_basis, timeline, frequency = PaymentIndex.from_rows(PAYMENTS).analytics(
+        start_date=datetime(2025, 1, 5), granularity="month"
+    )
+
+    # running totals restart at the window start
+    assert [point["cumulative_sats"] for point in cost_basis] == [3000, 7000]
+    assert [(b["date"], b["sats"]) for b in timeline] == [
+        ("2025-01-01", 3000),
+        ("2025-02-01", 4000),
+    ]
+    # frequency metrics always cover the whole history
+    assert frequency["total_transactions"] == 4
+
+
+def test_downsample_keeps_endpoints_and_totals():
+    payments = [
+        _payment(datetime(2024, 1, 1) + timedelta(hours=6 * i), 100 + i % 7, 1.0)
+        for i in range(5000)
+    ]
+    cost_basis, timeline, _ = PaymentIndex.from_rows(payments).analytics()
+
+    sampled, merged = downsample_analytics(cost_basis, timeline, 200)
+
+    assert len(sampled) == 200
+    assert len(merged) <= 200
+    assert sampled[0] == cost_basis[0]
+    assert sampled[-1] == cost_basis[-1]
+    assert sum(bucket["sats"] for bucket in merged) == cost_basis[-1]["cumulative_sats"]
+    assert sum(bucket["transactions"] for bucket in merged) == 5000
+
+
+def test_downsample_within_budget_is_noop():
+    cost_basis, timeline, _ = PaymentIndex.from_rows(PAYMENTS).analytics()
+    assert downsample_analytics(cost_basis, timeline, 100) == (cost_basis, timeline)
+    assert lttb([0, 1, 2], [0, 1, 2], 10) == [0, 1, 2]
+
+
+def test_payment_index_ranges():
+    index = PaymentIndex.from_rows(PAYMENTS)
+
+    assert index.range_totals() == (10000, 100.0, 4)
+    assert index.range_totals(start_date=datetime(2025, 1, 8)) == (7000, 70.0, 2)
+    assert index.range_totals(
+        start_date=datetime(2025, 1, 1, 12), end_date=datetime(2025, 1, 8, 12)
+    ) == (5000, 50.0, 2)
+
+    # out-of-order payments are rejected so the caller can rebuild
+    assert not index.extend([_payment(datetime(2024, 12, 31), 1, 1.0)])
+    assert len(index) == 4
+    assert index.extend([_payment(datetime(2025, 3, 1), 1, 1.0)])
+    assert len(index) == 5
+
+
+def test_payment_index_snapshot_is_detached():
+    index = PaymentIndex.from_rows(PAYMENTS, watermark=(4,))
+    snapshot = index.snapshot()
+    assert index.extend([_payment(datetime(2025, 3, 1), 1, 1.0)])
+
+    assert len(snapshot) == 4
+    assert snapshot.range_totals() == (10000, 100.0, 4)
+    assert list(snapshot.rates) == list(index.rates[:4])
+    assert snapshot.watermark == (4,)
+
+
+def test_performance_vs_market():
+    # the price falls: 100, then 200, then 400 sats per fiat unit
+    index = PaymentIndex.from_rows(
+        [
+            _payment(datetime(2025, 1, 2), 1000, 10.0),
+            _payment(datetime(2025, 2, 2), 2000, 10.0),
+            _payment(datetime(2025, 3, 2), 4000, 10.0),
+        ]
+    )
+    deposits = [(datetime(2025, 1, 1), 20.0), (datetime(2025, 2, 15), 20.0)]
+
+    performance = index.performance_vs_market(deposits)
+
+    assert performance["fiat_spent"] == 30.0
+    assert performance["dca"] == {"cost_basis": 7000 / 30, "sats": 7000}
+    # all 30 spent at the first deposit's rate: 100 sats per unit
+    assert performance["lump_sum"]["cost_basis"] == 100
+    assert performance["lump_sum"]["sats"] == 3000
+    assert round(performance["lump_sum"]["dca_advantage_pct"], 2) == 133.33
+    # half at 100 and half at 400 (the first payment after Feb 15th)
+    assert performance["buy_at_deposits"]["cost_basis"] == 250
+    assert performance["buy_at_deposits"]["deposits"] == 2
+    assert performance["latest_rate"] == 400
+
+    assert PaymentIndex().performance_vs_market(deposits) is None
+    assert index.performance_vs_market([]) is None
+
+
+def test_lamassu_exchange_rates_are_fiat_per_btc():
+    # Lamassu-Database-Analysis.md: 826091.28 GTQ per BTC, 5.5% commission
+    exchange_rate = 826091.28
+    amount_fiat = 500.0
+    amount_sats = int(amount_fiat / exchange_rate * SATS_PER_BTC * (1 - 0.055))
+    rows = [
+        {
+            "transaction_date": datetime(2025, 6, 9, 19, 12),
+            "amount_sats": amount_sats,
+            "amount_fiat": amount_fiat,
+            "exchange_rate": exchange_rate,
+        },
+        # no fiat amount recorded: the stored rate is converted
+        {
+            "transaction_date": datetime(2025, 6, 10, 9, 0),
+            "amount_sats": 0,
+            "amount_fiat": 0,
+            "exchange_rate": 339104.71,
+        },
+    ]
+    index = PaymentIndex.from_rows(rows)
+
+    # about 114 sats per GTQ, not 826091
+    assert index.rates[0] == amount_sats / amount_fiat
+    assert 110 < index.rates[0] < 115
+    assert round(index.rates[1], 2) == round(SATS_PER_BTC / 339104.71, 2)
+
+    performance = index.performance_vs_market([(datetime(2025, 6, 1), 500.0)])
+    assert performance["lump_sum"]["cost_basis"] == index.rates[0]
+    assert round(performance["lump_sum"]["dca_advantage_pct"], 6) == 0
+    assert performance["lump_sum"]["sats"] == amount_sats
+
+
+def test_numeric_columns_from_postgres():
+    index = PaymentIndex.from_rows(
+        [
+            {
+                "transaction_date": datetime(2025, 1, 1),
+                "amount_sats": Decimal("1000"),
+                "amount_fiat": Decimal("10.50"),
+                "exchange_rate": Decimal("826091.28"),
+            }
+        ]
+    )
+    assert index.extend([_payment(datetime(2025, 1, 2), 2000, 20.0)])
+    assert index.cum_fiat[-1] == 30.5
+    assert index.cum_sats[-1] == 3000
@@ -0,0 +1,284 @@
+import asyncio
+from typing import List
+
+import pytest
+
+from ..cache import (
+    ExchangeRateCache,
+    MemoryResultCache,
+    ResultCache,
+    SingleFlight,
+    SQLiteResultCache,
+    TTLCache,
+)
+
+
+@pytest.mark.asyncio
+async def test_rate_cache_single_flight():
+    calls = []
+
+    async def fetcher(currency):
+        calls.append(currency)
+        await asyncio.sleep(0.01)
+        return 500_000.0
+
+    cache = ExchangeRateCache(fetcher, ttl=60)
+    rates = await asyncio.gather(*[cache.get("GTQ") for _ in range(10)])
+
+    assert calls == ["GTQ"]
+    assert all(rate and rate.value == 500_000.0 for rate in rates)
+    assert await cache.get("GTQ") == rates[0]
+    assert calls == ["GTQ"]
+
+
+@pytest.mark.asyncio
+async def test_rate_cache_stale_fallback():
+    prices = [500_000.0]
+
+    async def fetcher(currency):
+        if not prices:
+            raise RuntimeError("provider down")
+        return prices.pop()
+
+    cache = ExchangeRateCache(fetcher, ttl=0)
+    fresh = await cache.get("GTQ")
+    assert fresh and not fresh.stale
+
+    stale = await cache.get("GTQ")
+    assert stale and stale.stale
+    assert stale.value == fresh.value
+    assert stale.as_of == fresh.as_of
+
+
+@pytest.mark.asyncio
+async def test_rate_cache_slow_provider_does_not_block():
+    async def fetcher(currency):
+        await asyncio.sleep(10)
+        return 500_000.0
+
+    cache = ExchangeRateCache(fetcher, wait_timeout=0.01)
+    assert await cache.get("GTQ") is None
+
+
+@pytest.mark.asyncio
+async def test_rate_cache_serves_stale_values_without_waiting():
+    prices = [500_000.0]
+
+    async def fetcher(currency):
+        if not prices:
+            await asyncio.sleep(10)
+        return prices.pop()
+
+    cache = ExchangeRateCache(fetcher, ttl=0, wait_timeout=5)
+    fresh = await cache.get("GTQ")
+    assert fresh
+
+    # the provider now hangs: the expired value comes back at once
+    stale = await asyncio.wait_for(cache.get("GTQ"), 0.1)
+    assert stale and stale.stale and stale.value == fresh.value
+    assert "GTQ" in cache._inflight
+    cache._inflight["GTQ"].cancel()
+
+
+@pytest.mark.asyncio
+async def test_rate_cache_backs_off_after_a_failure():
+    calls = []
+
+    async def fetcher(currency):
+        calls.append(currency)
+        raise RuntimeError("provider down")
+
+    cache = ExchangeRateCache(fetcher, retry_after=60)
+    assert await cache.get("GTQ") is None
+    assert await cache.get("GTQ") is None
+    assert calls == ["GTQ"]
+
+    cache.retry_after = 0
+    assert await cache.get("GTQ") is None
+    assert calls == ["GTQ", "GTQ"]
+
+
+def test_ttl_cache_lru_and_counters():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)  # evicts "b", the least recently used
+
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+    assert cache.stats() == {"hits": 2, "misses": 1, "size": 2}
+
+    cache.invalidate_where(lambda value: value == 3)
+    assert cache.get("c") is None
+
+
+def test_ttl_cache_expiry():
+    cache = TTLCache(ttl=0)
+    cache.set("a", 1)
+    assert cache.get("a") is None
+
+
+@pytest.mark.asyncio
+async def test_single_flight_shares_and_memoizes():
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return len(calls)
+
+    flights = SingleFlight(ttl=60)
+    results = await asyncio.gather(
+        *[flights.do(("c1", "a"), compute) for _ in range(5)]
+    )
+    assert results == [1] * 5
+    assert await flights.do(("c1", "a"), compute) == 1
+    assert flights.stats()["coalesced"] == 4
+
+    # other keys and owners compute separately
+    assert await flights.do(("c2", "a"), compute) == 2
+
+    flights.invalidate("c1")
+    assert await flights.do(("c1", "a"), compute) == 3
+    assert await flights.do(("c2", "a"), compute) == 2
+
+
+@pytest.mark.asyncio
+async def test_single_flight_errors_are_not_memoized():
+    attempts = []
+
+    async def compute():
+        attempts.append(1)
+        await asyncio.sleep(0)
+        if len(attempts) == 1:
+            raise RuntimeError("database unavailable")
+        return "ok"
+
+    flights = SingleFlight(ttl=60)
+    results = await asyncio.gather(
+        flights.do(("c1",), compute),
+        flights.do(("c1",), compute),
+        return_exceptions=True,
+    )
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert await flights.do(("c1",), compute) == "ok"
+
+
+@pytest.mark.asyncio
+async def test_single_flight_invalidation_detaches_running_call():
+    release = asyncio.Event()
+
+    async def stale():
+        await release.wait()
+        return "stale"
+
+    async def fresh():
+        return "fresh"
+
+    flights = SingleFlight(ttl=60)
+    running = asyncio.create_task(flights.do(("c1",), stale))
+    await asyncio.sleep(0)
+    flights.invalidate("c1")
+
+    assert await flights.do(("c1",), fresh) == "fresh"
+    release.set()
+    assert await running == "stale"
+    assert await flights.do(("c1",), stale) == "fresh"
+
+
+@pytest.mark.asyncio
+async def test_memory_result_cache_evicts_by_size():
+    cache = MemoryResultCache(max_bytes=30)
+    await cache.set("a", "c1", "x" * 10, ttl=60)  # 12 bytes as JSON
+    await cache.set("b", "c2", "y" * 10, ttl=60)
+    assert await cache.get("a") == "x" * 10
+    await cache.set("c", "c1", "z" * 10, ttl=60)  # evicts "b"
+
+    assert await cache.get("b") is None
+    assert cache.stats() == {"hits": 1, "misses": 1, "size": 2, "bytes": 24}
+
+    await cache.invalidate("c1")
+    assert cache.stats()["size"] == 0
+    await cache.set("big", "c1", "x" * 100, ttl=60)
+    assert await cache.get("big") is None
+
+    await cache.set("gone", "c1", 1, ttl=0)
+    assert await cache.get("gone") is None
+
+
+@pytest.mark.asyncio
+async def test_sqlite_result_cache_is_shared_between_workers(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    worker_a = SQLiteResultCache(path, max_bytes=60)
+    # recounts on every operation, so its stats include worker_a's writes
+    worker_b = SQLiteResultCache(path, max_bytes=60, recount_interval=0)
+
+    await worker_a.set("c1:summary", "c1", {"total_sats": 1000}, ttl=60)
+    assert await worker_b.get("c1:summary") == {"total_sats": 1000}
+    assert await worker_b.get("c2:summary") is None
+    assert worker_b.stats() == {"hits": 1, "misses": 1, "size": 1, "bytes": 19}
+
+    await worker_b.set("c2:summary", "c2", {"total_sats": 2000}, ttl=60)
+    await worker_b.set("c2:analytics", "c2", {"points": [1, 2, 3]}, ttl=60)
+    # 19 + 19 + 21 bytes fit; one more entry evicts the least recently used
+    await worker_b.set("c3:summary", "c3", {"total_sats": 3000}, ttl=60)
+    assert await worker_a.get("c1:summary") is None
+    assert await worker_a.get("c3:summary") == {"total_sats": 3000}
+
+    await worker_a.invalidate("c2")
+    assert await worker_b.get("c2:analytics") is None
+
+    await worker_a.set("c1:expired", "c1", 1, ttl=0)
+    assert await worker_b.get("c1:expired") is None
+
+    # survives a restart
+    assert await SQLiteResultCache(path).get("c3:summary") == {"total_sats": 3000}
+
+
+@pytest.mark.asyncio
+async def test_sqlite_result_cache_keeps_running_totals(tmp_path):
+    cache = SQLiteResultCache(str(tmp_path / "cache.sqlite3"), max_bytes=1000)
+    statements: List[str] = []
+    cache._conn.set_trace_callback(statements.append)
+
+    await cache.set("c1:summary", "c1", {"total_sats": 1000}, ttl=60)
+    await cache.set("c1:summary", "c1", {"total_sats": 20000}, ttl=60)
+    await cache.set("c2:summary", "c2", {"total_sats": 3000}, ttl=60)
+    assert cache.stats() == {"hits": 0, "misses": 0, "size": 2, "bytes": 39}
+    await cache.invalidate("c1")
+    assert cache.stats()["size"] == 1
+    assert cache.stats()["bytes"] == 19
+    # no full count after each write
+    assert not [sql for sql in statements if "COUNT(*) " in sql and "owner" not in sql]
+
+    # other workers' writes show up once the totals are recounted
+    other = SQLiteResultCache(cache.path)
+    await other.set("c3:summary", "c3", {"total_sats": 4000}, ttl=60)
+    assert cache.stats()["size"] == 1
+    cache.recount_interval = 0
+    await cache.get("c3:summary")
+    assert cache.stats()["size"] == 2
+
+
+def test_result_cache_is_abstract():
+    with pytest.raises(TypeError):
+        ResultCache()  # type: ignore[abstract]
+
+
+@pytest.mark.asyncio
+async def test_rate_cache_reads_rates_other_workers_fetched(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    calls = []
+
+    async def fetcher(currency):
+        calls.append(currency)
+        return 500_000.0
+
+    worker_a = ExchangeRateCache(fetcher, shared=SQLiteResultCache(path))
+    worker_b = ExchangeRateCache(fetcher, shared=SQLiteResultCache(path))
+    rate_a = await worker_a.get("GTQ")
+    rate_b = await worker_b.get("GTQ")
+
+    assert calls == ["GTQ"]
+    assert rate_b == rate_a
@@ -0,0 +1,114 @@
+import calendar
+import json
+from datetime import datetime
+from types import SimpleNamespace
+
+from .. import columnar
+from ..analytics import PaymentIndex
+from ..columnar import (
+    JSON_MEDIA_TYPE,
+    MSGPACK_MEDIA_TYPE,
+    columnar_analytics,
+    columnar_transactions,
+    encode,
+    negotiate_media_type,
+)
+from ..models import ClientAnalytics, ClientTransaction
+
+
+def _analytics():
+    rows = [
+        {
+            "transaction_date": datetime(2025, 1, day, 10, 30),
+            "amount_sats": 1000 * day,
+            "amount_fiat": 10.0,
+            "exchange_rate": 100.0 * day,
+        }
+        for day in (1, 1, 2)
+    ]
+    history, timeline, frequency = PaymentIndex.from_rows(rows).analytics()
+    return ClientAnalytics(
+        user_id="user1",
+        cost_basis_history=history,
+        accumulation_timeline=timeline,
+        transaction_frequency=frequency,
+    )
+
+
+def test_columnar_analytics():
+    analytics = _analytics()
+    payload = columnar_analytics(analytics)
+
+    history = payload["cost_basis_history"]
+    assert history["cumulative_sats"] == [1000, 2000, 4000]
+    assert history["date"][0] == int(datetime(2025, 1, 1, 10, 30).timestamp())
+    timeline = payload["accumulation_timeline"]
+    assert timeline == {
+        "date": [
+            calendar.timegm((2025, 1, 1, 0, 0, 0)),
+            calendar.timegm((2025, 1, 2, 0, 0, 0)),
+        ],
+        "sats": [2000, 2000],
+        "fiat": [20.0, 10.0],
+        "transactions": [2, 1],
+    }
+    assert payload["transaction_frequency"] == analytics.transaction_frequency
+
+    # smaller than the row format
+    assert len(encode(payload, JSON_MEDIA_TYPE)) < len(analytics.json())
+
+
+def test_empty_series_keep_their_columns():
+    payload = columnar_analytics(
+        ClientAnalytics(
+            user_id="user1",
+            cost_basis_history=[],
+            accumulation_timeline=[],
+            transaction_frequency={},
+        )
+    )
+    assert payload["cost_basis_history"]["date"] == []
+    assert payload["accumulation_timeline"]["sats"] == []
+
+
+def test_columnar_transactions():
+    created_at = datetime(2025, 1, 1, 12, 0)
+    transactions = [
+        ClientTransaction(
+            id=f"tx{i}",
+            amount_sats=1000 + i,
+            amount_fiat=10.0,
+            exchange_rate=100.0,
+            transaction_type="flow",
+            status="confirmed",
+            created_at=created_at,
+            transaction_time=created_at if i else None,
+        )
+        for i in range(2)
+    ]
+    payload = json.loads(
+        encode(columnar_transactions(transactions, "abc"), JSON_MEDIA_TYPE)
+    )
+
+    assert payload["next_cursor"] == "abc"
+    columns = payload["transactions"]
+    assert set(columns) == set(ClientTransaction.__fields__)
+    assert columns["id"] == ["tx0", "tx1"]
+    assert columns["created_at"] == [int(created_at.timestamp())] * 2
+    assert columns["transaction_time"] == [None, int(created_at.timestamp())]
+
+
+def test_msgpack_is_negotiated_when_available(monkeypatch):
+    monkeypatch.setattr(columnar, "msgpack", None)
+    assert negotiate_media_type(MSGPACK_MEDIA_TYPE) == JSON_MEDIA_TYPE
+
+    packed = []
+    fake_msgpack = SimpleNamespace(
+        packb=lambda payload, use_bin_type: packed.append(payload) or b"\x80"
+    )
+    monkeypatch.setattr(columnar, "msgpack", fake_msgpack)
+    assert negotiate_media_type("application/json") == JSON_MEDIA_TYPE
+    media_type = negotiate_media_type(f"{MSGPACK_MEDIA_TYPE}, */*")
+    assert media_type == MSGPACK_MEDIA_TYPE
+    assert encode({"a": [1]}, media_type) == b"\x80"
+    assert packed == [{"a": [1]}]
@@ -0,0 +1,309 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from .. import crud
+from ..models import UpdateClientSettings
+
+
+@pytest.fixture(autouse=True)
+def _clear_client_cache():
+    crud.client_cache.clear()
+    crud.dashboard_flights.clear()
+    crud.result_cache.clear()
+
+
+class RecordingDatabase:
+    """Stand-in for lnbits' Database that records every statement issued"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+
+    async def fetchone(self, query, values=None, name=None):
+        self.queries.append(query)
+        return self.rows.pop(0) if self.rows else None
+
+    async def fetchall(self, query, values=None, name=None):
+        self.queries.append(query)
+        return self.rows.pop(0) if self.rows else []
+
+    async def execute(self, query, values=None, name=None):
+        self.queries.append(query)
+
+
+CLIENT_ROW = {
+    "id": "client1",
+    "user_id": "user1",
+    "wallet_id": "wallet1",
+    "dca_mode": "flow",
+    "status": "active",
+}
+
+TOTALS_ROW = {
+    "total_sats": 150_000,
+    "dca_spent": 300.0,
+    "tx_count": 3,
+    "last_tx_date": None,
+    "confirmed_deposits": 1000.0,
+    "pending_deposits": 250.0,
+}
+
+
+@pytest.mark.asyncio
+async def test_dashboard_summary_query_budget(monkeypatch):
+    fake_db = RecordingDatabase([CLIENT_ROW, TOTALS_ROW])
+    monkeypatch.setattr(crud, "db", fake_db)
+
+    async def fake_rate(amount, currency):
+        return amount / 1000
+
+    monkeypatch.setattr(crud, "satoshis_amount_as_fiat", fake_rate)
+    crud.rate_cache.invalidate()
+
+    summary = await crud.get_client_dashboard_summary("user1")
+
+    # client lookup + one aggregation statement
+    assert len(fake_db.queries) <= 2
+    assert summary
+    assert summary.total_sats_accumulated == 150_000
+    assert summary.total_fiat_invested == 1000.0
+    assert summary.pending_fiat_deposits == 250.0
+    assert summary.current_fiat_balance == 700.0
+    assert summary.average_cost_basis == 500.0
+    assert summary.total_transactions == 3
+    assert summary.current_sats_fiat_value == 150.0
+    assert summary.exchange_rate_as_of is not None
+
+
+@pytest.mark.asyncio
+async def test_summary_without_any_rate_is_unavailable(monkeypatch):
+    fake_db = RecordingDatabase([CLIENT_ROW, TOTALS_ROW])
+    monkeypatch.setattr(crud, "db", fake_db)
+    crud._last_watermarks.clear()
+
+    async def slow_rate(amount, currency):
+        await asyncio.sleep(10)
+        return amount / 1000
+
+    monkeypatch.setattr(crud, "satoshis_amount_as_fiat", slow_rate)
+    monkeypatch.setattr(crud.rate_cache, "wait_timeout", 0.01)
+    crud.rate_cache.invalidate()
+
+    summary = await crud.get_client_dashboard_summary("user1")
+
+    assert summary
+    # a cold cache is an unknown value, not a worthless stack
+    assert summary.current_sats_fiat_value is None
+    assert summary.exchange_rate_stale
+    assert summary.exchange_rate_as_of is None
+    for task in list(crud.rate_cache._inflight.values()):
+        task.cancel()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_summaries_share_one_query(monkeypatch):
+    fake_db = RecordingDatabase([CLIENT_ROW, TOTALS_ROW])
+    monkeypatch.setattr(crud, "db", fake_db)
+    crud._last_watermarks.clear()
+
+    async def fake_rate(amount, currency):
+        return amount / 1000
+
+    monkeypatch.setattr(crud, "satoshis_amount_as_fiat", fake_rate)
+    crud.rate_cache.invalidate()
+
+    summaries = await asyncio.gather(
+        *[crud.get_client_dashboard_summary("user1") for _ in range(5)]
+    )
+    assert all(summary.total_sats_accumulated == 150_000 for summary in summaries)
+    # client lookup + one aggregation statement
+    assert len(fake_db.queries) == 2
+
+    # memoized until the client's watermark moves
+    fake_db.rows = [{"payment_count": 3}]
+    await crud.get_client_watermark("client1")
+    await crud.get_client_dashboard_summary("user1")
+    assert len(fake_db.queries) == 3
+
+    fake_db.rows = [{"payment_count": 4}, {**TOTALS_ROW, "total_sats": 200_000}]
+    await crud.get_client_watermark("client1")
+    summary = await crud.get_client_dashboard_summary("user1")
+    assert summary.total_sats_accumulated == 200_000
+    assert len(fake_db.queries) == 5
+
+
+@pytest.mark.asyncio
+async def test_dashboard_summary_unknown_client(monkeypatch):
+    fake_db = RecordingDatabase([])
+    monkeypatch.setattr(crud, "db", fake_db)
+
+    assert await crud.get_client_dashboard_summary("nobody") is None
+    assert len(fake_db.queries) == 1
+
+
+def test_transaction_cursor_round_trip():
+    created_at = datetime(2025, 6, 9, 19, 12, 42, 40933)
+    cursor = crud.encode_transaction_cursor(created_at, "tx1")
+    assert crud.decode_transaction_cursor(cursor) == (created_at, "tx1")
+
+    cursor = crud.encode_transaction_cursor(1749496362, "tx2")
+    assert crud.decode_transaction_cursor(cursor) == (1749496362, "tx2")
+
+    with pytest.raises(ValueError):
+        crud.decode_transaction_cursor("not-a-cursor")
+
+
+def _payment_rows(count):
+    return [
+        {
+            "id": f"tx{i}",
+            "amount_sats": 1000,
+            "amount_fiat": 10.0,
+            "exchange_rate": 100.0,
+            "transaction_type": "flow",
+            "status": "confirmed",
+            "created_at": datetime(2025, 1, 1) - timedelta(minutes=i),
+            "transaction_time": None,
+            "lamassu_transaction_id": None,
+        }
+        for i in range(count)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_transactions_page_uses_seek_predicate(monkeypatch):
+    rows = _payment_rows(3)
+    fake_db = RecordingDatabase([CLIENT_ROW, rows])
+    monkeypatch.setattr(crud, "db", fake_db)
+
+    page = await crud.get_client_transactions_page("user1", limit=2)
+
+    assert [tx.id for tx in page.transactions] == ["tx0", "tx1"]
+    assert page.next_cursor
+    assert "OFFSET" not in fake_db.queries[-1]
+
+    # the client row is cached now, only the page query runs
+    fake_db.rows = [rows[2:]]
+    page = await crud.get_client_transactions_page(
+        "user1", limit=2, cursor=page.next_cursor
+    )
+
+    assert [tx.id for tx in page.transactions] == ["tx2"]
+    assert page.next_cursor is None
+    assert "cursor_created_at" in fake_db.queries[-1]
+
+
+@pytest.mark.asyncio
+async def test_stream_transactions_in_chunks(monkeypatch):
+    rows = _payment_rows(5)
+    fake_db = RecordingDatabase([CLIENT_ROW, rows[:2], rows[2:4], rows[4:]])
+    monkeypatch.setattr(crud, "db", fake_db)
+
+    chunks = [
+        [tx.id for tx in chunk]
+        async for chunk in crud.stream_client_transactions("user1", chunk_size=2)
+    ]
+
+    assert chunks == [["tx0", "tx1"], ["tx2", "tx3"], ["tx4"]]
+    # one client lookup, then one keyset query per chunk
+    assert len(fake_db.queries) == 4
+    assert not any("OFFSET" in query for query in fake_db.queries)
+
+
+def _series_row(day, sats):
+    return {
+        "transaction_date": datetime(2025, 1, day),
+        "amount_sats": sats,
+        "amount_fiat": sats / 100,
+        "exchange_rate": 100.0,
+    }
+
+
+@pytest.mark.asyncio
+async def test_payment_index_extends_from_watermark(monkeypatch):
+    crud._payment_indexes.clear()
+    fake_db = RecordingDatabase(
+        [
+            {"payment_count": 2, "last_created_at": 2},
+            [_series_row(1, 1000), _series_row(2, 2000)],
+        ]
+    )
+    monkeypatch.setattr(crud, "db", fake_db)
+
+    index = await crud.get_payment_index("client1")
+    assert len(index) == 2
+    assert len(fake_db.queries) == 2
+
+    # unchanged watermark: no payment rows are read
+    fake_db.rows = [{"payment_count": 2, "last_created_at": 2}]
+    assert await crud.get_payment_index("client1") is index
+    assert len(fake_db.queries) == 3
+
+    # a new payment is appended from the watermark instead of a rebuild
+    fake_db.rows = [
+        {"payment_count": 3, "last_created_at": 3},
+        [_series_row(3, 4000)],
+    ]
+    assert await crud.get_payment_index("client1") is index
+    assert "last_created_at" in fake_db.queries[-1]
+    assert index.range_totals() == (7000, 70.0, 3)
+    assert index.range_totals(start_date=datetime(2025, 1, 2)) == (6000, 60.0, 2)
+
+
+@pytest.mark.asyncio
+async def test_payment_indexes_are_bounded(monkeypatch):
+    monkeypatch.setattr(crud, "_payment_indexes", crud.TTLCache(maxsize=2, ttl=60))
+    fake_db = RecordingDatabase([])
+    monkeypatch.setattr(crud, "db", fake_db)
+
+    for client_id in ("client1", "client2", "client3"):
+        fake_db.rows = [
+            {"payment_count": 1, "last_created_at": 1},
+            [_series_row(1, 1000)],
+        ]
+        await crud.get_payment_index(client_id)
+
+    # the least recently used index went, and its lock with it
+    assert crud._payment_indexes.get("client1") is None
+    assert crud._payment_indexes.stats()["size"] == 2
+
+
+@pytest.mark.asyncio
+async def test_client_lookup_is_cached_and_invalidated(monkeypatch):
+    fake_db = RecordingDatabase([CLIENT_ROW])
+    monkeypatch.setattr(crud, "db", fake_db)
+
+    assert (await crud.get_client_by_user_id("user1"))["id"] == "client1"
+    assert (await crud.get_client_by_user_id("user1"))["id"] == "client1"
+    assert len(fake_db.queries) == 1
+
+    await crud.update_client_dca_settings(
+        "client1", UpdateClientSettings(dca_mode="fixed")
+    )
+    fake_db.rows = [{**CLIENT_ROW, "dca_mode": "fixed"}]
+    assert (await crud.get_client_by_user_id("user1"))["dca_mode"] == "fixed"
+    assert len(fake_db.queries) == 3
+
+
+@pytest.mark.asyncio
+async def test_unregistered_users_are_not_cached(monkeypatch):
+    fake_db = RecordingDatabase([])
+    monkeypatch.setattr(crud, "db", fake_db)
+
+    assert await crud.get_client_by_user_id("nobody") is None
+    fake_db.rows = [CLIENT_ROW]
+    assert await crud.get_client_by_user_id("nobody") is not None
+
+
+@pytest.mark.asyncio
+async def test_client_lookup_errors_are_not_unregistered_users(monkeypatch):
+    class FailingDatabase(RecordingDatabase):
+        async def fetchone(self, query, values=None, name=None):
+            raise ConnectionError("database is down")
+
+    monkeypatch.setattr(crud, "db", FailingDatabase([]))
+
+    with pytest.raises(ConnectionError):
+        await crud.get_client_by_user_id("user1")
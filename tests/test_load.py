@@ -0,0 +1,43 @@
+import httpx
+import pytest
+
+from .. import crud
+from ..benchmarks.app import create_bench_app, reset_caches, use_fixed_exchange_rate
+from ..benchmarks.dataset import create_schema, seed_dataset
+from ..benchmarks.load import compare, run_load
+from .sqlite_db import RecordingSQLite
+
+
+@pytest.mark.asyncio
+async def test_mixed_traffic_report(monkeypatch):
+    fake_db = RecordingSQLite()
+    monkeypatch.setattr(crud, "db", fake_db)
+    await create_schema(fake_db)
+    clients = await seed_dataset(fake_db, 2, 120)
+    use_fixed_exchange_rate()
+    reset_caches()
+
+    transport = httpx.ASGITransport(app=create_bench_app())
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+        recorder = await run_load(
+            http, clients, users=4, duration=60, think_ms=0, actions=8, sessions=1
+        )
+    report = recorder.report()
+
+    assert report["errors"] == 0, report["error_samples"]
+    endpoints = report["endpoints"]
+    assert {"GET /dashboard/bootstrap", "GET /dashboard/projection"} <= set(endpoints)
+    assert endpoints["GET /dashboard/bootstrap"]["requests"] == 4
+    assert report["requests"] == sum(stats["requests"] for stats in endpoints.values())
+    for stats in endpoints.values():
+        assert stats["p50_ms"] <= stats["p95_ms"] <= stats["p99_ms"] <= stats["max_ms"]
+
+    slower = {
+        **report,
+        "endpoints": {
+            endpoint: {**stats, "p95_ms": stats["p95_ms"] * 2 + 10}
+            for endpoint, stats in endpoints.items()
+        },
+    }
+    assert compare(report, report, 0.25, 5.0) == []
+    assert len(compare(report, slower, 0.25, 5.0)) == len(endpoints)
@@ -0,0 +1,79 @@
+from types import SimpleNamespace
+
+import pytest
+
+from ..metrics import Histogram, InstrumentedDatabase, MetricsRegistry
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram(buckets=(0.01, 0.1))
+    for value in (0.005, 0.05, 0.05, 3.0):
+        histogram.observe(value)
+
+    assert histogram.cumulative() == [("0.01", 1), ("0.1", 3), ("+Inf", 4)]
+    assert histogram.count == 4
+    assert histogram.sum == pytest.approx(3.105)
+
+
+def test_render_prometheus_text():
+    registry = MetricsRegistry("ext")
+    registry.counter("errors_total", "Errors")
+    registry.histogram("latency_seconds", "Latency")
+    registry.inc("errors_total", operation='say "hi"')
+    registry.observe("latency_seconds", 0.002, route="/a")
+
+    text = registry.render()
+
+    assert "# TYPE ext_errors_total counter" in text
+    assert 'ext_errors_total{operation="say \\"hi\\""} 1' in text
+    assert 'ext_latency_seconds_bucket{route="/a",le="0.0025"} 1' in text
+    assert 'ext_latency_seconds_bucket{route="/a",le="+Inf"} 1' in text
+    assert 'ext_latency_seconds_count{route="/a"} 1' in text
+    assert text.endswith("\n")
+
+
+def test_render_cache_hit_ratio():
+    registry = MetricsRegistry("ext")
+    cache = SimpleNamespace(stats=lambda: {"hits": 3, "misses": 1, "size": 2})
+    registry.register_cache("results", cache)
+
+    text = registry.render()
+
+    assert 'ext_cache_hits_total{cache="results"} 3' in text
+    assert 'ext_cache_hit_ratio{cache="results"} 0.75' in text
+    # only reported by caches that track it
+    assert 'ext_cache_bytes{cache="results"}' not in text
+
+
+class FakeDatabase:
+    type = "SQLITE"
+
+    async def fetchall(self, query, values=None):
+        return [{"id": 1}, {"id": 2}]
+
+    async def fetchone(self, query, values=None):
+        raise RuntimeError("connection lost")
+
+
+@pytest.mark.asyncio
+async def test_instrumented_database_records_queries():
+    registry = MetricsRegistry("ext")
+    registry.histogram("db_query_duration_seconds", "Latency")
+    registry.counter("db_query_rows_total", "Rows")
+    registry.counter("db_query_errors_total", "Errors")
+    db = InstrumentedDatabase(FakeDatabase(), registry)
+
+    async def load_payments():
+        return await db.fetchall("SELECT 1")
+
+    assert len(await load_payments()) == 2
+    assert registry.get("db_query_rows_total", query="load_payments") == 2
+    assert registry.get("db_query_duration_seconds", query="load_payments").count == 1
+
+    with pytest.raises(RuntimeError):
+        await db.fetchone("SELECT 1", name="lookup")
+    assert registry.get("db_query_errors_total", query="lookup") == 1
+    assert registry.get("db_query_duration_seconds", query="lookup").count == 1
+
+    # anything else goes to the wrapped database
+    assert db.type == "SQLITE"
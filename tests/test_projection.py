@@ -0,0 +1,85 @@
+import time
+from datetime import datetime, timedelta
+
+from ..analytics import PaymentIndex
+from ..projection import MILESTONES, fiat_schedule, project, rate_multipliers
+
+NOW = datetime(2025, 6, 1, 12, 0)
+
+
+def _history(days=400, fiat=50.0, start_rate=200.0, drift=1.002):
+    """One payment a day at a steadily rising number of sats per fiat unit"""
+    rows = []
+    rate = start_rate
+    for day in range(days):
+        rows.append(
+            {
+                "transaction_date": NOW - timedelta(days=days - day),
+                "amount_sats": int(fiat * rate),
+                "amount_fiat": fiat,
+                # fiat per BTC, as Lamassu reports it
+                "exchange_rate": 100_000_000 / rate,
+            }
+        )
+        rate *= drift
+    return PaymentIndex.from_rows(rows)
+
+
+def test_rate_multipliers_follow_the_history():
+    index = _history(days=100, drift=1.01)
+    multipliers = rate_multipliers(index, 30)
+    assert len(multipliers) == 100 - 1 - 30 + 1
+    assert all(abs(m - 1.01**30) < 1e-3 for m in multipliers)
+    assert rate_multipliers(_history(days=10), 30) == []
+
+
+def test_fiat_schedule_is_limited_by_the_balance():
+    assert fiat_schedule(100.0, 60.0, 0.0, 3) == [60.0, 40.0, 0.0]
+    assert fiat_schedule(0.0, 60.0, 30.0, 3) == [30.0, 30.0, 30.0]
+
+
+def test_projection_bands_and_milestones():
+    index = _history()
+    deposits = [(NOW - timedelta(days=400), 50.0 * 400 + 10_000.0)]
+    result = project(index, deposits, None, years=2, paths=2000, seed="c1", now=NOW)
+
+    steps = len(result["dates"])
+    assert steps == 24
+    bands = [result["percentiles"][f"p{p}"] for p in (10, 25, 50, 75, 90)]
+    for step in range(steps):
+        column = [band[step] for band in bands]
+        assert column == sorted(column)
+    median = result["percentiles"]["p50"]
+    assert median == sorted(median)
+    assert median[0] > index.cum_sats[-1]
+
+    milestones = result["milestones"]
+    assert [m["sats"] for m in milestones] == [
+        m for m in MILESTONES if m > index.cum_sats[-1]
+    ][:4]
+    for milestone in milestones:
+        dates = [milestone[key] for key in ("p10", "p50", "p90") if milestone[key]]
+        # the optimistic date comes first
+        assert dates == sorted(dates)
+
+    # the same seed gives the same paths
+    again = project(index, deposits, None, years=2, paths=2000, seed="c1", now=NOW)
+    assert again == result
+
+
+def test_projection_without_history_holds_the_rate():
+    index = PaymentIndex.from_rows([])
+    deposits = [(NOW - timedelta(days=10), 300.0)]
+    result = project(index, deposits, 1000.0, years=1, paths=100, now=NOW)
+    # no spending pace yet, so nothing is projected to be bought
+    assert set(result["percentiles"]["p50"]) == {0.0}
+    assert result["assumptions"]["fiat_balance"] == 300.0
+    assert all(m["p50"] is None for m in result["milestones"])
+
+
+def test_ten_thousand_paths_are_fast_enough():
+    index = _history(days=1000)
+    deposits = [(NOW - timedelta(days=1000), 100_000.0)]
+    started = time.perf_counter()
+    project(index, deposits, None, years=3, paths=10_000, seed="c1", now=NOW)
+    assert time.perf_counter() - started < 5.0
@@ -0,0 +1,249 @@
+import re
+from datetime import datetime
+
+import httpx
+import pytest
+from lnbits.settings import settings
+
+from .. import crud, views_api
+from ..benchmarks.app import (
+    BENCH_USER_HEADER,
+    create_bench_app,
+    reset_caches,
+    use_fixed_exchange_rate,
+)
+from ..benchmarks.dataset import create_schema, seed_dataset
+from .sqlite_db import RecordingSQLite
+
+API = "/satmachineclient/api/v1"
+
+# Most statements an endpoint may issue on cold caches, for a client with
+# PAYMENTS_PER_CLIENT payments. Raise a budget only together with a reason.
+QUERY_BUDGETS = {
+    # client lookup
+    ("GET", "/registration-status"): 1,
+    # client lookup + insert
+    ("POST", "/register"): 2,
+    # client lookup + watermark (ETag) + aggregates
+    ("GET", "/dashboard/summary"): 3,
+    # client lookup + watermark (ETag) + page
+    ("GET", "/dashboard/transactions?limit=20"): 3,
+    ("GET", "/dashboard/transactions?limit=20&cursor="): 3,
+    ("GET", "/dashboard/transactions?limit=20&cursor=&format=columnar"): 3,
+    # client lookup + watermark (ETag) + index watermark + index scan + deposits
+    ("GET", "/dashboard/analytics?time_range=all"): 5,
+    ("GET", "/dashboard/analytics?time_range=30d&granularity=week&max_points=10"): 5,
+    (
+        "GET",
+        "/dashboard/analytics?start_date=2025-01-01T00:00:00&end_date=2025-03-31T23:59:59",
+    ): 5,
+    ("GET", "/dashboard/analytics?time_range=all&format=columnar"): 5,
+    # client lookup + watermark (ETag) + index watermark + index scan + deposits
+    ("GET", "/dashboard/projection?paths=1000"): 5,
+    # client lookup + watermark + aggregates + page + analytics (3, as above)
+    ("GET", "/dashboard/bootstrap"): 7,
+    # client lookup + one keyset query per 500 rows
+    ("GET", "/dashboard/export/transactions?format=csv"): 2,
+    ("GET", "/dashboard/export/transactions?format=json&compress=true"): 2,
+    ("GET", "/dashboard/export/transactions?format=csv&period=2025-01"): 2,
+    # client lookup; prebuilt statements are read from disk
+    ("GET", "/dashboard/statements"): 1,
+    # client lookup + index watermark + index scan when not prebuilt
+    ("GET", "/dashboard/statements/2025-01"): 3,
+    # client lookup + update
+    ("PUT", "/dashboard/settings"): 2,
+    # signed, nothing stored
+    ("POST", "/dashboard/stream/token"): 0,
+    ("GET", "/metrics"): 0,
+    # one GROUP BY query for any number of clients
+    ("GET", "/admin/summaries"): 1,
+    ("GET", "/admin/summaries?user_id=bench-user-0&user_id=bench-user-2"): 1,
+}
+
+# The SSE stream is excluded: it runs for as long as the client listens
+
+PAYMENTS_PER_CLIENT = 120
+
+CLIENT_LOOKUP = re.compile(r"FROM satoshimachine\.dca_clients WHERE user_id")
+
+
+def _describe(statements):
+    return "\n".join(
+        f"  {i + 1}. [{caller}] {sql[:160]}"
+        for i, (caller, sql) in enumerate(statements)
+    )
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("method, path", list(QUERY_BUDGETS))
+async def test_endpoint_query_budget(monkeypatch, method, path):
+    fake_db = RecordingSQLite()
+    monkeypatch.setattr(crud, "db", fake_db)
+    await create_schema(fake_db)
+    clients = await seed_dataset(fake_db, 3, PAYMENTS_PER_CLIENT)
+    user_id = clients[0].user_id
+
+    if path == "/register":
+        user_id = "new-user"
+
+        async def get_user(user_id):
+            return None
+
+        monkeypatch.setattr("lnbits.core.crud.get_user", get_user)
+
+    if path.startswith("/admin/") or path == "/metrics":
+        monkeypatch.setattr(settings, "super_user", user_id)
+
+    body = {
+        "/register": {"dca_mode": "flow"},
+        "/dashboard/settings": {"status": "active"},
+    }.get(path)
+
+    use_fixed_exchange_rate()
+    reset_caches()
+    fake_db.statements.clear()
+
+    transport = httpx.ASGITransport(app=create_bench_app())
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+        response = await http.request(
+            method, f"{API}{path}", headers={BENCH_USER_HEADER: user_id}, json=body
+        )
+
+    assert response.status_code < 400, response.text
+    statements = fake_db.statements
+    budget = QUERY_BUDGETS[(method, path)]
+    assert len(statements) <= budget, (
+        f"{method} {path} issued {len(statements)} statements, budget is {budget}:\n"
+        + _describe(statements)
+    )
+    lookups = [s for s in statements if CLIENT_LOOKUP.search(s[1])]
+    assert (
+        len(lookups) <= 1
+    ), f"{method} {path} looked the client up {len(lookups)} times:\n" + _describe(
+        lookups
+    )
+
+
+@pytest.mark.asyncio
+async def test_batched_summaries_match_single_summaries(monkeypatch):
+    fake_db = RecordingSQLite()
+    monkeypatch.setattr(crud, "db", fake_db)
+    await create_schema(fake_db)
+    clients = await seed_dataset(fake_db, 4, 60)
+    use_fixed_exchange_rate()
+    reset_caches()
+
+    user_ids = [client.user_id for client in clients] + ["unregistered"]
+    fake_db.statements.clear()
+    summaries = [
+        summary
+        async for batch in crud.iter_dashboard_summaries(user_ids, batch_size=3)
+        for summary in batch
+    ]
+    # two batches of user ids, one statement each
+    assert len(fake_db.statements) == 2
+
+    assert [summary.user_id for summary in summaries] == user_ids[:4]
+    for summary in summaries:
+        single = await crud.get_client_dashboard_summary(summary.user_id)
+        assert summary.dict() == single.dict()
+
+    assert len(await crud.get_dashboard_summaries()) == 4
+
+
+@pytest.mark.asyncio
+async def test_results_are_cached_under_the_watermark(monkeypatch):
+    fake_db = RecordingSQLite()
+    monkeypatch.setattr(crud, "db", fake_db)
+    await create_schema(fake_db)
+    client = (await seed_dataset(fake_db, 1, 60))[0]
+    use_fixed_exchange_rate()
+    reset_caches()
+
+    async def analytics():
+        # what a request does: the ETag's watermark, then the analytics
+        await crud.get_client_watermark(client.client_id)
+        return await crud.get_client_analytics(client.user_id, "all")
+
+    first = await analytics()
+    # another worker: no in-process state, same result store
+    crud.dashboard_flights.clear()
+    crud._payment_indexes.clear()
+    fake_db.statements.clear()
+    assert (await analytics()).dict() == first.dict()
+    assert [caller for caller, _ in fake_db.statements] == ["get_client_watermark"]
+
+    await fake_db.execute(
+        """
+        INSERT INTO satoshimachine.dca_payments
+            (id, client_id, amount_sats, amount_fiat, exchange_rate,
+             transaction_type, status, created_at)
+        VALUES ('bench-new', :client_id, 1000, 10, 100, 'flow', 'confirmed', :now)
+        """,
+        {"client_id": client.client_id, "now": datetime.now()},
+    )
+    updated = await analytics()
+    assert updated.transaction_frequency["total_transactions"] == (
+        first.transaction_frequency["total_transactions"] + 1
+    )
+
+
+@pytest.mark.asyncio
+async def test_stream_takes_a_short_lived_token(monkeypatch):
+    transport = httpx.ASGITransport(app=create_bench_app())
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+        response = await http.post(
+            f"{API}/dashboard/stream/token", headers={BENCH_USER_HEADER: "user1"}
+        )
+        assert response.status_code == 200
+        token = response.json()["token"]
+        assert views_api._stream_token_user(token) == "user1"
+
+        # no admin key is accepted in the URL, and tokens can't be forged
+        user_id, expires, _ = token.split(":")
+        for params in (
+            {"api-key": "adminkey"},
+            {"token": f"user2:{expires}:{'0' * 64}"},
+            {"token": token.replace(user_id, "user2")},
+        ):
+            response = await http.get(f"{API}/dashboard/stream", params=params)
+            assert response.status_code in (401, 422), params
+
+    monkeypatch.setattr(views_api.time, "time", lambda: int(expires) + 1)
+    assert views_api._stream_token_user(token) is None
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("path", ["/metrics", "/admin/summaries", "/admin/read-target"])
+async def test_operator_endpoints_require_an_lnbits_admin(monkeypatch, path):
+    monkeypatch.setattr(settings, "super_user", "operator")
+    monkeypatch.setattr(settings, "lnbits_admin_users", [])
+    transport = httpx.ASGITransport(app=create_bench_app())
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+        response = await http.get(f"{API}{path}", headers={BENCH_USER_HEADER: "user1"})
+    assert response.status_code == 403
+
+
+@pytest.mark.asyncio
+async def test_format_query_param_selects_the_columnar_format(monkeypatch):
+    fake_db = RecordingSQLite()
+    monkeypatch.setattr(crud, "db", fake_db)
+    await create_schema(fake_db)
+    client = (await seed_dataset(fake_db, 1, 20))[0]
+    use_fixed_exchange_rate()
+    reset_caches()
+
+    headers = {BENCH_USER_HEADER: client.user_id}
+    transport = httpx.ASGITransport(app=create_bench_app())
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+        rows = await http.get(f"{API}/dashboard/transactions?cursor=", headers=headers)
+        columns = await http.get(
+            f"{API}/dashboard/transactions?cursor=&format=columnar", headers=headers
+        )
+        invalid = await http.get(
+            f"{API}/dashboard/transactions?format=xml", headers=headers
+        )
+
+    assert isinstance(rows.json()["transactions"], list)
+    assert isinstance(columns.json()["transactions"], dict)
+    assert invalid.status_code == 422
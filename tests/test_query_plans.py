@@ -0,0 +1,158 @@
+import json
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+from lnbits.db import POSTGRES
+
+from .. import crud
+from ..benchmarks.app import reset_caches, use_fixed_exchange_rate
+from ..benchmarks.dataset import clear_dataset, create_schema, seed_dataset
+from .sqlite_db import RecordingSQLite
+
+# A scratch PostgreSQL database for the PostgreSQL plans; only rows with the
+# benchmark prefix are written and deleted
+POSTGRES_URL = os.environ.get("SATMACHINECLIENT_TEST_POSTGRES_URL")
+
+DASHBOARD_TABLES = ("dca_clients", "dca_payments", "dca_deposits")
+
+
+async def _run_dashboard_reads(db):
+    """Seed a few clients and issue every dashboard read once, returning the
+    (caller, query, params) of each statement"""
+    await create_schema(db)
+    clients = await seed_dataset(db, 3, 200)
+    use_fixed_exchange_rate()
+    reset_caches()
+    db.executed.clear()
+
+    client = clients[0]
+    now = datetime.now()
+    await crud.get_client_watermark(client.client_id)
+    await crud.get_client_dashboard_summary(client.user_id)
+    page = await crud.get_client_transactions_page(client.user_id, limit=20)
+    await crud.get_client_transactions_page(
+        client.user_id, limit=20, cursor=page.next_cursor
+    )
+    await crud.get_client_transactions(
+        client.user_id, limit=20, offset=40, start_date=now - timedelta(days=90)
+    )
+    analytics = await crud.get_client_analytics(
+        client.user_id, start_date=now - timedelta(days=90), end_date=now
+    )
+    assert analytics and analytics.cost_basis_history
+
+    # a new payment is read from the index watermark on
+    await db.execute(
+        """
+        INSERT INTO satoshimachine.dca_payments
+            (id, client_id, amount_sats, amount_fiat, exchange_rate,
+             transaction_type, status, created_at)
+        VALUES (:id, :client_id, 1000, 10, 100, 'flow', 'confirmed', :created_at)
+        """,
+        {"id": "bench-plan-1", "client_id": client.client_id, "created_at": now},
+    )
+    db.executed.pop()
+    crud.dashboard_flights.clear()
+    await crud.get_client_analytics(client.user_id, "all")
+
+    callers = {caller for caller, _, _ in db.executed}
+    assert {
+        "get_client_by_user_id",
+        "get_client_watermark",
+        "get_client_dashboard_summary",
+        "_fetch_transactions_after",
+        "get_client_transactions",
+        "get_payment_index.watermark",
+        "get_payment_index.rebuild",
+        "get_payment_index.delta",
+        "get_confirmed_deposits",
+    } <= callers
+    return db.executed
+
+
+@pytest.mark.asyncio
+async def test_sqlite_dashboard_reads_seek_by_client(monkeypatch):
+    fake_db = RecordingSQLite()
+    monkeypatch.setattr(crud, "db", fake_db)
+
+    for caller, query, params in await _run_dashboard_reads(fake_db):
+        plan = fake_db.explain(query, params)
+        for step in plan:
+            if any(table in step for table in DASHBOARD_TABLES):
+                # SCAN visits every row (of the table or of an index), SEARCH seeks
+                assert step.startswith("SEARCH"), f"{caller}: {step}\n" + "\n".join(
+                    plan
+                )
+
+
+class RecordingPostgres:
+    """lnbits' Database interface on a PostgreSQL engine, logging statements"""
+
+    type = POSTGRES
+
+    def __init__(self, url):
+        from sqlalchemy.ext.asyncio import create_async_engine
+
+        self.engine = create_async_engine(
+            url.replace("postgres://", "postgresql+asyncpg://", 1)
+        )
+        self.executed = []
+
+    async def _run(self, query, values, name):
+        from sqlalchemy import text
+
+        caller = name or sys._getframe(2).f_code.co_name
+        self.executed.append((caller, query, values or {}))
+        async with self.engine.begin() as conn:
+            result = await conn.execute(text(query), values or {})
+            return result.mappings().all() if result.returns_rows else result
+
+    async def fetchone(self, query, values=None, name=None):
+        rows = await self._run(query, values, name)
+        return rows[0] if rows else None
+
+    async def fetchall(self, query, values=None, name=None):
+        return await self._run(query, values, name)
+
+    async def execute(self, query, values=None, name=None):
+        return await self._run(query, values, name)
+
+    async def explain(self, query, params):
+        from sqlalchemy import text
+
+        async with self.engine.connect() as conn:
+            # The seeded tables are tiny; only a missing index justifies a
+            # sequential scan once they are priced out
+            await conn.execute(text("SET enable_seqscan = off"))
+            result = await conn.execute(text(f"EXPLAIN (FORMAT JSON) {query}"), params)
+            plan = result.scalar()
+            return json.loads(plan) if isinstance(plan, str) else plan
+
+
+def _plan_nodes(node):
+    yield node
+    for child in node.get("Plans", []):
+        yield from _plan_nodes(child)
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(
+    not POSTGRES_URL, reason="SATMACHINECLIENT_TEST_POSTGRES_URL not set"
+)
+async def test_postgres_dashboard_reads_seek_by_client(monkeypatch):
+    pg_db = RecordingPostgres(POSTGRES_URL)
+    monkeypatch.setattr(crud, "db", pg_db)
+    try:
+        executed = await _run_dashboard_reads(pg_db)
+        for caller, query, params in executed:
+            plan = await pg_db.explain(query, params)
+            for node in _plan_nodes(plan[0]["Plan"]):
+                if node.get("Relation Name") in DASHBOARD_TABLES:
+                    assert (
+                        node["Node Type"] != "Seq Scan"
+                    ), f"{caller}: sequential scan of {node['Relation Name']}"
+    finally:
+        await clear_dataset(pg_db)
+        await pg_db.engine.dispose()
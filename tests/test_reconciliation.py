@@ -0,0 +1,274 @@
+import json
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+
+from .. import crud
+from ..benchmarks.app import (
+    BENCH_USER_HEADER,
+    create_bench_app,
+    reset_caches,
+    use_fixed_exchange_rate,
+)
+from ..benchmarks.dataset import create_schema, seed_dataset
+from ..reconciliation import ReconciliationTotals, reconcile
+from ..tasks import ReconciliationWorker, reconcile_client
+from .sqlite_db import RecordingSQLite
+
+START = datetime(2025, 1, 1, 12, 0)
+
+
+def _payment(i, minutes, sats, payment_hash=None):
+    return {
+        "id": f"p{i}",
+        "amount_sats": sats,
+        "payment_hash": payment_hash,
+        "created_at": START + timedelta(minutes=minutes),
+    }
+
+
+def _ledger(i, minutes, sats, payment_hash="other"):
+    return {
+        "checking_id": f"l{i}",
+        "payment_hash": payment_hash,
+        "amount": sats * 1000,
+        "time": int((START + timedelta(minutes=minutes)).timestamp()),
+    }
+
+
+async def _chunks(rows, size, pulled=None):
+    for i in range(0, len(rows), size):
+        if pulled is not None:
+            pulled.append(i + size)
+        yield rows[i : i + size]
+
+
+async def _entries(payments, ledger, size=2):
+    return [
+        entry
+        async for entry in reconcile(_chunks(payments, size), _chunks(ledger, size))
+    ]
+
+
+@pytest.mark.asyncio
+async def test_merge_join_matches_by_hash_then_amount_and_time():
+    payments = [
+        _payment(1, 0, 1000, "h1"),
+        _payment(2, 60, 2000),
+        _payment(3, 120, 3000, "h3"),  # never reached the wallet
+        _payment(4, 180, 4000),  # its ledger entry came too late
+    ]
+    ledger = [
+        _ledger(1, 1, 1000, "h1"),
+        _ledger(9, 50, 9000),  # someone else paid the wallet
+        _ledger(2, 62, 2000),
+        _ledger(3, 121, 3000, "not-h3"),
+        _ledger(4, 180 + 45, 4000),
+    ]
+    entries = await _entries(payments, ledger)
+
+    by_status = {}
+    for entry in entries:
+        by_status.setdefault(entry["status"], []).append(entry)
+    assert [
+        (e["payment_id"], e["checking_id"], e["matched_on"])
+        for e in by_status["matched"]
+    ] == [
+        ("p1", "l1", "payment_hash"),
+        ("p2", "l2", "amount_time"),
+    ]
+    assert by_status["matched"][1]["time_delta_seconds"] == 120
+    assert [e["payment_id"] for e in by_status["missing"]] == ["p3", "p4"]
+    assert sorted(e["checking_id"] for e in by_status["unexpected"]) == [
+        "l3",
+        "l4",
+        "l9",
+    ]
+
+    totals = ReconciliationTotals()
+    for entry in entries:
+        totals.add(entry)
+    summary = totals.dict()
+    assert summary["counts"] == {"matched": 2, "missing": 2, "unexpected": 3}
+    assert summary["sats"]["missing"] == 7000
+    assert not summary["reconciled"]
+
+
+@pytest.mark.asyncio
+async def test_ledger_is_read_as_the_payments_advance():
+    payments = [_payment(i, i * 60, 1000 + i) for i in range(200)]
+    ledger = [_ledger(i, i * 60 + 1, 1000 + i) for i in range(200)]
+    pulled = []
+    entries = reconcile(_chunks(payments, 10), _chunks(ledger, 10, pulled))
+
+    first = await entries.__anext__()
+    assert first["status"] == "matched"
+    # only the chunk around the first payment has been read
+    assert max(pulled) <= 20
+    rest = [entry async for entry in entries]
+    assert {entry["status"] for entry in rest} == {"matched"}
+    assert len(rest) == 199
+
+
+@pytest.mark.asyncio
+async def test_reconciliation_endpoint_and_worker(monkeypatch, tmp_path):
+    fake_db = RecordingSQLite()
+    monkeypatch.setattr(crud, "db", fake_db)
+    monkeypatch.setattr(crud, "_core_db", lambda: fake_db)
+    await create_schema(fake_db)
+    client = (await seed_dataset(fake_db, 1, 120))[0]
+    use_fixed_exchange_rate()
+    reset_caches()
+
+    fake_db.conn.execute(
+        """
+        CREATE TABLE apipayments (
+            checking_id TEXT PRIMARY KEY, payment_hash TEXT, wallet_id TEXT,
+            amount INTEGER, status TEXT, time INTEGER
+        )
+        """
+    )
+    confirmed = fake_db.conn.execute(
+        """
+        SELECT id, amount_sats, payment_hash, created_at
+        FROM satoshimachine.dca_payments
+        WHERE status = 'confirmed' ORDER BY created_at
+        """
+    ).fetchall()
+    lost = confirmed[10]
+    for row in confirmed:
+        if row["id"] != lost["id"]:
+            created_at = datetime.fromtimestamp(row["created_at"])
+            fake_db.conn.execute(
+                "INSERT INTO apipayments VALUES (?, ?, ?, ?, 'success', ?)",
+                (
+                    f"chk-{row['id']}",
+                    row["payment_hash"],
+                    client.wallet_id,
+                    row["amount_sats"] * 1000,
+                    int((created_at + timedelta(seconds=20)).timestamp()),
+                ),
+            )
+    fake_db.conn.execute(
+        "INSERT INTO apipayments VALUES ('chk-extra', 'x', ?, 5000, 'success', ?)",
+        (client.wallet_id, int(datetime.now().timestamp())),
+    )
+    # outgoing and failed payments aren't part of the ledger
+    fake_db.conn.execute(
+        "INSERT INTO apipayments VALUES ('chk-out', 'y', ?, -5000, 'success', 0)",
+        (client.wallet_id,),
+    )
+
+    transport = httpx.ASGITransport(app=create_bench_app())
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+        response = await http.get(
+            "/satmachineclient/api/v1/dashboard/reconciliation?include_matched=false",
+            headers={BENCH_USER_HEADER: client.user_id},
+        )
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    summary = lines[-1]["summary"]
+    assert summary["counts"] == {
+        "matched": len(confirmed) - 1,
+        "missing": 1,
+        "unexpected": 1,
+    }
+    assert [(e["status"], e["payment_id"] or e["checking_id"]) for e in lines[:-1]] == [
+        ("missing", lost["id"]),
+        ("unexpected", "chk-extra"),
+    ]
+
+    worker = ReconciliationWorker(root=tmp_path)
+    assert await worker.run_once() == 1
+    report = await worker.load_report(client.client_id)
+    assert report["counts"] == summary["counts"]
+    assert len(report["discrepancies"]) == 2
+    assert not report["truncated"]
+
+    # another run within the interval keeps the report instead of redoing it
+    fake_db.statements.clear()
+    assert await worker.run_once() == 1
+    assert [caller for caller, _ in fake_db.statements] == ["get_active_clients"]
+
+
+@pytest.mark.asyncio
+async def test_wallet_ledger_pages_through_rows_sharing_a_second(monkeypatch):
+    fake_db = RecordingSQLite()
+    monkeypatch.setattr(crud, "_core_db", lambda: fake_db)
+    fake_db.conn.execute(
+        """
+        CREATE TABLE apipayments (
+            checking_id TEXT PRIMARY KEY, payment_hash TEXT, wallet_id TEXT,
+            amount INTEGER, status TEXT, time INTEGER
+        )
+        """
+    )
+    moment = int(START.timestamp())
+    for i, offset in enumerate([0, 0, 0, 1, 1, 2, 3]):
+        fake_db.conn.execute(
+            "INSERT INTO apipayments VALUES (?, 'h', 'w', 1000, 'success', ?)",
+            (f"chk-{i}", moment + offset),
+        )
+
+    chunks = [
+        chunk
+        async for chunk in crud.stream_wallet_ledger(
+            "w", chunk_size=2, start_date=START, end_date=START + timedelta(hours=1)
+        )
+    ]
+    assert [row["checking_id"] for chunk in chunks for row in chunk] == [
+        f"chk-{i}" for i in range(7)
+    ]
+    # the cursor is bound as a number, the way LNbits stores the time
+    cursors = [
+        params["after_time"]
+        for _, _, params in fake_db.executed
+        if "after_time" in params
+    ]
+    assert cursors and all(isinstance(value, float) for value in cursors)
+
+
+@pytest.mark.asyncio
+async def test_range_edges_match_counterparts_just_outside(monkeypatch):
+    fake_db = RecordingSQLite()
+    monkeypatch.setattr(crud, "db", fake_db)
+    monkeypatch.setattr(crud, "_core_db", lambda: fake_db)
+    await create_schema(fake_db)
+    fake_db.conn.execute(
+        """
+        CREATE TABLE apipayments (
+            checking_id TEXT PRIMARY KEY, payment_hash TEXT, wallet_id TEXT,
+            amount INTEGER, status TEXT, time INTEGER
+        )
+        """
+    )
+    start_date, end_date = START, START + timedelta(days=1)
+    # minutes from start_date: one payment each just before, inside and just
+    # after the range, each reaching the wallet two minutes later
+    for i, minutes in enumerate([-10, 60, 24 * 60 - 1]):
+        moment = start_date + timedelta(minutes=minutes)
+        await fake_db.execute(
+            """
+            INSERT INTO satoshimachine.dca_payments
+            (id, client_id, amount_sats, amount_fiat, exchange_rate,
+             transaction_type, status, created_at)
+            VALUES (:id, 'c1', :sats, 10, 1, 'flow', 'confirmed', :created_at)
+            """,
+            {"id": f"p{i}", "sats": 1000 + i, "created_at": moment},
+        )
+        fake_db.conn.execute(
+            "INSERT INTO apipayments VALUES (?, NULL, 'w1', ?, 'success', ?)",
+            (
+                f"chk-{i}",
+                (1000 + i) * 1000,
+                int((moment + timedelta(minutes=2)).timestamp()),
+            ),
+        )
+
+    client = {"id": "c1", "wallet_id": "w1"}
+    entries = [entry async for entry in reconcile_client(client, start_date, end_date)]
+    assert [(e["status"], e["payment_id"], e["checking_id"]) for e in entries] == [
+        ("matched", "p1", "chk-1"),
+        ("matched", "p2", "chk-2"),
+    ]
@@ -0,0 +1,116 @@
+import asyncio
+import sqlite3
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from lnbits.db import SQLITE
+from lnbits.settings import settings
+
+from .. import crud
+from ..benchmarks.dataset import create_schema, seed_dataset
+from ..metrics import metrics
+from ..replica import ReadTarget
+from .sqlite_db import RecordingSQLite
+
+
+def test_unconfigured_target_uses_primary():
+    target = ReadTarget()
+    primary = object()
+
+    assert not target.configured
+    assert target.choose(primary) is primary
+    assert target.status()["kind"] is None
+
+
+def test_lagging_target_falls_back_to_primary():
+    target = ReadTarget(url="postgres://replica/lnbits", max_lag=10)
+    replica, primary = object(), object()
+    target.database = replica
+    target.lag = 2.0
+    target._checked_at = 0.0
+    metrics.reset()
+
+    # never checked recently
+    assert target.choose(primary) is primary
+
+    target._checked_at = float("inf")
+    assert target.choose(primary) is replica
+
+    target.lag = 12.0
+    assert target.choose(primary) is primary
+    assert metrics.get("read_target_fallback_total") == 2
+    assert target.status()["healthy"] is False
+
+
+@pytest.mark.asyncio
+async def test_snapshot_of_sqlite_primary(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "lnbits_data_folder", str(tmp_path))
+    path = tmp_path / "ext_satoshimachine.sqlite3"
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE dca_clients (id TEXT, user_id TEXT)")
+    conn.execute("INSERT INTO dca_clients VALUES ('c1', 'u1')")
+    conn.commit()
+    primary = SimpleNamespace(type=SQLITE, path=str(path))
+
+    target = ReadTarget(snapshot_interval=60)
+    await target.check(primary)
+    try:
+        assert target.healthy
+        assert target.lag < 1
+        assert target.choose(primary) is target.database
+        row = await target.database.fetchone(
+            "SELECT user_id FROM satoshimachine.dca_clients WHERE id = :id",
+            {"id": "c1"},
+        )
+        assert row["user_id"] == "u1"
+
+        # not due yet: later writes to the primary aren't copied
+        conn.execute("INSERT INTO dca_clients VALUES ('c2', 'u2')")
+        conn.commit()
+        await target.check(primary)
+        rows = await target.database.fetchall(
+            "SELECT id FROM satoshimachine.dca_clients"
+        )
+        assert len(rows) == 1
+
+        target._snapshot_at -= 60
+        await target.check(primary)
+        rows = await target.database.fetchall(
+            "SELECT id FROM satoshimachine.dca_clients"
+        )
+        assert len(rows) == 2
+        assert not list(tmp_path.glob("**/*.tmp"))
+    finally:
+        conn.close()
+        await target.database.dispose()
+
+
+@pytest.mark.asyncio
+async def test_requests_read_the_primary_while_the_target_lags_for_them(monkeypatch):
+    primary, replica = RecordingSQLite(), RecordingSQLite()
+    for database in (primary, replica):
+        await create_schema(database)
+        client = (await seed_dataset(database, 1, 20, now=datetime(2026, 1, 1)))[0]
+    monkeypatch.setattr(crud, "db", primary)
+    monkeypatch.setattr(crud.read_target, "choose", lambda db: replica)
+    metrics.reset()
+
+    async def request():
+        watermark = await crud.get_client_watermark(client.client_id)
+        return watermark, crud._read_db()
+
+    # caught up: the watermark comes from the primary, the rest from the target
+    watermark, reader = await asyncio.create_task(request())
+    assert reader is replica
+    assert watermark == await crud._fetch_client_watermark(replica, client.client_id)
+
+    # e.g. a settings change the target hasn't replayed yet
+    await primary.execute(
+        "UPDATE satoshimachine.dca_clients SET updated_at = :now",
+        {"now": datetime(2026, 1, 2)},
+    )
+    newer, reader = await asyncio.create_task(request())
+    assert newer != watermark
+    assert reader is primary
+    assert metrics.get("read_target_behind_total") == 1
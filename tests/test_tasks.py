@@ -0,0 +1,199 @@
+import asyncio
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from .. import crud, tasks
+from ..benchmarks.dataset import create_schema, seed_dataset
+from .sqlite_db import RecordingSQLite
+
+
+async def _insert_payment(db, payment_id, client_id, sats, status, created_at):
+    await db.execute(
+        """
+        INSERT INTO satoshimachine.dca_payments
+        (id, client_id, amount_sats, amount_fiat, exchange_rate,
+         transaction_type, status, created_at)
+        VALUES (:id, :client_id, :sats, :fiat, 100, 'flow', :status, :created_at)
+        """,
+        {
+            "id": payment_id,
+            "client_id": client_id,
+            "sats": sats,
+            "fiat": sats / 100,
+            "status": status,
+            "created_at": created_at,
+        },
+    )
+
+
+@pytest.mark.asyncio
+async def test_event_hub_fans_out_new_rows_only(monkeypatch):
+    fake_db = RecordingSQLite()
+    monkeypatch.setattr(crud, "db", fake_db)
+    await create_schema(fake_db)
+    long_ago = datetime.now() - timedelta(hours=2)
+    await _insert_payment(fake_db, "tx1", "client1", 1000, "confirmed", long_ago)
+    # created long before it gets confirmed
+    await _insert_payment(fake_db, "tx2", "client1", 2000, "pending", long_ago)
+    await fake_db.execute(
+        """
+        INSERT INTO satoshimachine.dca_deposits
+        (id, client_id, amount, status, created_at)
+        VALUES ('dep1', 'client1', 100.0, 'pending', :created_at)
+        """,
+        {"created_at": long_ago},
+    )
+
+    hub = tasks.DashboardEventHub()
+    # register without starting the background poller
+    queue = asyncio.Queue()
+    hub._subscribers["client1"] = {queue}
+    other = asyncio.Queue()
+    hub._subscribers["client2"] = {other}
+
+    # first poll only records existing rows
+    await hub.poll()
+    assert queue.empty()
+
+    fake_db.conn.execute(
+        "UPDATE satoshimachine.dca_payments SET status = 'confirmed' WHERE id = 'tx2'"
+    )
+    await _insert_payment(fake_db, "tx3", "client1", 3000, "confirmed", datetime.now())
+    fake_db.conn.execute(
+        "UPDATE satoshimachine.dca_deposits SET status = 'confirmed' WHERE id = 'dep1'"
+    )
+    fake_db.statements.clear()
+    await hub.poll()
+
+    # one delta query per table
+    assert [caller for caller, _ in fake_db.statements] == ["get_event_changes"] * 2
+    assert all("created_at >" in query for _, query in fake_db.statements)
+    events = [queue.get_nowait() for _ in range(3)]
+    assert [event["type"] for event in events] == ["payment", "payment", "deposit"]
+    assert [event["transaction"]["id"] for event in events[:2]] == ["tx2", "tx3"]
+    assert events[0]["delta"] == {
+        "total_sats_accumulated": 2000,
+        "total_transactions": 1,
+        "current_fiat_balance": -20.0,
+    }
+    assert events[2]["deposit"]["previous_status"] == "pending"
+    assert events[2]["delta"] == {
+        "total_fiat_invested": 100.0,
+        "pending_fiat_deposits": -100.0,
+        "current_fiat_balance": 100.0,
+    }
+    assert queue.empty()
+    assert other.empty()
+
+    # nothing changed: nothing is published again
+    await hub.poll()
+    assert queue.empty()
+
+
+def test_format_sse():
+    event = {"type": "resync"}
+    assert tasks.format_sse(event) == 'event: resync\ndata: {"type": "resync"}\n\n'
+
+
+def test_period_helpers():
+    assert tasks.period_bounds("2025-12") == (
+        datetime(2025, 12, 1),
+        datetime(2025, 12, 31, 23, 59, 59, 999999),
+    )
+    assert tasks.next_period("2025-12") == "2026-01"
+    assert tasks.last_closed_period(date(2026, 1, 20)) == "2025-12"
+
+
+@pytest.mark.asyncio
+async def test_statement_worker_builds_and_resumes(monkeypatch, tmp_path):
+    fake_db = RecordingSQLite()
+    monkeypatch.setattr(crud, "db", fake_db)
+    crud._payment_indexes.clear()
+    crud.client_cache.clear()
+    await create_schema(fake_db)
+    clients = await seed_dataset(
+        fake_db, 2, 90, history_days=90, now=datetime(2026, 1, 15)
+    )
+
+    store = tasks.StatementStore(tmp_path)
+    worker = tasks.StatementWorker(store, concurrency=2)
+    today = date(2026, 1, 20)
+
+    # clients registered in October 2025: October to December for each
+    assert await worker.run_once(today) == 6
+    client_id = clients[0].client_id
+    assert await store.load_checkpoint(client_id) == "2025-12"
+    assert await store.periods(client_id) == ["2025-10", "2025-11", "2025-12"]
+
+    # the CSV lists exactly the payments the snapshot counts
+    rows = store.path(client_id, "2025-11", "csv").read_text().splitlines()
+    snapshot = await store.load_snapshot(client_id, "2025-11")
+    assert rows[0].startswith("Date,")
+    assert snapshot["total_transactions"] == len(rows) - 1 > 0
+    assert sum(int(row.split(",")[1]) for row in rows[1:]) == snapshot["total_sats"]
+
+    # nothing left to do: only the client list is read
+    fake_db.statements.clear()
+    assert await worker.run_once(today) == 0
+    assert len(fake_db.statements) == 1
+
+    # a lost artifact is rebuilt from the previous checkpoint on
+    store.path(client_id, "2025-12", "json").unlink()
+    (tmp_path / client_id / "checkpoint.json").write_text(
+        '{"completed_through": "2025-11"}'
+    )
+    assert await worker.run_once(today) == 1
+    assert await store.load_checkpoint(client_id) == "2025-12"
+
+    # a client registered later still gets the months the others have
+    await fake_db.execute(
+        """
+        INSERT INTO satoshimachine.dca_clients
+            (id, user_id, wallet_id, username, dca_mode, status, created_at,
+             updated_at)
+        VALUES ('late', 'late-user', 'late-wallet', 'late', 'flow', 'active',
+                :created_at, :created_at)
+        """,
+        {"created_at": datetime(2025, 11, 20)},
+    )
+    assert await worker.run_once(today) == 2
+    assert await store.periods("late") == ["2025-11", "2025-12"]
+    assert not list(tmp_path.glob("**/*.tmp"))
+
+
+@pytest.mark.asyncio
+async def test_only_one_process_runs_the_workers(monkeypatch, tmp_path):
+    async def get_active_clients():
+        return []
+
+    monkeypatch.setattr(tasks, "get_active_clients", get_active_clients)
+    worker = tasks.StatementWorker(tasks.StatementStore(tmp_path))
+
+    async with tasks.single_runner(tmp_path / ".lock") as runner:
+        assert runner
+        # another process, or another run, holds the lock meanwhile
+        async with tasks.single_runner(tmp_path / ".lock") as other:
+            assert not other
+    async with tasks.single_runner(tmp_path / ".lock") as runner:
+        assert runner
+    assert await worker.run_once() == 0
+
+
+@pytest.mark.asyncio
+async def test_clients_with_unreadable_registration_are_skipped(monkeypatch, tmp_path):
+    async def get_active_clients():
+        return [{"id": "broken", "wallet_id": "w", "created_at": "not a date"}]
+
+    monkeypatch.setattr(tasks, "get_active_clients", get_active_clients)
+    worker = tasks.StatementWorker(tasks.StatementStore(tmp_path))
+    messages = []
+    handler = tasks.logger.add(messages.append, level="WARNING")
+    try:
+        assert await worker.run_once(date(2026, 1, 20)) == 0
+        assert await worker.run_once(date(2026, 1, 20)) == 0
+    finally:
+        tasks.logger.remove(handler)
+
+    assert len(messages) == 1
+    assert "broken" in messages[0]
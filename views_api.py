@@ -1,31 +1,168 @@
 # Description: Client-focused API endpoints for DCA dashboard
 
+import asyncio
+import hashlib
+import hmac
+import json
+import time
+import zlib
 from http import HTTPStatus
-from typing import List, Optional
-from datetime import datetime, timedelta
+from typing import AsyncIterator, Callable, List, Optional, Union
+from datetime import date, datetime, timedelta
 
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Path, Query, Request, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.routing import APIRoute
 from lnbits.core.models import WalletTypeInfo
 from lnbits.decorators import require_admin_key
+from lnbits.settings import settings
+from loguru import logger
 from starlette.exceptions import HTTPException
 
 from .crud import (
+    DASHBOARD_CURRENCY,
+    get_client_watermark,
+    rate_cache,
     get_client_dashboard_summary,
+    iter_dashboard_summaries,
     get_client_transactions,
+    get_client_transactions_page,
     get_client_analytics,
+    get_client_projection,
     update_client_dca_settings,
     get_client_by_user_id,
     register_dca_client,
+    stream_client_transactions,
+    stream_period_transactions,
 )
 from .models import (
+    ClientDashboardBootstrap,
     ClientDashboardSummary,
     ClientTransaction,
+    ClientTransactionPage,
     ClientAnalytics,
+    ClientProjection,
     UpdateClientSettings,
     ClientRegistrationData,
 )
+from .columnar import (
+    columnar_analytics,
+    columnar_transactions,
+    encode,
+    negotiate_media_type,
+)
+from .metrics import metrics
+from .replica import read_target
+from .tasks import (
+    build_period_snapshot,
+    dashboard_events,
+    format_sse,
+    last_closed_period,
+    period_bounds,
+    reconcile_client,
+    reconciliation_worker,
+    statement_worker,
+    transactions_csv,
+)
+from .reconciliation import ReconciliationTotals
+
+
+class TimedRoute(APIRoute):
+    """Records each request's latency by method, route template and status"""
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+        route = self.path_format
+
+        async def timed_handler(request: Request) -> Response:
+            started = time.perf_counter()
+            status = HTTPStatus.INTERNAL_SERVER_ERROR.value
+            try:
+                response = await handler(request)
+                status = response.status_code
+                return response
+            except HTTPException as e:
+                status = e.status_code
+                raise
+            finally:
+                metrics.observe(
+                    "http_request_duration_seconds",
+                    time.perf_counter() - started,
+                    method=request.method,
+                    route=route,
+                    status=str(status),
+                )
+
+        return timed_handler
+
+
+satmachineclient_api_router = APIRouter(route_class=TimedRoute)
+
+SSE_RETRY_MS = 5000
+SSE_KEEPALIVE_SECONDS = 15
+# EventSource can't send headers, so the stream URL carries a short-lived
+# token that only opens the stream, never the admin key
+STREAM_TOKEN_TTL = 60
+
+
+def _stream_token_signature(payload: str) -> str:
+    key = f"satmachineclient-stream:{settings.auth_secret_key}".encode()
+    return hmac.new(key, payload.encode(), hashlib.sha256).hexdigest()
+
+
+def _stream_token(user_id: str) -> str:
+    """Signed `user_id:expiry` token; any worker process can check it"""
+    payload = f"{user_id}:{int(time.time()) + STREAM_TOKEN_TTL}"
+    return f"{payload}:{_stream_token_signature(payload)}"
 
-satmachineclient_api_router = APIRouter()
+
+def _stream_token_user(token: str) -> Optional[str]:
+    """User id the token was issued to, or None if it's invalid or expired"""
+    payload, _, signature = token.rpartition(":")
+    user_id, _, expires = payload.partition(":")
+    if not hmac.compare_digest(signature, _stream_token_signature(payload)):
+        return None
+    if not expires.isdigit() or int(expires) < time.time():
+        return None
+    return user_id
+
+
+async def _dashboard_etag(user_id: str, *parts) -> Optional[str]:
+    """ETag for a dashboard response, derived from the client's data watermark
+
+    `parts` carries whatever else the response depends on (query parameters,
+    exchange rate timestamp, ...). Unregistered users get no ETag.
+    """
+    client = await get_client_by_user_id(user_id)
+    if not client:
+        return None
+    watermark = await get_client_watermark(client["id"])
+    digest = hashlib.sha256(repr((watermark, parts)).encode()).hexdigest()[:32]
+    return f'W/"{digest}"'
+
+
+def _not_modified(
+    request: Request, response: Response, etag: Optional[str]
+) -> Optional[Response]:
+    """Tag the response, or return a 304 if the caller's copy is current"""
+    if not etag:
+        return None
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if_none_match = request.headers.get("if-none-match", "")
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    if etag.removeprefix("W/") in candidates or "*" in candidates:
+        return Response(status_code=HTTPStatus.NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+    return None
+
+
+def _columnar_response(payload: dict, media_type: str, response: Response) -> Response:
+    """Encoded columnar payload, keeping the headers set on `response`"""
+    return Response(
+        content=encode(payload, media_type),
+        media_type=media_type,
+        headers={**response.headers, "Vary": "Accept"},
+    )
 
 
 ###################################################
@@ -38,7 +175,7 @@ async def api_register_client(
     wallet: WalletTypeInfo = Depends(require_admin_key),
 ) -> dict:
     """Register a new DCA client
-    
+
     Clients can self-register using their wallet admin key.
     Creates a new client entry in the satoshimachine database.
     """
@@ -47,7 +184,7 @@ async def api_register_client(
         wallet.wallet.id, 
         registration_data
     )
-    
+
     if "error" in result:
         if "already registered" in result["error"]:
             raise HTTPException(
@@ -59,7 +196,7 @@ async def api_register_client(
                 status_code=HTTPStatus.BAD_REQUEST,
                 detail=result["error"]
             )
-    
+
     return result
 
 
@@ -69,7 +206,7 @@ async def api_check_registration_status(
 ) -> dict:
     """Check if user is already registered as a DCA client"""
     client = await get_client_by_user_id(wallet.wallet.user)
-    
+
     return {
         "is_registered": client is not None,
         "client_id": client["id"] if client else None,
@@ -82,11 +219,27 @@ async def api_check_registration_status(
 ############## CLIENT DASHBOARD API ###############
 ###################################################
 
-@satmachineclient_api_router.get("/api/v1/dashboard/summary")
+@satmachineclient_api_router.get(
+    "/api/v1/dashboard/summary", response_model=ClientDashboardSummary
+)
 async def api_get_dashboard_summary(
+    request: Request,
+    response: Response,
     wallet: WalletTypeInfo = Depends(require_admin_key),
-) -> ClientDashboardSummary:
-    """Get client dashboard summary metrics"""
+) -> Union[ClientDashboardSummary, Response]:
+    """Get client dashboard summary metrics
+
+    Supports If-None-Match; the ETag covers the client's data watermark and
+    the exchange rate timestamp.
+    """
+    rate = await rate_cache.get(DASHBOARD_CURRENCY)
+    etag = await _dashboard_etag(
+        wallet.wallet.user, "summary", rate.as_of if rate else None
+    )
+    not_modified = _not_modified(request, response, etag)
+    if not_modified:
+        return not_modified
+
     summary = await get_client_dashboard_summary(wallet.wallet.user)
     if not summary:
         raise HTTPException(
@@ -96,17 +249,70 @@ async def api_get_dashboard_summary(
     return summary
 
 
-@satmachineclient_api_router.get("/api/v1/dashboard/transactions")
+@satmachineclient_api_router.get(
+    "/api/v1/dashboard/transactions",
+    response_model=Union[List[ClientTransaction], ClientTransactionPage],
+)
 async def api_get_client_transactions(
+    request: Request,
+    response: Response,
     wallet: WalletTypeInfo = Depends(require_admin_key),
     limit: int = Query(50, ge=1, le=1000),
     offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None),
     transaction_type: Optional[str] = Query(None),
     start_date: Optional[datetime] = Query(None),
     end_date: Optional[datetime] = Query(None),
-) -> List[ClientTransaction]:
-    """Get client's DCA transaction history with filtering"""
-    return await get_client_transactions(
+    fmt: str = Query("json", alias="format", regex="^(json|columnar)$"),
+) -> Union[List[ClientTransaction], ClientTransactionPage, Response]:
+    """Get client's DCA transaction history with filtering
+
+    Passing `cursor` (empty for the first page) switches to keyset pagination
+    and returns a page with `next_cursor`; `offset` is kept for older clients.
+    `format=columnar` returns the transactions as one array per field (see
+    columnar.py), as MessagePack if accepted. Supports If-None-Match.
+    """
+    media_type = negotiate_media_type(request.headers.get("accept", ""))
+    etag = await _dashboard_etag(
+        wallet.wallet.user,
+        "transactions",
+        limit,
+        offset,
+        cursor,
+        transaction_type,
+        start_date,
+        end_date,
+        fmt,
+        media_type if fmt == "columnar" else None,
+    )
+    not_modified = _not_modified(request, response, etag)
+    if not_modified:
+        return not_modified
+
+    if cursor is not None:
+        try:
+            page = await get_client_transactions_page(
+                wallet.wallet.user,
+                limit=limit,
+                cursor=cursor or None,
+                transaction_type=transaction_type,
+                start_date=start_date,
+                end_date=end_date
+            )
+        except ValueError as e:
+            raise HTTPException(
+                status_code=HTTPStatus.BAD_REQUEST,
+                detail=str(e)
+            ) from e
+        if fmt == "columnar":
+            return _columnar_response(
+                columnar_transactions(page.transactions, page.next_cursor),
+                media_type,
+                response,
+            )
+        return page
+
+    transactions = await get_client_transactions(
         wallet.wallet.user, 
         limit=limit, 
         offset=offset,
@@ -114,35 +320,248 @@ async def api_get_client_transactions(
         start_date=start_date,
         end_date=end_date
     )
+    if fmt == "columnar":
+        return _columnar_response(
+            columnar_transactions(transactions), media_type, response
+        )
+    return transactions
 
 
-@satmachineclient_api_router.get("/api/v1/dashboard/analytics")
+@satmachineclient_api_router.get(
+    "/api/v1/dashboard/analytics", response_model=ClientAnalytics
+)
 async def api_get_client_analytics(
+    request: Request,
+    response: Response,
     wallet: WalletTypeInfo = Depends(require_admin_key),
     time_range: str = Query("30d", regex="^(7d|30d|90d|1y|all)$"),
-) -> ClientAnalytics:
-    """Get client performance analytics and cost basis data"""
+    granularity: str = Query("day", regex="^(day|week|month)$"),
+    max_points: Optional[int] = Query(None, ge=3, le=10000),
+    start_date: Optional[datetime] = Query(None),
+    end_date: Optional[datetime] = Query(None),
+    fmt: str = Query("json", alias="format", regex="^(json|columnar)$"),
+) -> Union[ClientAnalytics, Response]:
+    """Get client performance analytics and cost basis data
+
+    `start_date`/`end_date` select an arbitrary range (either may be left
+    open) instead of the `time_range` preset. `granularity` sets the bucket
+    size of the accumulation timeline and `max_points` caps the number of
+    points returned per series. `format=columnar` returns both series as one
+    array per field (see columnar.py), as MessagePack if accepted. Supports
+    If-None-Match; presets are relative to today, so the ETag changes daily
+    as well.
+    """
+    if start_date and end_date and start_date.timestamp() > end_date.timestamp():
+        raise HTTPException(
+            status_code=HTTPStatus.BAD_REQUEST,
+            detail="start_date must not be after end_date"
+        )
+
+    media_type = negotiate_media_type(request.headers.get("accept", ""))
+    etag = await _dashboard_etag(
+        wallet.wallet.user,
+        "analytics",
+        time_range,
+        granularity,
+        max_points,
+        start_date,
+        end_date,
+        fmt,
+        media_type if fmt == "columnar" else None,
+        date.today(),
+    )
+    not_modified = _not_modified(request, response, etag)
+    if not_modified:
+        return not_modified
+
     try:
-        analytics = await get_client_analytics(wallet.wallet.user, time_range)
-        if not analytics:
-            # Return empty analytics data instead of error
-            return ClientAnalytics(
-                user_id=wallet.wallet.user,
-                cost_basis_history=[],
-                accumulation_timeline=[],
-                transaction_frequency={}
-            )
-        return analytics
+        analytics = await get_client_analytics(
+            wallet.wallet.user,
+            time_range,
+            granularity,
+            max_points,
+            start_date=start_date,
+            end_date=end_date,
+        )
     except Exception as e:
-        print(f"Analytics error: {e}")
-        # Return empty analytics data as fallback
-        return ClientAnalytics(
-            user_id=wallet.wallet.user,
+        metrics.inc("errors_total", operation="api_get_client_analytics")
+        logger.warning(f"Analytics error: {e}")
+        analytics = None
+
+    # Return empty analytics data instead of an error
+    analytics = analytics or ClientAnalytics(
+        user_id=wallet.wallet.user,
+        cost_basis_history=[],
+        accumulation_timeline=[],
+        transaction_frequency={}
+    )
+    if fmt == "columnar":
+        return _columnar_response(columnar_analytics(analytics), media_type, response)
+    return analytics
+
+
+@satmachineclient_api_router.get(
+    "/api/v1/dashboard/projection", response_model=ClientProjection
+)
+async def api_get_client_projection(
+    request: Request,
+    response: Response,
+    wallet: WalletTypeInfo = Depends(require_admin_key),
+    years: int = Query(3, ge=1, le=10),
+    paths: int = Query(10000, ge=100, le=20000),
+) -> Union[ClientProjection, Response]:
+    """Project the client's accumulation at its current DCA pace
+
+    Simulates `paths` price paths over `years` and returns the p10-p90 bands
+    of sats accumulated and the dates the next milestones are reached by
+    10%, 50% and 90% of the paths. Supports If-None-Match; the projection is
+    recomputed when a payment lands or the day changes.
+    """
+    etag = await _dashboard_etag(
+        wallet.wallet.user, "projection", years, paths, date.today()
+    )
+    not_modified = _not_modified(request, response, etag)
+    if not_modified:
+        return not_modified
+
+    projection = await get_client_projection(wallet.wallet.user, years, paths)
+    if not projection:
+        raise HTTPException(
+            status_code=HTTPStatus.NOT_FOUND,
+            detail="Client data not found"
+        )
+    return projection
+
+
+@satmachineclient_api_router.get(
+    "/api/v1/dashboard/bootstrap", response_model=ClientDashboardBootstrap
+)
+async def api_get_dashboard_bootstrap(
+    request: Request,
+    response: Response,
+    wallet: WalletTypeInfo = Depends(require_admin_key),
+    limit: int = Query(50, ge=1, le=1000),
+    time_range: str = Query("30d", regex="^(7d|30d|90d|1y|all)$"),
+    max_points: Optional[int] = Query(None, ge=3, le=10000),
+) -> Union[ClientDashboardBootstrap, Response]:
+    """Everything the dashboard needs for its first render in one request
+
+    Registration state, the summary, the first transactions page and the
+    analytics for `time_range` are gathered concurrently. Supports
+    If-None-Match.
+    """
+    user_id = wallet.wallet.user
+    client = await get_client_by_user_id(user_id)
+    if not client:
+        return ClientDashboardBootstrap(is_registered=False)
+
+    rate = await rate_cache.get(DASHBOARD_CURRENCY)
+    etag = await _dashboard_etag(
+        user_id,
+        "bootstrap",
+        limit,
+        time_range,
+        max_points,
+        rate.as_of if rate else None,
+        date.today(),
+    )
+    not_modified = _not_modified(request, response, etag)
+    if not_modified:
+        return not_modified
+
+    async def analytics_or_empty() -> ClientAnalytics:
+        try:
+            analytics = await get_client_analytics(
+                user_id, time_range, max_points=max_points
+            )
+        except Exception as e:
+            metrics.inc("errors_total", operation="api_get_dashboard_bootstrap")
+            logger.warning(f"Analytics error: {e}")
+            analytics = None
+        return analytics or ClientAnalytics(
+            user_id=user_id,
             cost_basis_history=[],
             accumulation_timeline=[],
             transaction_frequency={}
         )
 
+    summary, transactions, analytics = await asyncio.gather(
+        get_client_dashboard_summary(user_id),
+        get_client_transactions_page(user_id, limit=limit),
+        analytics_or_empty(),
+    )
+
+    return ClientDashboardBootstrap(
+        is_registered=True,
+        client_id=client["id"],
+        dca_mode=client["dca_mode"],
+        status=client["status"],
+        summary=summary,
+        transactions=transactions,
+        analytics=analytics,
+    )
+
+
+@satmachineclient_api_router.post("/api/v1/dashboard/stream/token")
+async def api_dashboard_stream_token(
+    wallet: WalletTypeInfo = Depends(require_admin_key),
+) -> dict:
+    """Short-lived token for opening the dashboard event stream
+
+    It only grants reading the stream and expires after `expires_in`
+    seconds; an open stream stays open, a reconnect needs a new token.
+    """
+    return {
+        "token": _stream_token(wallet.wallet.user),
+        "expires_in": STREAM_TOKEN_TTL,
+    }
+
+
+@satmachineclient_api_router.get("/api/v1/dashboard/stream")
+async def api_dashboard_stream(
+    request: Request,
+    token: str = Query(..., description="From POST /api/v1/dashboard/stream/token"),
+) -> StreamingResponse:
+    """Server-Sent Events for new confirmed payments and deposit changes
+
+    Each event carries the new row and the changes to apply to the summary.
+    EventSource can't set headers, so pass a stream token as `token`.
+    """
+    user_id = _stream_token_user(token)
+    if not user_id:
+        raise HTTPException(
+            status_code=HTTPStatus.UNAUTHORIZED,
+            detail="Invalid or expired stream token"
+        )
+
+    client = await get_client_by_user_id(user_id)
+    if not client:
+        raise HTTPException(
+            status_code=HTTPStatus.NOT_FOUND,
+            detail="Client data not found"
+        )
+
+    queue = dashboard_events.subscribe(client["id"])
+
+    async def events() -> AsyncIterator[str]:
+        try:
+            yield f"retry: {SSE_RETRY_MS}\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield format_sse(event)
+        finally:
+            dashboard_events.unsubscribe(client["id"], queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 
 @satmachineclient_api_router.put("/api/v1/dashboard/settings")
 async def api_update_client_settings(
@@ -150,7 +569,7 @@ async def api_update_client_settings(
     wallet: WalletTypeInfo = Depends(require_admin_key),
 ) -> dict:
     """Update client DCA settings (mode, limits, status)
-    
+
     Security: Users can only modify their own DCA settings.
     Validated by user_id lookup from wallet.wallet.user.
     """
@@ -160,60 +579,283 @@ async def api_update_client_settings(
             status_code=HTTPStatus.NOT_FOUND,
             detail="Client profile not found"
         )
-    
-    success = await update_client_dca_settings(client.id, settings)
+
+    success = await update_client_dca_settings(client["id"], settings)
     if not success:
         raise HTTPException(
             status_code=HTTPStatus.BAD_REQUEST,
             detail="Failed to update settings"
         )
-    
+
     return {"message": "Settings updated successfully"}
 
 
+EXPORT_CHUNK_SIZE = 500
+
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv",
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+}
+
+
+async def _export_chunks(
+    chunks: AsyncIterator[List[ClientTransaction]],
+    fmt: str,
+) -> AsyncIterator[str]:
+    """Render chunks of transactions in the requested format"""
+    if fmt == "csv":
+        async for text in transactions_csv(chunks):
+            yield text
+    elif fmt == "ndjson":
+        async for transactions in chunks:
+            yield "".join(f"{tx.json()}\n" for tx in transactions)
+    else:
+        # Same shape as the former in-memory response: {"transactions": [...]}
+        yield '{"transactions": ['
+        separator = ""
+        async for transactions in chunks:
+            yield separator + ",".join(tx.json() for tx in transactions)
+            separator = ","
+        yield "]}"
+
+
+async def _gzip_chunks(chunks: AsyncIterator[str]) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(wbits=31)  # wbits=31 writes a gzip container
+    async for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
+
+
 @satmachineclient_api_router.get("/api/v1/dashboard/export/transactions")
 async def api_export_transactions(
     wallet: WalletTypeInfo = Depends(require_admin_key),
-    format: str = Query("csv", regex="^(csv|json)$"),
+    fmt: str = Query("csv", alias="format", regex="^(csv|json|ndjson)$"),
+    compress: bool = Query(False),
     start_date: Optional[datetime] = Query(None),
     end_date: Optional[datetime] = Query(None),
-):
-    """Export client transaction history"""
-    transactions = await get_client_transactions(
-        wallet.wallet.user,
-        limit=10000,  # Large limit for export
-        start_date=start_date,
-        end_date=end_date
+    period: Optional[str] = Query(None, regex=r"^\d{4}-(0[1-9]|1[0-2])$"),
+) -> StreamingResponse:
+    """Export client transaction history
+
+    The full history is streamed from the database in fixed-size chunks, so
+    there is no row cap and memory use doesn't grow with history size.
+    `period=YYYY-MM` exports one month's statement instead: the confirmed
+    payments of that month by transaction time, oldest first, as in the
+    period's analytics snapshot. CSV exports of closed months are served
+    from the prebuilt statement when there is one.
+    `compress=true` returns the export gzipped.
+    """
+    body: Optional[AsyncIterator] = None
+    filename = f"dca_transactions.{fmt}"
+    if period:
+        filename = f"dca_transactions_{period}.{fmt}"
+        client = await get_client_by_user_id(wallet.wallet.user)
+        if not client:
+            raise HTTPException(
+                status_code=HTTPStatus.NOT_FOUND,
+                detail="Client data not found"
+            )
+        store = statement_worker.store
+        if (
+            fmt == "csv"
+            and period <= last_closed_period()
+            and await store.has(client["id"], period)
+        ):
+            body = store.read_text(store.path(client["id"], period, "csv"))
+        else:
+            start_date, end_date = period_bounds(period)
+            body = _export_chunks(
+                stream_period_transactions(
+                    client["id"], start_date, end_date, EXPORT_CHUNK_SIZE
+                ),
+                fmt,
+            )
+
+    if body is None:
+        chunks = stream_client_transactions(
+            wallet.wallet.user,
+            chunk_size=EXPORT_CHUNK_SIZE,
+            start_date=start_date,
+            end_date=end_date
+        )
+        body = _export_chunks(chunks, fmt)
+    media_type = EXPORT_MEDIA_TYPES[fmt]
+
+    if compress:
+        body = _gzip_chunks(body)
+        filename += ".gz"
+        media_type = "application/gzip"
+
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
-    
-    if format == "csv":
-        # Return CSV response
-        from io import StringIO
-        import csv
-        
-        output = StringIO()
-        writer = csv.writer(output)
-        writer.writerow(['Date', 'Amount (Sats)', 'Amount (Fiat)', 'Exchange Rate', 'Type', 'Status'])
-        
-        for tx in transactions:
-            writer.writerow([
-                tx.created_at.isoformat(),
-                tx.amount_sats,
-                tx.amount_fiat,  # Amount already in GTQ
-                tx.exchange_rate,
-                tx.transaction_type,
-                tx.status
-            ])
-        
-        from fastapi.responses import StreamingResponse
-        output.seek(0)
-        return StreamingResponse(
-            iter([output.getvalue()]),
-            media_type="text/csv",
-            headers={"Content-Disposition": "attachment; filename=dca_transactions.csv"}
+
+
+@satmachineclient_api_router.get("/api/v1/dashboard/statements")
+async def api_list_statements(
+    wallet: WalletTypeInfo = Depends(require_admin_key),
+) -> dict:
+    """Closed months with a prebuilt statement, oldest first"""
+    client = await get_client_by_user_id(wallet.wallet.user)
+    if not client:
+        raise HTTPException(
+            status_code=HTTPStatus.NOT_FOUND,
+            detail="Client data not found"
         )
-    else:
-        return {"transactions": transactions}
+    return {"periods": await statement_worker.store.periods(client["id"])}
+
+
+@satmachineclient_api_router.get("/api/v1/dashboard/statements/{period}")
+async def api_get_statement_snapshot(
+    period: str = Path(..., regex=r"^\d{4}-(0[1-9]|1[0-2])$"),
+    wallet: WalletTypeInfo = Depends(require_admin_key),
+) -> dict:
+    """Analytics snapshot of a closed month
+
+    Served from the prebuilt statement, or computed if it isn't built yet.
+    The CSV is available from the export endpoint with `period`.
+    """
+    client = await get_client_by_user_id(wallet.wallet.user)
+    if not client:
+        raise HTTPException(
+            status_code=HTTPStatus.NOT_FOUND,
+            detail="Client data not found"
+        )
+    if period > last_closed_period():
+        raise HTTPException(
+            status_code=HTTPStatus.BAD_REQUEST,
+            detail="Statements are only available for closed months"
+        )
+    snapshot = await statement_worker.store.load_snapshot(client["id"], period)
+    return snapshot or await build_period_snapshot(client["id"], period)
+
+
+async def _reconciliation_lines(
+    entries: AsyncIterator[dict], include_matched: bool, window: timedelta
+) -> AsyncIterator[str]:
+    totals = ReconciliationTotals()
+    async for entry in entries:
+        totals.add(entry)
+        if include_matched or entry["status"] != "matched":
+            yield json.dumps(entry) + "\n"
+    yield json.dumps(
+        {"summary": totals.dict(window_seconds=window.total_seconds())}
+    ) + "\n"
+
+
+@satmachineclient_api_router.get("/api/v1/dashboard/reconciliation")
+async def api_reconcile_payments(
+    wallet: WalletTypeInfo = Depends(require_admin_key),
+    start_date: Optional[datetime] = Query(None),
+    end_date: Optional[datetime] = Query(None),
+    window_minutes: int = Query(30, ge=1, le=1440),
+    include_matched: bool = Query(True),
+) -> StreamingResponse:
+    """Reconcile confirmed DCA payments with the client's wallet ledger
+
+    Streams NDJSON: one line per matched, missing or unexpected entry (see
+    reconciliation.py), then a `{"summary": ...}` line with the totals.
+    Both sides are read in chunks, so memory use doesn't grow with history.
+    `window_minutes` is how far apart a payment and its ledger entry may be.
+    """
+    if start_date and end_date and start_date.timestamp() > end_date.timestamp():
+        raise HTTPException(
+            status_code=HTTPStatus.BAD_REQUEST,
+            detail="start_date must not be after end_date"
+        )
+    client = await get_client_by_user_id(wallet.wallet.user)
+    if not client:
+        raise HTTPException(
+            status_code=HTTPStatus.NOT_FOUND,
+            detail="Client data not found"
+        )
+    window = timedelta(minutes=window_minutes)
+    entries = reconcile_client(client, start_date, end_date, window)
+    return StreamingResponse(
+        _reconciliation_lines(entries, include_matched, window),
+        media_type=EXPORT_MEDIA_TYPES["ndjson"],
+    )
+
+
+@satmachineclient_api_router.get("/api/v1/dashboard/reconciliation/latest")
+async def api_latest_reconciliation(
+    wallet: WalletTypeInfo = Depends(require_admin_key),
+) -> dict:
+    """The daily reconciliation report: totals and discrepancies"""
+    client = await get_client_by_user_id(wallet.wallet.user)
+    report = await reconciliation_worker.load_report(client["id"]) if client else None
+    if not report:
+        raise HTTPException(
+            status_code=HTTPStatus.NOT_FOUND,
+            detail="No reconciliation report yet"
+        )
+    return report
+
+
+###################################################
+################ OPERATOR REPORTS #################
+###################################################
+
+def _require_lnbits_admin(wallet: WalletTypeInfo) -> None:
+    if not settings.is_admin_user(wallet.wallet.user):
+        raise HTTPException(
+            status_code=HTTPStatus.FORBIDDEN,
+            detail="Operator endpoints require an LNbits admin"
+        )
+
+
+@satmachineclient_api_router.get("/api/v1/admin/summaries")
+async def api_stream_dashboard_summaries(
+    wallet: WalletTypeInfo = Depends(require_admin_key),
+    user_id: Optional[List[str]] = Query(None),
+) -> StreamingResponse:
+    """Dashboard summaries of many clients as NDJSON, for operator statements
+
+    Pass `user_id` repeatedly to select clients, or omit it for all of them.
+    Aggregates are computed in batches with one query each, so the cost is
+    the table scan rather than the client count. Requires the admin key of an
+    LNbits admin user's wallet.
+    """
+    _require_lnbits_admin(wallet)
+
+    async def lines() -> AsyncIterator[str]:
+        async for batch in iter_dashboard_summaries(user_id):
+            yield "".join(f"{summary.json()}\n" for summary in batch)
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@satmachineclient_api_router.get("/api/v1/admin/read-target")
+async def api_read_target_status(
+    wallet: WalletTypeInfo = Depends(require_admin_key),
+) -> dict:
+    """Whether dashboard reads use the configured replica or snapshot, and its lag"""
+    _require_lnbits_admin(wallet)
+    return read_target.status()
+
+
+@satmachineclient_api_router.get(
+    "/api/v1/metrics", response_class=PlainTextResponse
+)
+async def api_metrics(
+    wallet: WalletTypeInfo = Depends(require_admin_key),
+) -> PlainTextResponse:
+    """Query, endpoint and exchange rate metrics in Prometheus text format
+
+    Metrics are process-wide. Requires the admin key of an LNbits admin
+    user's wallet, sent in the `X-Api-Key` header (Prometheus'
+    `http_headers` scrape option); never put it in the scrape URL, where it
+    ends up in logs.
+    """
+    _require_lnbits_admin(wallet)
+    return PlainTextResponse(
+        metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
 
 
 # Removed local client-limits endpoint